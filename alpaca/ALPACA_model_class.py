@@ -1,13 +1,55 @@
+import logging
 import gurobipy as gp
+import numpy as np
 import pandas as pd
 import os
+import re
 from gurobipy import GRB
 from alpaca.utils import (
     find_path_edges,
     get_tree_edges,
     flat_list,
     get_length_from_name,
+    get_segment_ci_bounds,
 )
+from alpaca.scheduler import get_solver_threads
+
+FORMULATIONS = ["bigM", "indicator", "sos"]
+# homozygous deletions are only allowed in segments shorter than this (see limit_homozygous_deletions_threshold):
+HOMO_DEL_SIZE_LIMIT = 5 * 10**7
+# messages of the gurobi log reporting an accepted MIP start, as written by gurobi 13.0 (they can change between
+# versions, so the first incumbent is also compared with the start, see warm_start_callback):
+WARM_START_MESSAGES = ["Loaded user MIP start", "User MIP start produced solution"]
+# tolerance of the comparison of the first incumbent with the MIP start:
+WARM_START_TOLERANCE = 1e-6
+
+logger = logging.getLogger("ALPACA")
+# gurobi environment of the local license, shared by all models of the process (see get_local_env):
+local_env = None
+
+
+def get_local_env():
+    """
+    Gurobi environment of the local license, started without console output, so that the license banner is not
+    printed
+    """
+    global local_env
+    if local_env is None:
+        local_env = gp.Env(params={"OutputFlag": 0})
+    return local_env
+
+
+def get_model_family(name, labels=()):
+    """
+    Strip allele, sample, edge and path indices and trailing clone or sample labels from a gurobi variable or
+    constraint name
+    """
+    name = re.sub(r"\[.*\]|_?\(.*\)", "", name)  # indices and edges
+    if len(labels) > 0:
+        name = re.sub(rf"_({'|'.join(map(re.escape, labels))})$", "", name)
+    name = re.sub(r"^[AB]_(\d+_)?", "", name)  # allele and path prefix
+    name = re.sub(r"((?<=^X)|(?<=[a-z]))[AB](?=_|$)|_[AB](?=_|$)", "", name)  # allele
+    return name or "unnamed"
 
 
 class Model:
@@ -26,7 +68,7 @@ class Model:
     ):
         # default parameters:
         self.homozygous_deletion_threshold = 1
-        self.homo_del_size_limit = 5 * 10**7
+        self.homo_del_size_limit = HOMO_DEL_SIZE_LIMIT
         self.limit_homozygous_deletions_threshold_flag = bool(
             self.homozygous_deletion_threshold
         )
@@ -44,12 +86,29 @@ class Model:
         self.restrict_to_clonal_only_flag = False
         self.time_limit = 60
         self.cpus = 2
+        # gurobi threads; if None, chosen from model size, up to cpus (see scheduler.get_solver_threads):
+        self.threads = None
         self.BestObjStop = None
+        self.matrix_builder = True
+        # create edge change indicators and complexity components once (see add_event_count_variables):
+        self.deduplicate_model = True
+        # count changes on root-to-leaf paths from cumulative counts propagated along edges (see add_cumulative_change_counts):
+        self.cumulative_path_counts = False
+        self.ci_bounds = None
+        self.derive_cn_bounds_flag = True
+        # used for all big-M constraints if bounds are not derived from data:
+        self.big_M = 1000
+        # formulation of binarised relations (see add_implication): 'bigM', 'indicator' or 'sos'
+        self.formulation = "bigM"
         self.license = "local"
         self.gurobi_logs = ""
 
         # override defaults:
         self.__dict__.update(kwargs)
+        if self.formulation not in FORMULATIONS:
+            raise ValueError(
+                f"Unknown formulation '{self.formulation}', expected one of: {FORMULATIONS}"
+            )
         # ::::: ILP variables:
 
         # copy number variables:
@@ -63,6 +122,7 @@ class Model:
             {}
         )  # Dictionary containing distance between predicted fractional and observed fractional copy number values
         self.Yhat = {}  # Dictionary containing predicted fractional copy number values
+        self.cn_upper_bound = {}  # Upper bound of integer copy number of each allele
 
         # confidence intervals variables:
         self.CI_upper = {}
@@ -80,7 +140,10 @@ class Model:
         self.cpn_change_down = {}
         self.total_edge_changes = None
         self.path_variability_penalty = {}
+        self.edge_pair_changes = {}
         self.total_path_variability_penalty = None
+        self.cumulative_amps = {}
+        self.cumulative_dels = {}
         self.amps_count_on_path = {}
         self.more_than_1_amp_change = {}
         self.dels_count_on_path = {}
@@ -97,6 +160,13 @@ class Model:
         self.clone_names = list(set(flat_list(tree)))
         self.mrca = self.tree[0][0]
         self.tree_edges = get_tree_edges(self.tree)
+        # confidence intervals can be resolved once per segment and passed to the model:
+        if (self.ci_bounds is None) or (
+            list(self.ci_bounds["samples"]) != list(self.sample_names)
+        ):
+            self.ci_bounds = get_segment_ci_bounds(
+                self.ci_table, self.segment, self.sample_names
+            )
 
         # :::::  outputs:
         self.complexity = None
@@ -104,12 +174,23 @@ class Model:
         self.B = None
         self.A = None
         self.solution = None
+        self.warm_start_loaded = False
+        self.warm_start_accepted = None
+        # variables and values of the MIP start, and whether the log reported it (see warm_start_callback):
+        self.warm_start_vars = []
+        self.warm_start_vals = []
+        self.warm_start_reported = False
+        self.first_incumbent_checked = False
 
         # ::::: initialise model
-        print("Initialise model::")
-        print(
-            f"===={self.tumour_id}_{segment}_allowed_complexity_{self.allowed_tree_complexity}===="
+        logger.debug(
+            "Initialise model: %s_%s_allowed_complexity_%s",
+            self.tumour_id,
+            segment,
+            self.allowed_tree_complexity,
         )
+        # gurobi environment of a remote license, disposed with the model:
+        self.env = None
         # activate gurobi license:
         # TODO get license from environment variables
         if self.license == "remote":
@@ -121,31 +202,39 @@ class Model:
                         "LICENSEID",
                     )
                 ),
+                "OutputFlag": 0,
             }
-            env = gp.Env(params=options)
-            self.model = gp.Model("ALPACA", env=env)
-            print(f'Using remote license: {options["LICENSEID"]}')
-        else:
-            print(f"Using local license")
-            self.model = gp.Model("ALPACA")
-        # set logging:
-        if self.gurobi_logs == "":
-            self.model.setParam("OutputFlag", 0)
+            self.env = gp.Env(params=options)
+            self.model = gp.Model("ALPACA", env=self.env)
+            logger.debug("Using remote license: %s", options["LICENSEID"])
         else:
-            self.model.setParam("LogFile", self.gurobi_logs)
+            logger.debug("Using local license")
+            self.model = gp.Model("ALPACA", env=get_local_env())
+        # set logging (output is disabled in the environment):
+        if self.gurobi_logs != "":
             self.model.setParam("LogToConsole", 0)
+            self.model.setParam("LogFile", self.gurobi_logs)
+            self.model.setParam("OutputFlag", 1)
         self.model.params.TimeLimit = self.time_limit
-        self.model.params.Threads = self.cpus * 2
         if self.BestObjStop:
             self.model.params.BestObjStop = self.BestObjStop
         for allele in ["A", "B"]:
-            self.X[allele] = self.model.addVars(
-                self.clone_names, name=f"X{allele}", lb=0, vtype=GRB.INTEGER
-            )
             self.Y[allele] = {
                 row["sample"]: row[f"cpn{allele}"]
                 for _, row in self.fractional_copy_number_table.iterrows()
             }
+            self.cn_upper_bound[allele] = (
+                self.derive_cn_upper_bound(allele)
+                if self.derive_cn_bounds_flag
+                else float("inf")
+            )
+            self.X[allele] = self.model.addVars(
+                self.clone_names,
+                name=f"X{allele}",
+                lb=0,
+                ub=self.cn_upper_bound[allele],
+                vtype=GRB.INTEGER,
+            )
             self.d[allele] = self.model.addVars(
                 self.sample_names, name=f"d{allele}", lb=0
             )
@@ -158,9 +247,15 @@ class Model:
 
         # ::::: mandatory constraints
 
-        self.add_Yhat_constraints()  # constraints defining predicted fractional copy number values
-        self.add_CI_constraints()  # constraints indicating if predicted fractional copy number values are withing CIs
-        self.add_absolute_distance_constraint()  # constraint distance to be absolute
+        if self.matrix_builder:
+            # same constraints as below, built in one pass per allele from a samples x clones proportion matrix:
+            self.add_Yhat_constraints_matrix()
+            self.add_CI_constraints_matrix()
+            self.add_absolute_distance_constraint_matrix()
+        else:
+            self.add_Yhat_constraints()  # constraints defining predicted fractional copy number values
+            self.add_CI_constraints()  # constraints indicating if predicted fractional copy number values are withing CIs
+            self.add_absolute_distance_constraint()  # constraint distance to be absolute
         self.add_event_count_variables()  # create variables for events on each edge
 
         if self.add_event_count_constraints_flag:
@@ -169,7 +264,11 @@ class Model:
             self.total_events = 0
         # ::::: facultative constraints
         self.add_state_change_count_variables()
-        self.add_path_variability_penalty_variables()
+        if self.variability_penalty:
+            self.add_path_variability_penalty_variables()
+        else:
+            # penalty is zero on every path, no variables needed:
+            self.total_path_variability_penalty_count = 0
 
         if self.add_state_change_count_constraints_flag:
             self.add_state_change_count_constraints()  # count state changes on each edge (sum of number of changes, binary for each edge)
@@ -209,7 +308,7 @@ class Model:
             name="total_complexity_components",
         )
         # total complexity cannot exceed allowed complexity
-        self.model.addConstr(
+        self.tree_complexity_constr = self.model.addConstr(
             self.total_tree_complexity <= self.allowed_tree_complexity,
             name="tree_complexity_constr",
         )
@@ -234,6 +333,322 @@ class Model:
         if self.two_objectives:
             # noinspection PyArgumentList
             self.model.setObjectiveN(self.D, index=1, priority=0)
+        self.set_threads()
+
+    def set_threads(self):
+        if self.threads is None:
+            self.model.update()
+            self.threads = get_solver_threads(self.model.NumVars, self.cpus)
+        self.model.params.Threads = self.threads
+
+    def set_allowed_complexity(self, allowed_tree_complexity):
+        """
+        Update the right-hand side of the tree complexity constraint in place.
+        Only this bound differs between iterations of the complexity sweep, so the same model (and the solver state
+        kept by gurobi between solves) can be re-optimised for each allowed complexity instead of being rebuilt.
+        """
+        logger.debug(
+            "%s_%s_allowed_complexity_%s",
+            self.tumour_id,
+            self.segment,
+            allowed_tree_complexity,
+        )
+        self.allowed_tree_complexity = allowed_tree_complexity
+        self.tree_complexity_constr.RHS = allowed_tree_complexity
+
+    # variables passed between iterations of the complexity sweep as a MIP start:
+    warm_start_families = [
+        "X",
+        "CN_diff_edges_amp",
+        "CN_diff_edges_del",
+        "cpn_change_up",
+        "cpn_change_down",
+        "yhat_above_upper_CI",
+        "yhat_below_lower_CI",
+        "CI_overlap",
+        "more_than_1_amp_change",
+        "more_than_1_del_change",
+    ]
+
+    def get_start_values(self):
+        """
+        Collect values of the current solution for all variable families used as a MIP start in the next iteration.
+        """
+        return {
+            family: {
+                allele: {key: var.X for key, var in variables.items()}
+                for allele, variables in getattr(self, family).items()
+            }
+            for family in self.warm_start_families
+        }
+
+    def set_start_values(self, start_values):
+        """
+        Load values returned by get_start_values (possibly from another model of the same segment) as a MIP start.
+        A solution found with lower allowed complexity is always feasible, because the complexity constraint only
+        gets looser.
+        """
+        start_vars = []
+        start_vals = []
+        for family, alleles in start_values.items():
+            for allele, values in alleles.items():
+                variables = getattr(self, family).get(allele, {})
+                for key, value in values.items():
+                    if key in variables:
+                        start_vars.append(variables[key])
+                        start_vals.append(value)
+        self.model.setAttr("Start", start_vars, start_vals)
+        self.warm_start_vars = start_vars
+        self.warm_start_vals = np.array(start_vals, dtype=float)
+        self.warm_start_loaded = len(start_vars) > 0
+
+    def warm_start_callback(self, model, where):
+        """
+        Detect whether the MIP start was accepted: gurobi reports it in the log, which is passed to callbacks even if
+        OutputFlag is 0 (see WARM_START_MESSAGES), and an accepted start is the first incumbent of the optimisation.
+        """
+        if where == GRB.Callback.MESSAGE:
+            message = model.cbGet(GRB.Callback.MSG_STRING)
+            if any(m in message for m in WARM_START_MESSAGES):
+                self.warm_start_reported = True
+                self.warm_start_accepted = True
+        elif where == GRB.Callback.MIPSOL and not self.first_incumbent_checked:
+            self.first_incumbent_checked = True
+            incumbent = np.array(model.cbGetSolution(self.warm_start_vars))
+            if np.allclose(incumbent, self.warm_start_vals, atol=WARM_START_TOLERANCE):
+                self.warm_start_accepted = True
+
+    def optimize(self):
+        if self.warm_start_loaded:
+            self.warm_start_accepted = False
+            self.warm_start_reported = False
+            self.first_incumbent_checked = False
+            self.model.optimize(self.warm_start_callback)
+            if not self.warm_start_reported:
+                logger.debug(
+                    "MIP start was not reported in the gurobi log (messages of gurobi 13.0 expected), accepted: %s "
+                    "(first incumbent compared with the start)",
+                    self.warm_start_accepted,
+                )
+        else:
+            self.warm_start_accepted = None
+            self.model.optimize()
+
+    def optimize_scenarios(self, allowed_complexities):
+        """
+        Solve the model for all allowed complexities in one multi-scenario optimisation: models of the complexity
+        sweep differ only in the right-hand side of the tree complexity constraint, so each allowed complexity is a
+        scenario of the same model.
+        Gurobi does not combine multiple scenarios with multiple objectives, so the lexicographic objective is solved
+        in two phases (epsilon-constraint): CI score in each scenario, then D score with the CI score of each scenario
+        bounded by its optimum.
+        Returns True if all scenarios were solved to optimality. The model is changed and cannot be re-optimised for a
+        single allowed complexity afterwards.
+        """
+        self.scenario_complexities = list(allowed_complexities)
+        self.scenario_run_time = 0
+        self.model.NumObj = 0
+        # objectives are only reset on update:
+        self.model.update()
+        self.model.setObjective(self.Z, GRB.MINIMIZE)
+        self.model.NumScenarios = len(self.scenario_complexities)
+        for scenario, allowed_complexity in enumerate(self.scenario_complexities):
+            self.model.params.ScenarioNumber = scenario
+            self.tree_complexity_constr.ScenNRhs = allowed_complexity
+        if not self.optimize_all_scenarios():
+            return False
+        if self.two_objectives:
+            CI_scores = []
+            for scenario in range(len(self.scenario_complexities)):
+                self.model.params.ScenarioNumber = scenario
+                CI_scores.append(int(round(self.model.ScenNObjVal)))
+            # CI score is integer, bound is rounded up to avoid cutting off optimum due to tolerances:
+            CI_score_constr = self.model.addConstr(
+                self.Z <= max(CI_scores) + 0.5, name="CI_score_constr"
+            )
+            self.model.setObjective(self.D, GRB.MINIMIZE)
+            for scenario, CI_score in enumerate(CI_scores):
+                self.model.params.ScenarioNumber = scenario
+                CI_score_constr.ScenNRhs = CI_score + 0.5
+            if not self.optimize_all_scenarios():
+                return False
+        return True
+
+    def optimize_all_scenarios(self):
+        self.model.optimize()
+        self.scenario_run_time += self.model.Runtime
+        return (
+            self.model.Status == GRB.OPTIMAL
+            and self.model.SolCount > 0
+            and all(
+                self.get_scenario_objective(scenario) < GRB.INFINITY
+                for scenario in range(len(self.scenario_complexities))
+            )
+        )
+
+    def get_solve_record(self, scenario=None):
+        """
+        Compact record of the last optimisation (of a scenario, see optimize_scenarios), kept by SegmentSolution in
+        place of the gurobi model
+        """
+        has_solution = self.model.SolCount > 0
+        return {
+            "status": self.model.Status,
+            "run_time": (
+                self.model.Runtime if scenario is None else self.scenario_run_time
+            ),
+            "time_limit": self.model.params.TimeLimit,
+            # not available for multi-objective models:
+            "mip_gap": self.get_attribute("MIPGap") if has_solution else None,
+            "node_count": self.model.NodeCount,
+            "objective_values": (
+                (
+                    self.get_value(self.Z, scenario),
+                    self.get_value(self.D, scenario),
+                )
+                if has_solution
+                else None
+            ),
+        }
+
+    def get_attribute(self, name):
+        try:
+            return getattr(self.model, name)
+        except AttributeError:
+            return None
+
+    def dispose(self):
+        """
+        Free the memory of the gurobi model (and of its environment). The model cannot be used afterwards.
+        """
+        self.model.dispose()
+        if self.env is not None:
+            self.env.dispose()
+
+    def get_scenario_objective(self, scenario):
+        self.model.params.ScenarioNumber = scenario
+        return self.model.ScenNObjVal
+
+    def get_value(self, var, scenario=None):
+        """
+        Value of a variable or linear expression in the current solution, or in the solution of a scenario
+        (see optimize_scenarios). Constants are returned as they are.
+        """
+        if isinstance(var, gp.LinExpr):
+            if scenario is None:
+                return var.getValue()
+            return var.getConstant() + sum(
+                var.getCoeff(i) * self.get_value(var.getVar(i), scenario)
+                for i in range(var.size())
+            )
+        if not isinstance(var, gp.Var):
+            return var
+        if scenario is None:
+            return var.X
+        return var.ScenNX
+
+    def get_scenario_output(self, scenario):
+        """
+        Output of the solution of a scenario, as get_output for the allowed complexity of the scenario
+        """
+        self.model.params.ScenarioNumber = scenario
+        self.allowed_tree_complexity = self.scenario_complexities[scenario]
+        return self.get_output(scenario)
+
+    def derive_cn_upper_bound(self, allele):
+        """
+        Derive a safe upper bound K on integer copy number of all clones from CIs and clone proportions.
+        For every sample s and clone c present in s with proportion p_cs, choose K such that p_cs * K >= max(U_s, Y_s).
+        Capping every clone at K = min(X, K) never makes a solution worse:
+        - any sample containing a capped clone keeps Yhat_s >= max(U_s, Y_s), so its distance to Y and CI status
+          can only improve,
+        - capping is monotone and identical for all clones, so no event is created and no event gets larger.
+        Clone specific bounds could create events between a clone and its parent, so the bound is shared by all clones.
+        The bound is never larger than big_M, which implicitly limited copy numbers before.
+        """
+        proportions = self.clone_proportions.loc[
+            self.clone_names, self.sample_names
+        ].to_numpy(dtype=float)
+        ceiling = np.maximum(
+            self.ci_bounds[f"upper_CI_{allele}"],
+            np.array([self.Y[allele][sample] for sample in self.sample_names]),
+        )
+        present = proportions > 0
+        if not present.any():
+            return self.big_M
+        required = np.ceil(
+            np.broadcast_to(ceiling, proportions.shape)[present] / proportions[present]
+        )
+        return int(min(max(required.max(), 1), self.big_M))
+
+    def get_CI_big_M(self, allele):
+        """
+        Per-sample big-M of CI constraints. M must bound the distance between Yhat (from 0 to the largest possible
+        Yhat) and either CI: at least the upper CI, and the largest possible Yhat plus the depth of a negative CI
+        (CI tables passed by the user are not clipped at zero).
+        """
+        if not self.derive_cn_bounds_flag:
+            return np.full(len(self.sample_names), float(self.big_M))
+        proportions = self.clone_proportions.loc[
+            self.clone_names, self.sample_names
+        ].to_numpy(dtype=float)
+        max_Yhat = proportions.sum(axis=0) * self.cn_upper_bound[allele]
+        lowest_CI = np.minimum(
+            self.ci_bounds[f"lower_CI_{allele}"], self.ci_bounds[f"upper_CI_{allele}"]
+        )
+        return (
+            np.maximum(
+                max_Yhat + np.maximum(0, -lowest_CI),
+                self.ci_bounds[f"upper_CI_{allele}"],
+            )
+            + 1
+        )
+
+    def get_event_big_M(self, allele):
+        """
+        Big-M binarising magnitude of change on an edge: change cannot exceed the copy number upper bound
+        """
+        if not self.derive_cn_bounds_flag:
+            return self.big_M
+        return self.cn_upper_bound[allele]
+
+    def get_path_big_M(self, path_edges):
+        """
+        Big-M binarising number of changes on a path: the count cannot exceed the number of edges on the path
+        """
+        if not self.derive_cn_bounds_flag:
+            return self.big_M
+        return max(2, len(path_edges))
+
+    def add_implication(self, indicator, value, lhs, sense, rhs, M, name):
+        """
+        Add constraint: indicator == value => lhs (sense) rhs, where sense is GRB.LESS_EQUAL or GRB.GREATER_EQUAL.
+        Formulation depends on self.formulation:
+        bigM: lhs >= rhs - M * (1 - indicator) (value=1) or lhs >= rhs - M * indicator (value=0), same for <=
+              with the sign of M flipped. M must bound the violation of the constraint when it is not enforced.
+        indicator: gurobi indicator (general) constraint, M is not used
+        sos: lhs + s >= rhs (or lhs - s <= rhs) with slack s >= 0 and SOS1 constraint on (s, a), where a is 1 when
+             the implication is enforced. SOS1 allows only one of them to be non-zero, so s = 0 when a = 1.
+        """
+        if self.formulation == "bigM":
+            not_enforced = (1 - indicator) if value == 1 else indicator
+            if sense == GRB.GREATER_EQUAL:
+                return self.model.addConstr(lhs >= rhs - M * not_enforced, name=name)
+            return self.model.addConstr(lhs <= rhs + M * not_enforced, name=name)
+        if self.formulation == "indicator":
+            return self.model.addGenConstrIndicator(
+                indicator, value, lhs, sense, rhs, name=name
+            )
+        slack = self.model.addVar(lb=0, name=f"{name}_slack")
+        if value == 1:
+            enforced = indicator
+        else:
+            enforced = self.model.addVar(vtype=GRB.BINARY, name=f"{name}_enforced")
+            self.model.addConstr(enforced == 1 - indicator, name=f"{name}_enforced")
+        self.model.addSOS(GRB.SOS_TYPE1, [slack, enforced], [1, 2])
+        if sense == GRB.GREATER_EQUAL:
+            return self.model.addConstr(lhs + slack >= rhs, name=name)
+        return self.model.addConstr(lhs - slack <= rhs, name=name)
 
     def add_Yhat_constraints(self):
         for allele in ["A", "B"]:
@@ -252,13 +667,34 @@ class Model:
                 name=f"Yhat{allele}_constr",
             )
 
+    def add_CI_variables(self, allele):
+        """
+        Look up confidence intervals (constants resolved once per segment) and create the binary indicators used by
+        add_CI_constraints
+        """
+        self.CI_upper[allele] = dict(
+            zip(self.sample_names, self.ci_bounds[f"upper_CI_{allele}"])
+        )
+        self.CI_lower[allele] = dict(
+            zip(self.sample_names, self.ci_bounds[f"lower_CI_{allele}"])
+        )
+        self.yhat_above_upper_CI[allele] = self.model.addVars(
+            self.sample_names, name=f"Yhat{allele}_CI_above_upper", vtype=GRB.BINARY
+        )
+        self.yhat_below_lower_CI[allele] = self.model.addVars(
+            self.sample_names, name=f"Yhat{allele}_CI_below_lower", vtype=GRB.BINARY
+        )
+        self.CI_overlap[allele] = self.model.addVars(
+            self.sample_names, name=f"Yhat{allele}_CI_overlap", vtype=GRB.BINARY
+        )
+
     def add_CI_constraints(self):
         """
         Introduce indicator variable to check if Yhat (predicted fractional copy-number) is above the upper CI or below the lower CI:
         Variables:
         Yhat (continuous, predicted fractional copy number)
-        L = lower CI (continuous)
-        U = upper CI (continuous)
+        L = lower CI (constant)
+        U = upper CI (constant)
         z = binary indicator variable (1 if Yhat is above upper CI or below lower CI, 0 otherwise)
         M = bigM (large positive number)
 
@@ -269,6 +705,9 @@ class Model:
         Yhat <= L + M * (1-zl): if Yhat is below lower CI, zl = 1, otherwise zl = 0
         Yhat >= L - M * zl: if Yhat is below lower CI, zl = 1, otherwise zl = 0
 
+        i.e. implications zu = 1 => Yhat >= U, zu = 0 => Yhat <= U, zl = 1 => Yhat <= L, zl = 0 => Yhat >= L,
+        formulated with big-M, indicator or SOS constraints depending on self.formulation (see add_implication)
+
         Implementing the OR constraint:
 
         implementation using gurobi or_() function:
@@ -286,99 +725,50 @@ class Model:
 
         """
         for allele in ["A", "B"]:
-            self.CI_upper[allele] = self.model.addVars(
-                self.sample_names,
-                name=f"{allele}_CI_upper",
-                vtype=GRB.CONTINUOUS,
-                lb=float("-inf"),
-            )
-            self.model.addConstrs(
-                (
-                    self.CI_upper[allele][sample]
-                    == (
-                        self.ci_table[
-                            (self.ci_table["segment"] == self.segment)
-                            & (self.ci_table["sample"] == sample)
-                        ][f"upper_CI_{allele}"].iloc[0]
-                    )
-                    for sample in self.sample_names
-                ),
-                name="upper_CI",
-            )
-
-            self.CI_lower[allele] = self.model.addVars(
-                self.sample_names,
-                name=f"{allele}_CI_lower",
-                vtype=GRB.CONTINUOUS,
-                lb=float("-inf"),
-            )
-            self.model.addConstrs(
-                (
-                    self.CI_lower[allele][sample]
-                    == (
-                        self.ci_table[
-                            (self.ci_table["segment"] == self.segment)
-                            & (self.ci_table["sample"] == sample)
-                        ][f"lower_CI_{allele}"].iloc[0]
-                    )
-                    for sample in self.sample_names
-                ),
-                name="lower_CI",
-            )
-
-            self.yhat_above_upper_CI[allele] = self.model.addVars(
-                self.sample_names, name=f"Yhat{allele}_CI_above_upper", vtype=GRB.BINARY
-            )
-            self.yhat_below_lower_CI[allele] = self.model.addVars(
-                self.sample_names, name=f"Yhat{allele}_CI_below_lower", vtype=GRB.BINARY
-            )
-            self.CI_overlap[allele] = self.model.addVars(
-                self.sample_names, name=f"Yhat{allele}_CI_overlap", vtype=GRB.BINARY
-            )
-
-            M = 1000
+            self.add_CI_variables(allele)
+            M = dict(zip(self.sample_names, self.get_CI_big_M(allele)))
             # Yhat is above upper CI
-            self.model.addConstrs(
-                (
-                    self.Yhat[allele][sample]
-                    >= self.CI_upper[allele][sample]
-                    - M
-                    + M * (self.yhat_above_upper_CI[allele][sample])
-                    for sample in self.sample_names
-                ),
-                name=f"bigM_constr1L_CI_{allele}",
-            )
-
-            self.model.addConstrs(
-                (
-                    self.Yhat[allele][sample]
-                    <= self.CI_upper[allele][sample]
-                    + (M * self.yhat_above_upper_CI[allele][sample])
-                    for sample in self.sample_names
-                ),
-                name=f"bigM_constr2L_CI_{allele}",
-            )
-
+            for sample in self.sample_names:
+                self.add_implication(
+                    self.yhat_above_upper_CI[allele][sample],
+                    1,
+                    self.Yhat[allele][sample],
+                    GRB.GREATER_EQUAL,
+                    self.CI_upper[allele][sample],
+                    M[sample],
+                    name=f"bigM_constr1L_CI_{allele}[{sample}]",
+                )
+            for sample in self.sample_names:
+                self.add_implication(
+                    self.yhat_above_upper_CI[allele][sample],
+                    0,
+                    self.Yhat[allele][sample],
+                    GRB.LESS_EQUAL,
+                    self.CI_upper[allele][sample],
+                    M[sample],
+                    name=f"bigM_constr2L_CI_{allele}[{sample}]",
+                )
             # Yhat is below lower CI
-            self.model.addConstrs(
-                (
-                    self.Yhat[allele][sample]
-                    <= self.CI_lower[allele][sample]
-                    + M * (1 - self.yhat_below_lower_CI[allele][sample])
-                    for sample in self.sample_names
-                ),
-                name=f"bigM_constr1U_CI_{allele}",
-            )
-
-            self.model.addConstrs(
-                (
-                    self.Yhat[allele][sample]
-                    >= self.CI_lower[allele][sample]
-                    - (M * self.yhat_below_lower_CI[allele][sample])
-                    for sample in self.sample_names
-                ),
-                name=f"bigM_constr1U_CI_{allele}",
-            )
+            for sample in self.sample_names:
+                self.add_implication(
+                    self.yhat_below_lower_CI[allele][sample],
+                    1,
+                    self.Yhat[allele][sample],
+                    GRB.LESS_EQUAL,
+                    self.CI_lower[allele][sample],
+                    M[sample],
+                    name=f"bigM_constr1U_CI_{allele}[{sample}]",
+                )
+            for sample in self.sample_names:
+                self.add_implication(
+                    self.yhat_below_lower_CI[allele][sample],
+                    0,
+                    self.Yhat[allele][sample],
+                    GRB.GREATER_EQUAL,
+                    self.CI_lower[allele][sample],
+                    M[sample],
+                    name=f"bigM_constr2U_CI_{allele}[{sample}]",
+                )
 
             self.model.addConstrs(
                 (
@@ -427,13 +817,156 @@ class Model:
                 name=f"d{allele}_constraint_abs_2",
             )
 
+    def add_matrix_constraints(self, blocks, sense, rhs, name):
+        """
+        Add one row per sample in a single call: sum of coefficients @ variables over all blocks (sense) rhs.
+        blocks is a list of (coefficient matrix, variable dictionary, keys) tuples.
+        """
+        A = np.hstack([coefficients for coefficients, _, _ in blocks])
+        x = [variables[key] for _, variables, keys in blocks for key in keys]
+        self.model.addMConstr(A, x, sense, rhs, name=name)
+
+    def add_Yhat_constraints_matrix(self):
+        """
+        Matrix form of add_Yhat_constraints: Yhat - P @ X = 0, where P is the samples x clones proportion matrix
+        """
+        proportions = (
+            self.clone_proportions.loc[self.clone_names, self.sample_names]
+            .to_numpy(dtype=float)
+            .T
+        )
+        identity = np.eye(len(self.sample_names))
+        for allele in ["A", "B"]:
+            self.add_matrix_constraints(
+                [
+                    (identity, self.Yhat[allele], self.sample_names),
+                    (-proportions, self.X[allele], self.clone_names),
+                ],
+                GRB.EQUAL,
+                np.zeros(len(self.sample_names)),
+                name=f"Yhat{allele}_constr",
+            )
+
+    def add_CI_constraints_matrix(self):
+        """
+        Matrix form of add_CI_constraints, see add_CI_constraints for the description of the constraints
+        """
+        if self.formulation != "bigM":
+            # indicator and SOS constraints are added one by one
+            return self.add_CI_constraints()
+        samples = self.sample_names
+        identity = np.eye(len(samples))
+        zeros = np.zeros(len(samples))
+        for allele in ["A", "B"]:
+            self.add_CI_variables(allele)
+            M = self.get_CI_big_M(allele)
+            Yhat = (identity, self.Yhat[allele], samples)
+            CI_upper = self.ci_bounds[f"upper_CI_{allele}"]
+            CI_lower = self.ci_bounds[f"lower_CI_{allele}"]
+            # Yhat is above upper CI
+            self.add_matrix_constraints(
+                [
+                    Yhat,
+                    (-np.diag(M), self.yhat_above_upper_CI[allele], samples),
+                ],
+                GRB.GREATER_EQUAL,
+                CI_upper - M,
+                name=f"bigM_constr1L_CI_{allele}",
+            )
+            self.add_matrix_constraints(
+                [
+                    Yhat,
+                    (-np.diag(M), self.yhat_above_upper_CI[allele], samples),
+                ],
+                GRB.LESS_EQUAL,
+                CI_upper,
+                name=f"bigM_constr2L_CI_{allele}",
+            )
+            # Yhat is below lower CI
+            self.add_matrix_constraints(
+                [
+                    Yhat,
+                    (np.diag(M), self.yhat_below_lower_CI[allele], samples),
+                ],
+                GRB.LESS_EQUAL,
+                CI_lower + M,
+                name=f"bigM_constr1U_CI_{allele}",
+            )
+            self.add_matrix_constraints(
+                [
+                    Yhat,
+                    (np.diag(M), self.yhat_below_lower_CI[allele], samples),
+                ],
+                GRB.GREATER_EQUAL,
+                CI_lower,
+                name=f"bigM_constr2U_CI_{allele}",
+            )
+            CI_overlap = (identity, self.CI_overlap[allele], samples)
+            self.add_matrix_constraints(
+                [CI_overlap, (-identity, self.yhat_above_upper_CI[allele], samples)],
+                GRB.GREATER_EQUAL,
+                zeros,
+                name="CI_overlap_U",
+            )
+            self.add_matrix_constraints(
+                [CI_overlap, (-identity, self.yhat_below_lower_CI[allele], samples)],
+                GRB.GREATER_EQUAL,
+                zeros,
+                name="CI_overlap_L",
+            )
+            self.add_matrix_constraints(
+                [
+                    CI_overlap,
+                    (-identity, self.yhat_above_upper_CI[allele], samples),
+                    (-identity, self.yhat_below_lower_CI[allele], samples),
+                ],
+                GRB.LESS_EQUAL,
+                zeros,
+                name="CI_overlap_UL",
+            )
+
+    def add_absolute_distance_constraint_matrix(self):
+        """
+        Matrix form of add_absolute_distance_constraint: d - Yhat >= -Y and -d - Yhat <= -Y
+        """
+        samples = self.sample_names
+        identity = np.eye(len(samples))
+        for allele in ["A", "B"]:
+            Y = np.array([self.Y[allele][sample] for sample in samples])
+            self.add_matrix_constraints(
+                [
+                    (identity, self.d[allele], samples),
+                    (-identity, self.Yhat[allele], samples),
+                ],
+                GRB.GREATER_EQUAL,
+                -Y,
+                name=f"d{allele}_constraint_abs_1",
+            )
+            self.add_matrix_constraints(
+                [
+                    (-identity, self.d[allele], samples),
+                    (-identity, self.Yhat[allele], samples),
+                ],
+                GRB.LESS_EQUAL,
+                -Y,
+                name=f"d{allele}_constraint_abs_2",
+            )
+
     def add_diploid_pseudo_clone(self):
         self.tree_edges.add(("diploid", self.mrca))
         for allele in ["A", "B"]:
             self.X[allele]["diploid"] = self.model.addVar(name=f"X{allele}_diploid")
-            self.model.addConstr(self.X[allele]["diploid"] == 1)
+            self.model.addConstr(
+                self.X[allele]["diploid"] == 1, name=f"X{allele}_diploid"
+            )
 
     def add_event_count_variables(self):
+        """
+        Magnitudes of amplifications and deletions on each edge and their binary indicators (cpn_change_up/down).
+        With deduplicate_model the indicators defined here are the only ones in the model: state change counts,
+        path constraints and prevent_increase_from_zero all refer to them.
+        Otherwise add_state_change_count_variables creates a second set of indicators (the original construction).
+        """
         if not self.minimise_events_to_diploid:
             # remove events between diploid and mrca - required for correct event count in both scenarios
             self.tree_edges = [edge for edge in self.tree_edges if edge[0] != "diploid"]
@@ -441,10 +974,18 @@ class Model:
 
         for allele in ["A", "B"]:
             self.CN_diff_edges_amp[allele] = self.model.addVars(
-                self.tree_edges, name=f"amp_{allele}", vtype=GRB.INTEGER, lb=0
+                self.tree_edges,
+                name=f"amp_{allele}",
+                vtype=GRB.INTEGER,
+                lb=0,
+                ub=self.cn_upper_bound[allele],
             )
             self.CN_diff_edges_del[allele] = self.model.addVars(
-                self.tree_edges, name=f"del_{allele}", vtype=GRB.INTEGER, lb=0
+                self.tree_edges,
+                name=f"del_{allele}",
+                vtype=GRB.INTEGER,
+                lb=0,
+                ub=self.cn_upper_bound[allele],
             )
             self.cpn_change_up[allele] = self.model.addVars(
                 self.tree_edges, name=f"{allele}_cpn_change_up", vtype=GRB.BINARY
@@ -460,30 +1001,12 @@ class Model:
                     == self.X[allele][child] + self.CN_diff_edges_del[allele][edge],
                     name=f"events_{allele}_{edge}",
                 )
+                if self.deduplicate_model or self.exclusive_amp_del:
+                    U = self.get_event_big_M(allele)
+                    # each edge and each allele can have one change up or down. To reflect this we take the number of events (i.e. the magnitude of change) and binarize it to 0 and 1 states.
+                    self.binarise_edge_change(allele, edge, U)
                 # Constraint below ensures that deletion and amplification cannot be present on the same edge #
                 if self.exclusive_amp_del:
-                    U = 1000
-                    # each edge and each allele can have one change up or down. To reflect this we take the number of events (i.e. the magnitude of change) and binarize it to 0 and 1 states.
-                    self.model.addConstr(
-                        self.CN_diff_edges_amp[allele][edge]
-                        <= U * (self.cpn_change_up[allele][edge]),
-                        name=f"Ueps_constr1_{edge}_{allele}_up",
-                    )
-                    self.model.addConstr(
-                        self.CN_diff_edges_amp[allele][edge]
-                        >= self.cpn_change_up[allele][edge],
-                        name=f"Ueps_constr2_{edge}_{allele}_up",
-                    )
-                    self.model.addConstr(
-                        self.CN_diff_edges_del[allele][edge]
-                        <= U * (self.cpn_change_down[allele][edge]),
-                        name=f"Ueps_constr1_{edge}_{allele}_down",
-                    )
-                    self.model.addConstr(
-                        self.CN_diff_edges_del[allele][edge]
-                        >= self.cpn_change_down[allele][edge],
-                        name=f"Ueps_constr2_{edge}_{allele}_down",
-                    )
                     self.model.addConstr(
                         self.cpn_change_up[allele][edge]
                         + self.cpn_change_down[allele][edge]
@@ -513,11 +1036,44 @@ class Model:
             name="num_SCNA_events_count",
         )
 
+    def binarise_edge_change(self, allele, edge, U):
+        """
+        Indicator z is 1 if magnitude of change x (amplification or deletion) on the edge is positive, 0 otherwise:
+        z = 0 => x <= 0 (bigM: x <= U * z)
+        z = 1 => x >= 1 (bigM with M = 1: x >= z)
+        """
+        for change, indicator, direction in [
+            (self.CN_diff_edges_amp, self.cpn_change_up, "up"),
+            (self.CN_diff_edges_del, self.cpn_change_down, "down"),
+        ]:
+            self.add_implication(
+                indicator[allele][edge],
+                0,
+                change[allele][edge],
+                GRB.LESS_EQUAL,
+                0,
+                U,
+                name=f"Ueps_constr1_{edge}_{allele}_{direction}",
+            )
+            self.add_implication(
+                indicator[allele][edge],
+                1,
+                change[allele][edge],
+                GRB.GREATER_EQUAL,
+                1,
+                1,
+                name=f"Ueps_constr2_{edge}_{allele}_{direction}",
+            )
+
     def add_event_count_constraints(self):
         """
         Event = magnitude of change on edge,
         e.g. +4 = 4 events, -1 = 1 event
         """
+        if self.deduplicate_model:
+            # the reported event count already holds this sum
+            self.total_events = self.total_events_count
+            return
         self.total_events = self.model.addVar(
             vtype=GRB.INTEGER, lb=0, name="total_events"
         )
@@ -535,11 +1091,12 @@ class Model:
         z can only be zero when x is zero
         z can only be one when x is greater than zero
         """
-        U = 1000  # U must be higher than any anticipated copy number state
         if not self.minimise_events_to_diploid:
             # remove events between diploid and mrca - required for correct event count in both scenarios
             self.tree_edges = [edge for edge in self.tree_edges if edge[0] != "diploid"]
-        for allele in ["A", "B"]:
+        for allele in ["A", "B"] if not self.deduplicate_model else []:
+            # U must be higher than any anticipated copy number state
+            U = self.get_event_big_M(allele)
             self.cpn_change_up[allele] = self.model.addVars(
                 self.tree_edges, name=f"{allele}_cpn_change_up", vtype=GRB.BINARY
             )
@@ -548,26 +1105,7 @@ class Model:
             )
             for edge in self.tree_edges:
                 # each edge and each allele can have one change up or down. To reflect this we take the number of events (i.e. the magnitude of change) and binarize it to 0 and 1 states.
-                self.model.addConstr(
-                    self.CN_diff_edges_amp[allele][edge]
-                    <= U * (self.cpn_change_up[allele][edge]),
-                    name=f"Ueps_constr1_{edge}_{allele}_up",
-                )
-                self.model.addConstr(
-                    self.CN_diff_edges_amp[allele][edge]
-                    >= self.cpn_change_up[allele][edge],
-                    name=f"Ueps_constr2_{edge}_{allele}_up",
-                )
-                self.model.addConstr(
-                    self.CN_diff_edges_del[allele][edge]
-                    <= U * (self.cpn_change_down[allele][edge]),
-                    name=f"Ueps_constr1_{edge}_{allele}_down",
-                )
-                self.model.addConstr(
-                    self.CN_diff_edges_del[allele][edge]
-                    >= self.cpn_change_down[allele][edge],
-                    name=f"Ueps_constr2_{edge}_{allele}_down",
-                )
+                self.binarise_edge_change(allele, edge, U)
 
         self.total_edge_changes_count = self.model.addVar(
             name="num_SCNA_events_count", lb=0, vtype=GRB.INTEGER
@@ -585,6 +1123,9 @@ class Model:
         )
 
     def add_state_change_count_constraints(self):
+        if self.deduplicate_model:
+            self.total_edge_changes = self.total_edge_changes_count
+            return
         self.total_edge_changes = self.model.addVar(
             name="num_SCNA_events", lb=0, vtype=GRB.INTEGER
         )  # this component is used in final complexity calculation
@@ -600,6 +1141,57 @@ class Model:
             name="edge_change_count_constr",
         )
 
+    def add_cumulative_change_counts(self):
+        """
+        Number of edges with amplification (deletion) on the path from MRCA to each clone:
+        c_up[child] = c_up[parent] + z_up[parent, child], c_up[MRCA] = 0
+        Every edge is added once, so prefixes shared by root-to-leaf paths are not summed again for every leaf
+        and the number of nonzeros grows with the number of edges rather than with the total length of all paths.
+        Count on a path is the cumulative count of its last clone.
+        """
+        if self.cumulative_amps:
+            return
+        path_edges = sorted(
+            {edge for path in self.tree for edge in zip(path[:-1], path[1:])}
+        )
+        for allele in ["A", "B"]:
+            for cumulative, indicator, direction in [
+                (self.cumulative_amps, self.cpn_change_up, "amps"),
+                (self.cumulative_dels, self.cpn_change_down, "dels"),
+            ]:
+                cumulative[allele] = self.model.addVars(
+                    self.clone_names,
+                    name=f"cumulative_{direction}_{allele}",
+                    lb=0,
+                    vtype=GRB.INTEGER,
+                )
+                cumulative[allele][self.mrca].UB = 0
+                for edge in path_edges:
+                    parent, child = edge
+                    self.model.addConstr(
+                        cumulative[allele][child]
+                        == cumulative[allele][parent] + indicator[allele][edge],
+                        name=f"cumulative_{direction}_{allele}_{edge}",
+                    )
+
+    def get_path_change_counts(self, allele, path):
+        """
+        Number of edges with amplification and with deletion on a root-to-leaf path, either as cumulative count
+        variables (cumulative_path_counts) or as sums of edge change indicators over the edges of the path.
+        """
+        if self.cumulative_path_counts:
+            self.add_cumulative_change_counts()
+            leaf = path[-1]
+            return (
+                self.cumulative_amps[allele][leaf],
+                self.cumulative_dels[allele][leaf],
+            )
+        path_edges = find_path_edges(path, self.tree_edges)
+        return (
+            gp.quicksum([self.cpn_change_up[allele][edge] for edge in path_edges]),
+            gp.quicksum([self.cpn_change_down[allele][edge] for edge in path_edges]),
+        )
+
     def add_allow_only_one_non_directional_event(self):
         """
         Each path from MRCA to a leaf can only have one event going in the opposite direction to the rest of the path. For example, if there are two gains/amplifications, then we can have only one loss on the same path.
@@ -615,74 +1207,91 @@ class Model:
         x <= 1 + U*y
         if x is 0 or 1, y can have any value because both 0 and 1 are less or equal to 1
         if x is 2 or more, then y must be 1, because right-hand side must be at least 2, so 1 + non-zero number
+        These are the implications y = 1 => x >= 2 and y = 0 => x <= 1 (see add_implication)
         """
-        U = 1000
         for allele in ["A", "B"]:
             self.amps_count_on_path[allele] = {}
             self.dels_count_on_path[allele] = {}
             self.more_than_1_amp_change[allele] = {}
             self.more_than_1_del_change[allele] = {}
             for path_index, path in enumerate(self.tree):
-                path_edges = find_path_edges(path, self.tree_edges)
+                U = self.get_path_big_M(list(zip(path[:-1], path[1:])))
+                amps_on_path, dels_on_path = self.get_path_change_counts(allele, path)
 
                 # amps
-                self.amps_count_on_path[allele][path_index] = self.model.addVar(
-                    name=f"{allele}_{path_index}_amps_count_on_path",
-                    lb=0,
-                    vtype=GRB.INTEGER,
-                )
-                self.model.addConstr(
-                    self.amps_count_on_path[allele][path_index]
-                    == gp.quicksum(
-                        [self.cpn_change_up[allele][edge] for edge in path_edges]
+                if self.cumulative_path_counts:
+                    self.amps_count_on_path[allele][path_index] = amps_on_path
+                else:
+                    self.amps_count_on_path[allele][path_index] = self.model.addVar(
+                        name=f"{allele}_{path_index}_amps_count_on_path",
+                        lb=0,
+                        vtype=GRB.INTEGER,
+                    )
+                    self.model.addConstr(
+                        self.amps_count_on_path[allele][path_index] == amps_on_path,
+                        name=f"{allele}_{path_index}_amps_count_on_path",
                     )
-                )
 
                 self.more_than_1_amp_change[allele][path_index] = self.model.addVar(
                     name=f"{allele}_{path_index}_more_than_1_amp_change",
                     vtype=GRB.BINARY,
                 )
 
-                # self.model.addGenConstrIndicator(self.more_than_1_amp_change[allele][path_index], True, self.amps_count_on_path[allele][path_index] >= 2, name=f'{allele}_{path_index}_more_than_1_amp_change_ctr')
-                self.model.addConstr(
-                    self.amps_count_on_path[allele][path_index]
-                    >= 2 - U + U * self.more_than_1_amp_change[allele][path_index],
-                    f"{allele}_{path_index}_more_than_1_amp_change_ctr",
+                self.add_implication(
+                    self.more_than_1_amp_change[allele][path_index],
+                    1,
+                    self.amps_count_on_path[allele][path_index],
+                    GRB.GREATER_EQUAL,
+                    2,
+                    U,
+                    name=f"{allele}_{path_index}_more_than_1_amp_change_ctr",
                 )
-                self.model.addConstr(
-                    self.amps_count_on_path[allele][path_index]
-                    <= 1 + U * self.more_than_1_amp_change[allele][path_index],
-                    f"{allele}_{path_index}_more_than_1_amp_change_ctr",
+                self.add_implication(
+                    self.more_than_1_amp_change[allele][path_index],
+                    0,
+                    self.amps_count_on_path[allele][path_index],
+                    GRB.LESS_EQUAL,
+                    1,
+                    U,
+                    name=f"{allele}_{path_index}_more_than_1_amp_change_ctr",
                 )
 
                 # dels
-                self.dels_count_on_path[allele][path_index] = self.model.addVar(
-                    name=f"{allele}_{path_index}_dels_count_on_path",
-                    lb=0,
-                    vtype=GRB.INTEGER,
-                )
-                self.model.addConstr(
-                    self.dels_count_on_path[allele][path_index]
-                    == gp.quicksum(
-                        [self.cpn_change_down[allele][edge] for edge in path_edges]
+                if self.cumulative_path_counts:
+                    self.dels_count_on_path[allele][path_index] = dels_on_path
+                else:
+                    self.dels_count_on_path[allele][path_index] = self.model.addVar(
+                        name=f"{allele}_{path_index}_dels_count_on_path",
+                        lb=0,
+                        vtype=GRB.INTEGER,
+                    )
+                    self.model.addConstr(
+                        self.dels_count_on_path[allele][path_index] == dels_on_path,
+                        name=f"{allele}_{path_index}_dels_count_on_path",
                     )
-                )
 
                 self.more_than_1_del_change[allele][path_index] = self.model.addVar(
                     name=f"{allele}_{path_index}_more_than_1_del_change",
                     vtype=GRB.BINARY,
                 )
 
-                # self.model.addGenConstrIndicator(self.more_than_1_del_change[allele][path_index], True, self.dels_count_on_path[allele][path_index] >= 2, name=f'{allele}_{path_index}_more_than_1_amp_change_ctr')
-                self.model.addConstr(
-                    self.dels_count_on_path[allele][path_index]
-                    >= 2 - U + U * self.more_than_1_del_change[allele][path_index],
-                    f"{allele}_{path_index}_more_than_1_del_change_ctr",
+                self.add_implication(
+                    self.more_than_1_del_change[allele][path_index],
+                    1,
+                    self.dels_count_on_path[allele][path_index],
+                    GRB.GREATER_EQUAL,
+                    2,
+                    U,
+                    name=f"{allele}_{path_index}_more_than_1_del_change_ctr",
                 )
-                self.model.addConstr(
-                    self.dels_count_on_path[allele][path_index]
-                    <= 1 + U * self.more_than_1_del_change[allele][path_index],
-                    f"{allele}_{path_index}_more_than_1_del_change_ctr",
+                self.add_implication(
+                    self.more_than_1_del_change[allele][path_index],
+                    0,
+                    self.dels_count_on_path[allele][path_index],
+                    GRB.LESS_EQUAL,
+                    1,
+                    U,
+                    name=f"{allele}_{path_index}_more_than_1_del_change_ctr",
                 )
 
                 # amps and dels cannot have more than one change on the same path:
@@ -707,31 +1316,55 @@ class Model:
                     name=f"prevent_increase_from_zero_{edge}_{allele}",
                 )
 
+    def add_binary_product(self, x, y, name):
+        """
+        Continuous variable w equal to the product of binary variables x and y:
+        w <= x, w <= y, w >= x + y - 1
+        """
+        w = self.model.addVar(lb=0, ub=1, name=name)
+        self.model.addConstr(w <= x, name=f"{name}_1")
+        self.model.addConstr(w <= y, name=f"{name}_2")
+        self.model.addConstr(w >= x + y - 1, name=f"{name}_3")
+        return w
+
     def add_path_variability_penalty_variables(self):
         """
         Introduce variables to represent each path and each allele
         For each path and each allele, total additional cost equals: variability_penalty * number_of_edges_with_positive_cpn_change * number_of_edges_with_negative_cpn_change
         This approach allows for different states on different paths, but penalizes paths with more state changes
+        The product of the two counts is the sum of up[e] * down[f] over all pairs of edges (e, f) on the path.
+        Each product of binaries is linearised once (see add_binary_product) and shared by all paths containing
+        both edges, so the model stays linear.
+        Only added if variability_penalty is non-zero.
         """
         for allele in ["A", "B"]:
+            self.edge_pair_changes[allele] = {}
             self.path_variability_penalty[allele] = self.model.addVars(
                 range(0, len(self.tree)),
                 name=f"path_variability_penalty_{allele}",
                 vtype=GRB.INTEGER,
             )
             for path_index, path in enumerate(self.tree):
-                path_edges = find_path_edges(path, self.tree_edges)
+                path_edges = list(zip(path[:-1], path[1:]))
+                for edge_up in path_edges:
+                    for edge_down in path_edges:
+                        if (edge_up, edge_down) not in self.edge_pair_changes[allele]:
+                            self.edge_pair_changes[allele][(edge_up, edge_down)] = (
+                                self.add_binary_product(
+                                    self.cpn_change_up[allele][edge_up],
+                                    self.cpn_change_down[allele][edge_down],
+                                    name=f"edge_pair_changes_{allele}_{edge_up}_{edge_down}",
+                                )
+                            )
                 self.model.addConstr(
                     self.path_variability_penalty[allele][path_index]
-                    == (
-                        self.variability_penalty
-                        * gp.quicksum(
-                            [self.cpn_change_up[allele][edge] for edge in path_edges]
-                        )
-                        * gp.quicksum(
-                            [self.cpn_change_down[allele][edge] for edge in path_edges]
-                        )
-                    )
+                    == self.variability_penalty
+                    * gp.quicksum(
+                        self.edge_pair_changes[allele][(edge_up, edge_down)]
+                        for edge_up in path_edges
+                        for edge_down in path_edges
+                    ),
+                    name=f"path_variability_penalty_{allele}[{path_index}]",
                 )
         self.total_path_variability_penalty_count = self.model.addVar(
             name="total_path_variability_penalty_count", lb=0, vtype=GRB.INTEGER
@@ -746,6 +1379,11 @@ class Model:
         )
 
     def add_path_variability_penalty_constraints(self):
+        if self.deduplicate_model or not self.variability_penalty:
+            self.total_path_variability_penalty = (
+                self.total_path_variability_penalty_count
+            )
+            return
         self.total_path_variability_penalty = self.model.addVar(
             name="total_path_variability_penalty", lb=0, vtype=GRB.INTEGER
         )
@@ -888,8 +1526,8 @@ class Model:
 
     def restrict_to_clonal_only(self):
         if "diploid" in self.clone_names:
-            print(
-                "Error - remove diploid from clone lists before applying this constraint"
+            logger.error(
+                "Remove diploid from clone lists before applying this constraint"
             )
         number_of_clones = len(self.clone_names)
         for clone in self.clone_names:
@@ -900,10 +1538,43 @@ class Model:
                     name=f"clonal_{allele}",
                 )
 
-    def get_output(self):
+    def model_stats(self):
+        """
+        Number of variables and constraints in the model by family.
+        Family is the variable or constraint name stripped of allele, sample, edge and path indices,
+        e.g. 'Ueps_constr1_('clone1', 'clone2')_A_up' -> 'Ueps_constr1_up'.
+        Returns a data frame with columns: kind, family, count (sorted by kind and count)
+        """
+        self.model.update()
+        items = [("variable", v.VarName, v.VType) for v in self.model.getVars()] + [
+            ("constraint", c.ConstrName, "linear") for c in self.model.getConstrs()
+        ]
+        items += [
+            ("constraint", q.QCName, "quadratic") for q in self.model.getQConstrs()
+        ]
+        items += [
+            ("constraint", g.GenConstrName, "general")
+            for g in self.model.getGenConstrs()
+        ]
+        items += [("constraint", "SOS", "sos") for _ in self.model.getSOSs()]
+        stats = pd.DataFrame(items, columns=["kind", "name", "type"])
+        labels = sorted(
+            set(self.clone_names) | set(self.sample_names), key=len, reverse=True
+        )
+        stats["family"] = [get_model_family(name, labels) for name in stats["name"]]
+        stats = (
+            stats.groupby(["kind", "family", "type"])
+            .size()
+            .reset_index(name="count")
+            .sort_values(["kind", "count"], ascending=[False, False])
+            .reset_index(drop=True)
+        )
+        return stats
+
+    def get_output(self, scenario=None):
         A = pd.DataFrame(
             {
-                c: [int(round(cn_val.X))]
+                c: [int(round(self.get_value(cn_val, scenario)))]
                 for c, cn_val in self.X["A"].items()
                 if c[0] != "diploid"
             },
@@ -911,7 +1582,7 @@ class Model:
         ).T
         B = pd.DataFrame(
             {
-                c: [int(round(cn_val.X))]
+                c: [int(round(self.get_value(cn_val, scenario)))]
                 for c, cn_val in self.X["B"].items()
                 if c[0] != "diploid"
             },
@@ -920,16 +1591,22 @@ class Model:
         solution = pd.merge(A, B, left_index=True, right_index=True)
         self.A = A
         self.B = B
-        self.total_score = self.Z.getValue() + self.D.getValue()
-        self.complexity = int(self.total_tree_complexity.X)
+        Z = self.get_value(self.Z, scenario)
+        D = self.get_value(self.D, scenario)
+        self.total_score = Z + D
+        self.complexity = int(
+            round(self.get_value(self.total_tree_complexity, scenario))
+        )
         solution["complexity"] = self.complexity
-        solution["CI_score"] = int(self.Z.getValue())
-        solution["D_score"] = round(self.D.getValue(), 3)
+        solution["CI_score"] = int(round(Z))
+        solution["D_score"] = round(D, 3)
         solution["variability_penalty_count"] = int(
-            self.total_path_variability_penalty_count.X
+            self.get_value(self.total_path_variability_penalty_count, scenario)
+        )
+        solution["state_change_count"] = int(
+            self.get_value(self.total_edge_changes_count, scenario)
         )
-        solution["state_change_count"] = int(self.total_edge_changes_count.X)
-        solution["event_count"] = int(self.total_events_count.X)
+        solution["event_count"] = int(self.get_value(self.total_events_count, scenario))
         solution["allowed_complexity"] = self.allowed_tree_complexity
         solution.index.name = "clone"
         solution.reset_index(inplace=True)
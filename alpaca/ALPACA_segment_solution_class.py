@@ -1,17 +1,49 @@
 import os
-from datetime import datetime
+import hashlib
+import json
 import pandas as pd
 import numpy as np
 import math
-import kneed
 from scipy.stats import norm
 import typing
 from typing import Optional, Dict, Any
 import time
-from alpaca.ALPACA_model_class import Model
-from alpaca.utils import read_tree_json
+from gurobipy import GRB
+from alpaca.ALPACA_model_class import Model, HOMO_DEL_SIZE_LIMIT
+from alpaca.knee_detection import KneeDetector, find_knees, select_knee
+from alpaca.output_store import get_output_store, writes_csv
+from alpaca.utils import read_tree_json, get_segment_ci_bounds, get_length_from_name
+from alpaca.search_strategies import get_search_strategy
 import logging
 
+# model parameters which do not change solutions of the sweep, excluded from the problem hash (see get_problem_hash):
+# d_zero is only used to select the elbow from the solutions, missing clones inherit copy numbers of their children
+# after the sweep (see combine_solutions), and search settings only decide how the sweep is solved (a cached sweep is
+# used whichever search strategy found it):
+NON_SOLVER_MODEL_CONFIG = [
+    "cpus",
+    "threads",
+    "gurobi_logs",
+    "license",
+    "d_zero",
+    "missing_clones_inherit_from_children_flag",
+    "search_strategy",
+    "slack_early_stop",
+    "reuse_model",
+    "warm_start",
+]
+# input values are compared with this precision in the problem hash:
+PROBLEM_HASH_DECIMALS = 9
+
+logger = logging.getLogger("ALPACA")
+
+
+def round_for_hash(values):
+    # adding 0.0 turns -0.0 into 0.0
+    return (
+        np.round(np.asarray(values, dtype=float), PROBLEM_HASH_DECIMALS) + 0.0
+    ).tolist()
+
 
 def ensure_elbow_strictly_decreasing(df):
     for col in ["D_score"]:
@@ -31,44 +63,11 @@ def ensure_elbow_strictly_decreasing(df):
 
 
 def find_s_values(elbow_search_df, max_iterations, x="allowed_complexity", y="D_score"):
-    elbow_table = (elbow_search_df[[x, y]]).dropna()
-    m = 1
-    s = kneed.KneeLocator(
-        elbow_table[x],
-        elbow_table[y],
-        S=m,
-        curve="convex",
-        direction="decreasing",
-        interp_method="interp1d",
-        online=True,
-    ).knee
-    s_code = "default"
-    if not s:
-        # try with higher sensitivity:
-        s_candidates = list(
-            set(
-                [
-                    s
-                    for s in [
-                        kneed.KneeLocator(
-                            elbow_table[x],
-                            elbow_table[y],
-                            S=m,
-                            curve="convex",
-                            direction="decreasing",
-                            interp_method="interp1d",
-                            online=True,
-                        ).knee
-                        for m in range(0, 200)
-                    ]
-                    if s is not None
-                ]
-            )
-        )
-        if len(s_candidates) > 0:
-            s = s_candidates[0]
-            s_code = "high_sensitivity"
-    return s, s_code
+    """
+    Knee of the curve y(x) and its code (see knee_detection.select_knee)
+    """
+    elbow_table = (elbow_search_df[[x, y]]).dropna().sort_values(x)
+    return select_knee(find_knees(elbow_table[x].to_numpy(), elbow_table[y].to_numpy()))
 
 
 def missing_clones_inherit_from_children(optimal_solution, tree, cp_table):
@@ -154,57 +153,80 @@ def calculate_CI(df_seg_reg, CI):
     return df_seg_reg
 
 
+def read_asas_table(tumour_dir):
+    """
+    SNP table of a tumour, or None if it does not exist
+    """
+    try:
+        return pd.read_csv(f"{tumour_dir}/asas_table.csv")
+    except FileNotFoundError:
+        return None
+
+
 def get_ci_table(input_table, tumour_dir, segment, ci_table_name="", CI=0.5):
     # if confidence interval table name is provided, read it:
     if ci_table_name != "":
-        ci_table = pd.read_csv(f"{tumour_dir}/{ci_table_name}")
+        return pd.read_csv(f"{tumour_dir}/{ci_table_name}")
     # if table is not provided, but SNP table exists, calculate CI from SNP table:
+    return get_segment_ci_table(input_table, segment, read_asas_table(tumour_dir), CI)
+
+
+def get_segment_ci_table(input_table, segment, asas_table, CI=0.5):
+    """
+    Confidence intervals of a segment calculated from the SNP table or, if asas_table is None, artificial
+    confidence intervals around median copy numbers
+    """
+    if asas_table is not None:
+        asas_table = asas_table[asas_table.segment == segment]
+        ci_table = asas_table.groupby(["sample", "segment"]).apply(
+            lambda df_seg_reg: calculate_CI(df_seg_reg, CI)
+        )
+        ci_table = ci_table[
+            [
+                "sample",
+                "segment",
+                "lower_CI_A",
+                "upper_CI_A",
+                "lower_CI_B",
+                "upper_CI_B",
+            ]
+        ].drop_duplicates()
     else:
-        # try to read SNP table, if not present, create artificial CI table:
-        try:
-            asas_table = pd.read_csv(f"{tumour_dir}/asas_table.csv")
-            asas_table = asas_table[asas_table.segment == segment]
-            ci_table = asas_table.groupby(["sample", "segment"]).apply(
-                lambda df_seg_reg: calculate_CI(df_seg_reg, CI)
-            )
-            ci_table = ci_table[
-                [
-                    "sample",
-                    "segment",
-                    "lower_CI_A",
-                    "upper_CI_A",
-                    "lower_CI_B",
-                    "upper_CI_B",
-                ]
-            ].drop_duplicates()
-        except FileNotFoundError:
-            # create dummy CIs:
-            print("No SNP table found, creating artificial CI table")
-            ci_table = input_table[["sample", "segment"]].drop_duplicates().copy()
-            for x in ["lower_CI_A", "upper_CI_A", "lower_CI_B", "upper_CI_B"]:
-                ci_table[x] = float(0)  # to ensure float data type
-            for s in ci_table["sample"].unique():
-                A = input_table[input_table["sample"] == s].cpnA.median()
-                B = input_table[input_table["sample"] == s].cpnB.median()
-                ci_table.loc[ci_table["sample"] == s, "lower_CI_A"] = A - 0.5
-                ci_table.loc[ci_table["sample"] == s, "lower_CI_B"] = B - 0.5
-                ci_table.loc[ci_table["sample"] == s, "upper_CI_A"] = A + 0.5
-                ci_table.loc[ci_table["sample"] == s, "upper_CI_B"] = B + 0.5
-        for allele in ["A", "B"]:
-            ci_table[f"lower_CI_{allele}"] = ci_table[f"lower_CI_{allele}"].apply(
-                lambda x: max(x, 0)
-            )
-            ci_table[f"upper_CI_{allele}"] = ci_table[f"upper_CI_{allele}"].apply(
-                lambda x: max(x, 0.01)
-            )
-        ci_table["ci_value"] = CI
-        ci_table = ci_table.reset_index(drop=True).sort_values("sample")
+        # create dummy CIs:
+        logger.debug("No SNP table found, creating artificial CI table")
+        ci_table = input_table[["sample", "segment"]].drop_duplicates().copy()
+        for x in ["lower_CI_A", "upper_CI_A", "lower_CI_B", "upper_CI_B"]:
+            ci_table[x] = float(0)  # to ensure float data type
+        for s in ci_table["sample"].unique():
+            A = input_table[input_table["sample"] == s].cpnA.median()
+            B = input_table[input_table["sample"] == s].cpnB.median()
+            ci_table.loc[ci_table["sample"] == s, "lower_CI_A"] = A - 0.5
+            ci_table.loc[ci_table["sample"] == s, "lower_CI_B"] = B - 0.5
+            ci_table.loc[ci_table["sample"] == s, "upper_CI_A"] = A + 0.5
+            ci_table.loc[ci_table["sample"] == s, "upper_CI_B"] = B + 0.5
+    for allele in ["A", "B"]:
+        ci_table[f"lower_CI_{allele}"] = ci_table[f"lower_CI_{allele}"].apply(
+            lambda x: max(x, 0)
+        )
+        ci_table[f"upper_CI_{allele}"] = ci_table[f"upper_CI_{allele}"].apply(
+            lambda x: max(x, 0.01)
+        )
+    ci_table["ci_value"] = CI
+    ci_table = ci_table.reset_index(drop=True).sort_values("sample")
     return ci_table
 
 
 def validate_inputs(
     it: pd.DataFrame, cpt: pd.DataFrame, cit: pd.DataFrame, t: typing.List[typing.List]
 ):
+    validate_tumour_inputs(cpt, t)
+    validate_segment_inputs(it, cpt, cit)
+
+
+def validate_tumour_inputs(cpt: pd.DataFrame, t: typing.List[typing.List]):
+    """
+    Checks of inputs shared by all segments of a tumour: tree and clone proportions
+    """
     # check if tree is a list of lists of strings:
     # e.g. tree=[['cloneA','cloneB'],['cloneA','cloneD','cloneE']]
     if not all([isinstance(x, list) for x in t]):
@@ -214,6 +236,39 @@ def validate_inputs(
     tree_clones = set([c for branch in t for c in branch])
     if cpt_clones != tree_clones:
         raise ValueError("Clones in cp_table and tree_paths.json do not match")
+    # check if clone proportions sum to 1 for each sample
+    proportions_expressed_as_percents = (cpt.sum() > 10).any()
+    if proportions_expressed_as_percents:
+        raise ValueError(
+            "Clone proportions are probably expressed as percents, not fractions (e.g. 80 instead of 0.8)"
+        )
+    proportions_dont_sum_to_1 = (cpt.sum() != 1).any()
+    if proportions_dont_sum_to_1:
+        sum_df = (
+            cpt.sum()
+            .reset_index()
+            .rename(columns={"index": "sample", 0: "proportions"})
+        )
+        logger.warning("Clone proportions do not sum to 1 in some samples:\n%s", sum_df)
+        if (abs(cpt.sum() - 1) < 0.05).all():
+            logger.warning(
+                "Clones proportions are close to 1, calibrating them to sum to 1 (likely rounding errors)"
+            )
+            cpt = calibrate_clone_proportions(cpt)
+        else:
+            logger.error("Clones proportions are not close to 1, exiting")
+            proportions_below_1_in_any_sample = (cpt.sum() < 1).any()
+            if proportions_below_1_in_any_sample:
+                raise ValueError("Clone proportions sum to less than 1 in some samples")
+            proportions_above_1_in_any_sample = (cpt.sum() > 1).any()
+            if proportions_above_1_in_any_sample:
+                raise ValueError("Clone proportions sum to more than 1 in some samples")
+
+
+def validate_segment_inputs(it: pd.DataFrame, cpt: pd.DataFrame, cit: pd.DataFrame):
+    """
+    Checks of the input table of a segment against clone proportions and confidence intervals
+    """
     # check if all samples are present:
     it_samples = set(it["sample"].unique())
     cpt_samples = set(cpt.columns)
@@ -245,35 +300,6 @@ def validate_inputs(
             Expected columns:
             {sorted(expected_columns)}"""
         )
-    # check if clone proportions sum to 1 for each sample
-    proportions_expressed_as_percents = (cpt.sum() > 10).any()
-    if proportions_expressed_as_percents:
-        raise ValueError(
-            "Clone proportions are probably expressed as percents, not fractions (e.g. 80 instead of 0.8)"
-        )
-    proportions_dont_sum_to_1 = (cpt.sum() != 1).any()
-    if proportions_dont_sum_to_1:
-        print("------WARNING------")
-        print("Clone proportions do not sum to 1 in some samples")
-        sum_df = (
-            cpt.sum()
-            .reset_index()
-            .rename(columns={"index": "sample", 0: "proportions"})
-        )
-        print(sum_df)
-        if (abs(cpt.sum() - 1) < 0.05).all():
-            print(
-                "Clones proportions are close to 1, calibrating them to sum to 1 (likely rounding errors)"
-            )
-            cpt = calibrate_clone_proportions(cpt)
-        else:
-            print("Clones proportions are not close to 1, exiting")
-            proportions_below_1_in_any_sample = (cpt.sum() < 1).any()
-            if proportions_below_1_in_any_sample:
-                raise ValueError("Clone proportions sum to less than 1 in some samples")
-            proportions_above_1_in_any_sample = (cpt.sum() > 1).any()
-            if proportions_above_1_in_any_sample:
-                raise ValueError("Clone proportions sum to more than 1 in some samples")
 
 
 def calibrate_clone_proportions(cp: pd.DataFrame):
@@ -302,14 +328,58 @@ def rescale_elbow_points(complexities, elbow):
     return rescaled_dict
 
 
+class TumourContext:
+    """
+    Inputs shared by all segments of a tumour: tree, clone proportions (calibrated and with small clones removed
+    if requested) and the source of confidence intervals (ci table or SNP table). They are loaded and validated once
+    per tumour, and every SegmentSolution of the tumour can be built from them.
+    """
+
+    def __init__(
+        self,
+        tumour_dir: str,
+        ci_table_name: str = "",
+        ci: float = 0.5,
+        ccp: bool = True,
+        rsc: bool = False,
+    ):
+        self.tumour_dir = tumour_dir
+        self.ci_table_name = ci_table_name
+        self.ci = ci
+        # load tree:
+        self.tree = read_tree_json(f"{tumour_dir}/tree_paths.json")
+        # load clone proportions:
+        cp_table = pd.read_csv(f"{tumour_dir}/cp_table.csv", index_col="clone")
+        cp_table = calibrate_clone_proportions(cp_table) if ccp else cp_table
+        self.cp_table = remove_small_clones(cp_table, self.tree) if rsc else cp_table
+        # confidence intervals are read from the ci table if its name is provided, otherwise from the SNP table:
+        self.ci_table = None
+        self.asas_table = None
+        if ci_table_name != "":
+            self.ci_table = pd.read_csv(f"{tumour_dir}/{ci_table_name}")
+        else:
+            self.asas_table = read_asas_table(tumour_dir)
+        validate_tumour_inputs(cpt=self.cp_table, t=self.tree)
+
+    def get_ci_table(self, input_table, segment):
+        """
+        Confidence intervals for copy number values of a segment (see get_ci_table)
+        """
+        if self.ci_table is not None:
+            return self.ci_table
+        return get_segment_ci_table(input_table, segment, self.asas_table, self.ci)
+
+
 class SegmentSolution:
     def __init__(
         self,
         input_file_name: str,
         config: Optional[Dict[str, Any]] = None,
         logger: Optional[logging.Logger] = None,
+        tumour_context: Optional[TumourContext] = None,
+        input_table: Optional[pd.DataFrame] = None,
     ):
-        self.logger = logger
+        self.logger = logger if logger is not None else logging.getLogger("ALPACA")
         # get start time:
         self.start_time = time.time()
         if config is None:
@@ -330,7 +400,18 @@ class SegmentSolution:
         self.config: Dict[str, Any] = config
         self.metrics: Dict[str, list] = {
             name: []
-            for name in ["D_scores", "solutions", "run_time", "models", "complexity"]
+            for name in [
+                "D_scores",
+                "solutions",
+                "run_time",
+                "records",
+                "complexity",
+                "warm_start_accepted",
+                "status",
+                "slack",
+                "solved",
+                "threads",
+            ]
         }
         self.no_change_in_complexity: bool = False
         self.no_change_in_D_score: bool = False
@@ -341,6 +422,21 @@ class SegmentSolution:
         self.output_all_solutions: bool = False
         self.output_model_selection_table: bool = False
         self.debug: bool = False
+        self.reuse_model: bool = True
+        self.persistent_model: Optional[Model] = None
+        self.warm_start: bool = True
+        # start values of solutions found so far, by allowed complexity:
+        self.warm_start_values: Dict[int, Dict[str, Any]] = {}
+        self.search_strategy: str = "linear"
+        # objectives (CI score, D score) of each evaluated allowed complexity:
+        self.search_objectives: Dict[int, tuple] = {}
+        # metrics and objectives of allowed complexities solved ahead of the sweep (see hold_back_complexities):
+        self.held_back: Dict[int, tuple] = {}
+        # points of the D score curve evaluated so far and their knees (see find_elbow):
+        self.knee_detector = KneeDetector()
+        self.n_solves: int = 0
+        # end linear search early if the complexity constraint is slack and the remaining levels have the same optimum:
+        self.slack_early_stop: bool = True
         # load config
         # default values present in the config object will overwrite the default values defined above
         for key, value in self.config["preprocessing_config"].items():
@@ -351,52 +447,59 @@ class SegmentSolution:
         self.tumour_id, self.segment = split_input_file_name(self.input_file_name)
         # define tumour input directory depending on the run environment:
         self.set_directories()
-        # load fractional copy numbers:
-        self.input_table = pd.read_csv(
-            f"{self.segments_dir}/{input_file_name}"
-        ).sort_values("sample")
-        # load tree:
-        self.tree = read_tree_json(f"{self.tumour_dir}/tree_paths.json")
-        # load clone proportions:
-        self.cp_table = pd.read_csv(
-            f"{self.tumour_dir}/cp_table.csv", index_col="clone"
-        )
-        self.cp_table = (
-            calibrate_clone_proportions(self.cp_table) if self.ccp else self.cp_table
-        )
-        self.cp_table = (
-            remove_small_clones(self.cp_table, self.tree) if self.rsc else self.cp_table
-        )
+        # load fractional copy numbers, unless the input table of the segment is passed in memory (tumour mode):
+        if input_table is None:
+            input_table = pd.read_csv(f"{self.segments_dir}/{input_file_name}")
+        self.input_table = input_table.sort_values("sample")
+        # load tree, clone proportions and confidence intervals source, unless shared by segments of the tumour:
+        if tumour_context is None:
+            tumour_context = TumourContext(
+                self.tumour_dir,
+                ci_table_name=self.ci_table_name,
+                ci=self.ci,
+                ccp=self.ccp,
+                rsc=self.rsc,
+            )
+        self.tumour_context = tumour_context
+        self.tree = tumour_context.tree
+        self.cp_table = tumour_context.cp_table
         # get confidence intervals for copy number values:
-        self.ci_table = get_ci_table(
-            self.input_table,
-            self.tumour_dir,
-            self.segment,
-            ci_table_name=self.ci_table_name,
-            CI=self.ci,
-        )
+        self.ci_table = tumour_context.get_ci_table(self.input_table, self.segment)
         # check if inputs are in the expected format and contain all required columns:
-        validate_inputs(
-            it=self.input_table, cpt=self.cp_table, cit=self.ci_table, t=self.tree
+        validate_segment_inputs(
+            it=self.input_table, cpt=self.cp_table, cit=self.ci_table
+        )
+        # confidence intervals are constants in every model of the sweep - resolve them once per segment:
+        self.ci_bounds = get_segment_ci_bounds(
+            self.ci_table, self.segment, self.input_table["sample"].unique()
         )
         #
-        print(datetime.now())
-        print(f"Running: {input_file_name}")
-        print(f"Tumour id: {self.tumour_id}")
-        print(f"Segment name: {self.segment}")
-        print("input table:")
-        print(self.input_table)
+        self.logger.debug(
+            "Running: %s\nTumour id: %s\nSegment name: %s\ninput table:\n%s",
+            input_file_name,
+            self.tumour_id,
+            self.segment,
+            self.input_table,
+        )
 
     def get_model_metrics(self, model_iteration):
         self.metrics["D_scores"].append(model_iteration.solution.D_score.iloc[0])
         self.metrics["solutions"].append(model_iteration.solution)
         self.metrics["run_time"].append(model_iteration.model.Runtime)
-        self.metrics["models"].append(model_iteration.model)
+        self.metrics["records"].append(model_iteration.get_solve_record())
         self.metrics["complexity"].append(model_iteration.solution.complexity.iloc[0])
+        self.metrics["warm_start_accepted"].append(model_iteration.warm_start_accepted)
+        self.metrics["status"].append(model_iteration.model.Status)
+        self.metrics["slack"].append(model_iteration.tree_complexity_constr.Slack)
+        self.metrics["solved"].append(True)
+        self.metrics["threads"].append(model_iteration.threads)
 
-    def run_model(self, allowed_complexity):
-        allowed_complexity = {"allowed_tree_complexity": allowed_complexity}
-        model_iteration = Model(
+    def build_model(self, allowed_complexity):
+        allowed_complexity = {
+            "allowed_tree_complexity": allowed_complexity,
+            "ci_bounds": self.ci_bounds,
+        }
+        return Model(
             segment=self.segment,
             ci_table=self.ci_table,
             fractional_copy_number_table=self.input_table,
@@ -404,19 +507,199 @@ class SegmentSolution:
             clone_proportions=self.cp_table,
             **{**self.config["model_config"], **allowed_complexity},
         )
-        model_iteration.model.optimize()
-        model_iteration.get_output()
-        if self.missing_clones_inherit_from_children_flag:
-            model_iteration.solution = missing_clones_inherit_from_children(
-                model_iteration.solution, self.tree, self.cp_table
+
+    def get_model_iteration(self, allowed_complexity):
+        """
+        Return the model to optimise for the given allowed complexity. If reuse_model is set, the model is built once
+        per segment and only the bound of the complexity constraint is updated between iterations.
+        """
+        if not self.reuse_model:
+            return self.build_model(allowed_complexity)
+        if self.persistent_model is None:
+            self.persistent_model = self.build_model(allowed_complexity)
+        else:
+            self.persistent_model.set_allowed_complexity(allowed_complexity)
+        return self.persistent_model
+
+    def run_model(self, allowed_complexity):
+        model_iteration = self.get_model_iteration(allowed_complexity)
+        # solution found with lower allowed complexity is feasible for this iteration - use the closest one as a MIP start:
+        lower_complexities = [
+            c for c in self.warm_start_values if c <= allowed_complexity
+        ]
+        if self.warm_start and len(lower_complexities) > 0:
+            model_iteration.set_start_values(
+                self.warm_start_values[max(lower_complexities)]
+            )
+        model_iteration.optimize()
+        if self.warm_start and model_iteration.model.SolCount > 0:
+            self.warm_start_values[allowed_complexity] = (
+                model_iteration.get_start_values()
             )
+        model_iteration.get_output()
         self.get_model_metrics(model_iteration)
+        if model_iteration is not self.persistent_model:
+            model_iteration.dispose()
+
+    def solve_scenarios(self, allowed_complexities):
+        """
+        Solve all allowed complexities in one multi-scenario optimisation (see Model.optimize_scenarios) and record
+        the solution of each, as solve_complexity does. Run time of the optimisation is split equally between allowed
+        complexities.
+        Returns False, without recording any solution, if not all scenarios were solved to optimality.
+        """
+        allowed_complexities = [
+            c for c in allowed_complexities if c not in self.search_objectives
+        ]
+        if len(allowed_complexities) == 0:
+            return True
+        scenario_model = self.build_model(max(allowed_complexities))
+        try:
+            if not scenario_model.optimize_scenarios(allowed_complexities):
+                return False
+            self.record_scenarios(scenario_model)
+        finally:
+            scenario_model.dispose()
+        return True
+
+    def record_scenarios(self, scenario_model):
+        allowed_complexities = scenario_model.scenario_complexities
+        for scenario, allowed_complexity in enumerate(allowed_complexities):
+            scenario_model.get_scenario_output(scenario)
+            solution = scenario_model.solution
+            solution["solved"] = True
+            self.metrics["D_scores"].append(solution.D_score.iloc[0])
+            self.metrics["solutions"].append(solution)
+            self.metrics["run_time"].append(
+                scenario_model.scenario_run_time / len(allowed_complexities)
+            )
+            self.metrics["records"].append(scenario_model.get_solve_record(scenario))
+            self.metrics["complexity"].append(solution.complexity.iloc[0])
+            self.metrics["warm_start_accepted"].append(None)
+            self.metrics["status"].append(scenario_model.model.Status)
+            self.metrics["slack"].append(
+                allowed_complexity - solution.complexity.iloc[0]
+            )
+            self.metrics["solved"].append(True)
+            self.metrics["threads"].append(scenario_model.threads)
+            self.search_objectives[allowed_complexity] = (
+                solution.CI_score.iloc[0],
+                solution.D_score.iloc[0],
+            )
+
+    def solve_complexity(self, allowed_complexity):
+        """
+        Solve the model for the given allowed complexity unless it was already evaluated, and return its objectives
+        (CI score, D score).
+        If the solution is optimal, it is also optimal for every allowed complexity between its realised complexity
+        and allowed_complexity: it is feasible for all of them and optimal for the largest one. These levels are
+        filled with the same solution without solving.
+        """
+        if allowed_complexity in self.held_back:
+            self.restore_complexity(allowed_complexity)
+        elif allowed_complexity not in self.search_objectives:
+            self.run_model(allowed_complexity)
+            solution = self.metrics["solutions"][-1]
+            solution["solved"] = True
+            self.search_objectives[allowed_complexity] = (
+                solution.CI_score.iloc[0],
+                solution.D_score.iloc[0],
+            )
+            if self.solved_to_optimality(allowed_complexity):
+                for c in range(solution.complexity.iloc[0], allowed_complexity):
+                    if c not in self.search_objectives:
+                        self.fill_complexity(c, source_complexity=allowed_complexity)
+        return self.search_objectives[allowed_complexity]
+
+    def fill_complexity(self, allowed_complexity, source_complexity):
+        """
+        Record the solution found for source_complexity as the solution for allowed_complexity, without solving.
+        """
+        index = [s.allowed_complexity.iloc[0] for s in self.metrics["solutions"]].index(
+            source_complexity
+        )
+        solution = self.metrics["solutions"][index].copy()
+        solution["allowed_complexity"] = allowed_complexity
+        solution["solved"] = False
+        self.metrics["D_scores"].append(self.metrics["D_scores"][index])
+        self.metrics["solutions"].append(solution)
+        self.metrics["run_time"].append(0)
+        self.metrics["records"].append(self.metrics["records"][index])
+        self.metrics["complexity"].append(self.metrics["complexity"][index])
+        self.metrics["warm_start_accepted"].append(None)
+        self.metrics["status"].append(self.metrics["status"][index])
+        self.metrics["slack"].append(
+            allowed_complexity - self.metrics["complexity"][index]
+        )
+        self.metrics["solved"].append(False)
+        self.metrics["threads"].append(0)
+        self.search_objectives[allowed_complexity] = self.search_objectives[
+            source_complexity
+        ]
+
+    def hold_back_complexities(self, allowed_complexity):
+        """
+        Move metrics and objectives of allowed complexities above allowed_complexity out of the sweep, e.g. of the
+        maximum complexity solved ahead of linear search (see end_if_complexity_not_binding), so that stop conditions
+        and elbow only see the allowed complexities reached so far. solve_complexity restores them when the sweep
+        reaches them; the others are dropped at the end of the search.
+        """
+        allowed_complexities = [
+            s.allowed_complexity.iloc[0] for s in self.metrics["solutions"]
+        ]
+        ahead = [
+            i for i, c in enumerate(allowed_complexities) if c > allowed_complexity
+        ]
+        for i in ahead:
+            self.held_back[allowed_complexities[i]] = (
+                {name: values[i] for name, values in self.metrics.items()},
+                self.search_objectives.pop(allowed_complexities[i]),
+            )
+        for name, values in self.metrics.items():
+            self.metrics[name] = [v for i, v in enumerate(values) if i not in ahead]
+
+    def restore_complexity(self, allowed_complexity):
+        """
+        Add metrics and objectives of an allowed complexity held back by hold_back_complexities to the sweep
+        """
+        metrics, objectives = self.held_back.pop(allowed_complexity)
+        for name, value in metrics.items():
+            self.metrics[name].append(value)
+        self.search_objectives[allowed_complexity] = objectives
+
+    def sort_metrics(self):
+        """
+        Order metrics of all evaluated allowed complexities by allowed complexity
+        """
+        order = np.argsort(
+            [s.allowed_complexity.iloc[0] for s in self.metrics["solutions"]],
+            kind="stable",
+        )
+        for name, values in self.metrics.items():
+            self.metrics[name] = [values[i] for i in order]
+
+    def get_metric(self, name, allowed_complexity):
+        index = [s.allowed_complexity.iloc[0] for s in self.metrics["solutions"]].index(
+            allowed_complexity
+        )
+        return self.metrics[name][index]
+
+    def solved_to_optimality(self, allowed_complexity):
+        return self.get_metric("status", allowed_complexity) == GRB.OPTIMAL
+
+    def complexity_constraint_slack(self, allowed_complexity):
+        """
+        True if the model for the given allowed complexity was solved to optimality and the complexity of the
+        solution is below the allowed complexity (tree complexity constraint has positive slack).
+        """
+        return (
+            self.solved_to_optimality(allowed_complexity)
+            and self.get_metric("slack", allowed_complexity) > 0.5
+        )
 
     def stop_conditions_check(self, oft):
         optimization_time = self.metrics["run_time"][-1]
-        slow_iteration = (
-            optimization_time >= self.metrics["models"][-1].params.TimeLimit
-        )
+        slow_iteration = optimization_time >= self.metrics["records"][-1]["time_limit"]
         no_improvement_in_D_score = (
             sum(abs(np.diff(self.metrics["D_scores"])) < oft) > 3
         )
@@ -431,53 +714,84 @@ class SegmentSolution:
             * math.ceil(self.input_table[["cpnA", "cpnB"]].max().max()),
         )
         objective_function_threshold = 0.1  # iterations will stop if D score does not improve by more than this value in 3 consecutive iterations
+        search = get_search_strategy(self.search_strategy)
         # run diploid model:
-        self.run_model(allowed_complexity=0)
+        self.solve_complexity(allowed_complexity=0)
         # don't iterate if solution is likely to be diploid:
         if self.metrics["D_scores"][0] > objective_function_threshold:
-            complexity_range = range(1, self.maximum_complexity)
-            for c in complexity_range:
-                print(f"**Iterating with complexity: {c}")
-                self.run_model(allowed_complexity=c)
-                stop_conditions = self.stop_conditions_check(
-                    objective_function_threshold
+            search(self, objective_function_threshold)
+        self.dispose_models()
+        self.sort_metrics()
+        # allowed complexities solved ahead of the sweep, which it did not reach, are not part of the results:
+        self.n_solves = sum(self.metrics["solved"]) + sum(
+            metrics["solved"] for metrics, _ in self.held_back.values()
+        )
+        self.held_back = {}
+        self.logger.debug(
+            "Search strategy '%s' solved %s of %s evaluated allowed complexities",
+            self.search_strategy,
+            self.n_solves,
+            len(self.metrics["solved"]),
+        )
+        self.combine_solutions()
+
+    def dispose_models(self):
+        """
+        Free the gurobi model kept between iterations of the sweep. Only compact records of each iteration are kept
+        (see Model.get_solve_record).
+        """
+        if self.persistent_model is not None:
+            self.persistent_model.dispose()
+            self.persistent_model = None
+
+    def get_sweep(self):
+        """
+        Results of run_iterations, e.g. for the solution cache (see set_sweep)
+        """
+        return {
+            "metrics": self.metrics,
+            "search_objectives": self.search_objectives,
+            "n_solves": self.n_solves,
+            "maximum_complexity": self.maximum_complexity,
+        }
+
+    def set_sweep(self, sweep):
+        """
+        Use results of run_iterations of a segment with the same problem hash instead of solving the models
+        """
+        self.metrics = dict(sweep["metrics"])
+        self.search_objectives = sweep["search_objectives"]
+        self.knee_detector = KneeDetector()
+        self.n_solves = sweep["n_solves"]
+        self.maximum_complexity = sweep["maximum_complexity"]
+        self.combine_solutions()
+
+    def combine_solutions(self):
+        """
+        Combine solutions of all evaluated allowed complexities into solutions_combined. Solutions of the sweep (and
+        of the solution cache) are kept as found by the models: missing clones inherit copy numbers of their children
+        here, if missing_clones_inherit_from_children_flag is set.
+        """
+        solutions = self.metrics["solutions"]
+        if self.missing_clones_inherit_from_children_flag:
+            solutions = [
+                missing_clones_inherit_from_children(
+                    solution.copy(), self.tree, self.cp_table
                 )
-                if stop_conditions:
-                    # check if elbow can be found
-                    self.find_elbow()
-                    elbow_findable = self.elbow["s_min"] < 1000
-                    if elbow_findable:
-                        print(
-                            f"** Stopping iterations at complexity {c} due to lack of improvement in D score"
-                        )
-                        break
-        self.solutions_combined = pd.concat(self.metrics["solutions"])
+                for solution in solutions
+            ]
+        self.solutions_combined = pd.concat(solutions)
 
     def find_elbow(self):
+        """
+        Find the elbow of the D score curve of evaluated allowed complexities. Points evaluated since the last call
+        are added to the knee detector, knees are only recomputed if there are new points.
+        """
         assert self.metrics is not None, "Metrics not found, run iterations first"
-        solutions_combined = pd.concat(self.metrics["solutions"])
-        self.elbow_search_df = (
-            solutions_combined[
-                ["complexity", "D_score", "CI_score", "allowed_complexity"]
-            ]
-            .drop_duplicates(subset="allowed_complexity", keep="first")
-            .sort_values("allowed_complexity")
-            .reset_index(drop=True)
-        )
-        self.elbow_search_df_strictly_decreasing = ensure_elbow_strictly_decreasing(
-            self.elbow_search_df.copy()
-        )
-        s_raw, raw_code = find_s_values(
-            self.elbow_search_df,
-            self.maximum_complexity,
-            "allowed_complexity",
-            "D_score",
-        )
-        s_strictly_decreasing, dec_code = find_s_values(
-            self.elbow_search_df_strictly_decreasing,
-            self.maximum_complexity,
-            "allowed_complexity",
-            "D_score",
+        self.knee_detector.update(self.search_objectives)
+        s_raw, raw_code = self.knee_detector.find_s_values("raw")
+        s_strictly_decreasing, dec_code = self.knee_detector.find_s_values(
+            "strictly_decreasing"
         )
         assert s_raw is not None, "S_raw not found"
         assert s_strictly_decreasing is not None, "S_strictly_decreasing not found"
@@ -492,13 +806,26 @@ class SegmentSolution:
         self.elbow = s_values
         self.optimal_solution_index = self.elbow[self.s_type]
         # required for certain simulated scenarios:
-        if (
-            self.config["model_config"]["d_zero"]
-            & (self.elbow_search_df.D_score == 0).any()
-        ):
-            self.optimal_solution_index = self.elbow_search_df.query(
-                "D_score == 0"
-            ).index[0]
+        zero_D_score = self.knee_detector.x[self.knee_detector.y["raw"] == 0]
+        if self.config["model_config"]["d_zero"] & (len(zero_D_score) > 0):
+            self.optimal_solution_index = zero_D_score[0]
+
+    def set_elbow_search_df(self):
+        """
+        Tables of the D score curve (elbow_search_df) and of its strictly decreasing version used to find the elbow
+        """
+        solutions_combined = pd.concat(self.metrics["solutions"])
+        self.elbow_search_df = (
+            solutions_combined[
+                ["complexity", "D_score", "CI_score", "allowed_complexity", "solved"]
+            ]
+            .drop_duplicates(subset="allowed_complexity", keep="first")
+            .sort_values("allowed_complexity")
+            .reset_index(drop=True)
+        )
+        self.elbow_search_df_strictly_decreasing = ensure_elbow_strictly_decreasing(
+            self.elbow_search_df.copy()
+        )
 
     def find_optimal_solution(self):
         # check if diploid solution was found:
@@ -508,12 +835,17 @@ class SegmentSolution:
             self.optimal_solution_index = 0
         else:
             self.find_elbow()
+            self.set_elbow_search_df()
             # add metadata to the elbow search dataframe:
             self.elbow_search_df_strictly_decreasing["segment"] = self.segment
             self.elbow_search_df_strictly_decreasing["tumour_id"] = self.tumour_id
             self.elbow_search_df_strictly_decreasing["opt_sol_indx"] = (
                 self.optimal_solution_index
             )
+            self.elbow_search_df_strictly_decreasing["search_strategy"] = (
+                self.search_strategy
+            )
+            self.elbow_search_df_strictly_decreasing["n_solves"] = self.n_solves
 
     def get_solution(self, s=None):
         if s is None:
@@ -574,48 +906,161 @@ class SegmentSolution:
         else:
             self.segments_dir = f"{self.tumour_dir}/segments"
 
+    def get_problem_hash(self):
+        """
+        Hash of everything the models of this segment depend on: observed copy numbers, confidence intervals, clone
+        proportions, tree and model parameters. Segments with the same hash have the same solutions, so only one of
+        them needs to be solved (see copy_output_from). Segment length only matters through the size limit of
+        homozygous deletions.
+        """
+        model_config = {
+            key: value
+            for key, value in self.config["model_config"].items()
+            if key not in NON_SOLVER_MODEL_CONFIG
+        }
+        homo_del_size_limit = model_config.get(
+            "homo_del_size_limit", HOMO_DEL_SIZE_LIMIT
+        )
+        cp_table = self.cp_table.sort_index().sort_index(axis=1)
+        problem = {
+            "samples": list(self.input_table["sample"]),
+            "cpn": {
+                allele: round_for_hash(self.input_table[f"cpn{allele}"])
+                for allele in ["A", "B"]
+            },
+            "ci_bounds": {
+                bound: round_for_hash(self.ci_bounds[bound])
+                for bound in ["lower_CI_A", "upper_CI_A", "lower_CI_B", "upper_CI_B"]
+            },
+            "clones": list(cp_table.index),
+            "proportion_samples": list(cp_table.columns),
+            "proportions": round_for_hash(cp_table.to_numpy().ravel()),
+            "tree": self.tree,
+            "model_config": model_config,
+            "below_homo_del_size_limit": get_length_from_name(self.segment)
+            < int(homo_del_size_limit),
+        }
+        return hashlib.sha256(
+            json.dumps(problem, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
     def output_exists(self):
         """
-        Checks if the output file already exists.
+        Checks if the output file (or the optimal solution in the output store, if CSV outputs are not written)
+        already exists.
         """
+        preprocessing_config = self.config["preprocessing_config"]
+        if not writes_csv(preprocessing_config):
+            return get_output_store(preprocessing_config).has_partition(
+                "optimal", self.tumour_id, self.segment
+            )
         output_path = self.create_output_path()
         return os.path.exists(output_path)
 
-    def create_output_path(self):
+    def create_output_path(self, input_file_name=None):
         """
-        Creates the output path for the solution based on file name and options.
+        Creates the output path for the solution based on file name and options (of this segment, or of another
+        segment of the run with input_file_name).
         """
-        output_name = "optimal_" + self.input_file_name.split("ALPACA_input_table_")[1]
+        if input_file_name is None:
+            input_file_name = self.input_file_name
+        output_name = "optimal_" + input_file_name.split("ALPACA_input_table_")[1]
         output_dir = self.config["preprocessing_config"]["output_directory"]
         output_path = os.path.join(output_dir, output_name)
         return output_path
 
-    def save_output(self):
-        logger = self.logger
-        end_time = time.time()
-        output_path = self.create_output_path()
+    def get_output_paths(self, input_file_name=None):
+        """
+        Paths of the output files written by save_output, by kind: 'optimal', 'all' and 'model_selection_table' (of
+        this segment, or of another segment of the run with input_file_name)
+        """
+        if input_file_name is None:
+            input_file_name = self.input_file_name
+        tumour_id, segment = split_input_file_name(input_file_name)
+        output_path = self.create_output_path(input_file_name)
         output_dir = os.path.dirname(output_path)
-        os.makedirs(output_dir, exist_ok=True)
+        output_paths = {"optimal": output_path}
+        if self.output_all_solutions:
+            output_paths["all"] = output_path.replace("optimal", "all")
+        if self.output_model_selection_table:
+            output_paths["model_selection_table"] = (
+                f"{output_dir}/{tumour_id}_{segment}_model_selection_table.csv"
+            )
+        return output_paths
+
+    def get_output_tables(self):
+        """
+        Output tables of the segment by kind (see get_output_paths)
+        """
         # discard diploid clone:
         assert self.optimal_solution is not None
         self.optimal_solution = self.optimal_solution[
             self.optimal_solution.clone != "diploid"
         ]
+        output_tables = {}
         if self.output_all_solutions:
-            all_solutions = self.get_all_simplified_solution()
-            all_solutions_output_path = output_path.replace("optimal", "all")
-            all_solutions.to_csv(all_solutions_output_path, index=False)
+            output_tables["all"] = self.get_all_simplified_solution()
         if self.output_model_selection_table:
-            output_model_selection_table = self.elbow_search_df_strictly_decreasing
-            output_model_selection_table.to_csv(
-                f"{output_dir}/{self.tumour_id}_{self.segment}_model_selection_table.csv",
-                index=False,
+            output_tables["model_selection_table"] = (
+                self.elbow_search_df_strictly_decreasing
             )
         if self.debug:
-            total_run_time = round(end_time - self.start_time)
+            total_run_time = round(time.time() - self.start_time)
             self.optimal_solution["run_time_seconds"] = total_run_time
-        self.optimal_solution.to_csv(output_path, index=False)
-        if os.path.exists(output_path):
-            logger.info("Segment output created")
-        else:
-            logger.error(f"Output not saved to {output_path}")
+            self.optimal_solution["n_solves"] = self.n_solves
+        output_tables["optimal"] = self.optimal_solution
+        return output_tables
+
+    def save_output(self, output_tables=None):
+        """
+        Write output tables by kind (default: all outputs of the segment, see get_output_tables)
+        """
+        logger = self.logger
+        if output_tables is None:
+            output_tables = self.get_output_tables()
+        output_paths = self.get_output_paths()
+        for kind, output_table in output_tables.items():
+            output_path = output_paths[kind]
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            output_table.to_csv(output_path, index=False)
+            if not os.path.exists(output_path):
+                logger.error(f"Output not saved to {output_path}")
+                return
+        logger.info("Segment output created")
+
+    def copy_output_tables(self, source_tables):
+        """
+        Output tables of a solved segment with the same problem hash (see get_problem_hash) as output tables of this
+        segment.
+        """
+        output_tables = {}
+        for kind, source_table in source_tables.items():
+            output = source_table.copy()
+            if "tumour_id" in output.columns:
+                output["tumour_id"] = self.tumour_id
+            if "segment" in output.columns:
+                output["segment"] = self.segment
+            output_tables[kind] = output
+        return output_tables
+
+    def copy_output_from(self, source_input_file_name):
+        """
+        Save the output of a solved segment of the run with the same problem hash (see get_problem_hash), read from
+        its files, as the output of this segment.
+        """
+        self.save_output(
+            self.copy_output_tables(
+                self.read_output_tables(input_file_name=source_input_file_name)
+            )
+        )
+
+    def read_output_tables(self, kinds=None, input_file_name=None):
+        """
+        Output tables of the segment (or of another segment of the run with input_file_name) by kind (default: all
+        kinds), read from the files written by save_output
+        """
+        return {
+            kind: pd.read_csv(path)
+            for kind, path in self.get_output_paths(input_file_name).items()
+            if kinds is None or kind in kinds
+        }
@@ -1,14 +1,29 @@
 #!/usr/bin/env python3
-import os
+import logging
 import sys
+import time
 from tqdm import tqdm
-from io import StringIO
-from alpaca.ALPACA_segment_solution_class import SegmentSolution
+from alpaca.cohort import CohortRun
+from alpaca.parallel import solve_segments
+from alpaca.ALPACA_segment_solution_class import split_input_file_name
+from alpaca.output_store import get_output_store, writes_csv
+from alpaca.scheduler import (
+    get_available_cpus,
+    get_cpu_budget,
+    get_worker_count,
+    get_utilisation_report,
+    format_utilisation_report,
+)
 from alpaca.utils import (
     show_version,
     show_help,
     print_logo,
     concatenate_output,
+    combine_segment_outputs,
+    get_segment_output_name,
+    save_combined_output,
+    remove_segment_outputs,
+    SEGMENT_OUTPUT_KINDS,
     set_run_mode,
     create_logger,
     save_dataframe_to_csv,
@@ -37,14 +52,59 @@ def main():
     elif command == "ccd":
         scripts.run_calculate_ccd()
         return
+    elif command == "cache":
+        scripts.run_cache()
+        return
+    elif command == "input-container":
+        scripts.run_input_container()
+        return
     elif command == "run":
         run_alpaca()
+    elif command == "cohort":
+        run_cohort()
     else:
         print(f"Unknown command: {command}")
         print("Run 'alpaca help' for available commands.")
         sys.exit(1)
 
 
+def schedule_cpus(config, n_segments):
+    """
+    Divide cpus available to the process between segment workers. Sets cpus in model_config and returns
+    (cpus, workers).
+    """
+    logger = logging.getLogger("ALPACA")
+    available_cpus = get_available_cpus()
+    cpus = get_cpu_budget(config["model_config"]["cpus"], available_cpus)
+    if cpus != config["model_config"]["cpus"]:
+        logger.info(
+            f"Using {cpus} cpus ({available_cpus} available to the process, {config['model_config']['cpus']} requested)"
+        )
+    config["model_config"]["cpus"] = cpus
+    workers = get_worker_count(
+        config["preprocessing_config"]["workers"], cpus, n_segments
+    )
+    if workers > 1:
+        logger.info(f"Solving segments with {workers} workers")
+    return cpus, workers
+
+
+def log_run_summary(segment_usage, deduplicated, wall_time, cpus, workers):
+    logger = logging.getLogger("ALPACA")
+    report = get_utilisation_report(segment_usage, wall_time, cpus, workers)
+    for line in format_utilisation_report(report):
+        logger.info(line)
+    cached = [usage for usage in segment_usage if usage["cached"]]
+    if cached:
+        logger.info(
+            f"{len(cached)} segment(s) loaded from the solution cache, {sum(c['n_solves'] for c in cached)} model solves saved"
+        )
+    if deduplicated:
+        logger.info(
+            f"{len(deduplicated)} segment(s) identical to a solved segment, {sum(d['n_solves'] for d in deduplicated)} model solves saved"
+        )
+
+
 def run_alpaca():
     # Configure logging
     logger = create_logger(name="ALPACA", log_dir="logs")
@@ -57,7 +117,7 @@ def run_alpaca():
     # determine running mode:
     # if 'tumour', expect single file with all the segments and output a single file
     # if 'segment' expect array of files to segment files (can be from different tumours) and create separate outputs for each segment
-    config, run_mode = set_run_mode(config)
+    config, run_mode, input_tables = set_run_mode(config)
     logger.info("-------------------------------------------------")
     logger.info("Running ALPACA with the following parameters:")
     # print value of each parameter:
@@ -71,47 +131,88 @@ def run_alpaca():
             unit="file",
             file=sys.stderr,
         )
-        original_stdout = sys.stdout
-        if os.name == "nt":  # Windows
-            sys.stdout = open(os.devnull, "w")
-        else:  # Unix/Linux
-            sys.stdout = StringIO()
+    cpus, workers = schedule_cpus(
+        config, len(config["preprocessing_config"]["input_files"])
+    )
+    segment_usage = []
+    deduplicated = []
+    # segment outputs returned to the main process (see solve_segment), by output file name:
+    segment_outputs = {}
+    # columnar output store, if outputs are not written as CSV files only:
+    output_store = get_output_store(config["preprocessing_config"])
+    write_csv = writes_csv(config["preprocessing_config"])
+    start_time = time.time()
     try:
-        for input_file_name in config["preprocessing_config"]["input_files"]:
-            SS = SegmentSolution(input_file_name, config, logger)
-            if (
-                not config["preprocessing_config"]["overwrite_output"]
-                and SS.output_exists()
-            ):
-                logger.warning(
-                    f"Output for {input_file_name} already exists. Use '--overwrite_output 1' option to overwrite existing output. Skipping this segment."
-                )
+        for input_file_name, status, usage, outputs in solve_segments(
+            config["preprocessing_config"]["input_files"],
+            config,
+            workers,
+            input_tables,
+        ):
+            if status == "skipped":
+                # outputs of segments solved before an interrupted run are combined in memory:
+                for kind, table in (outputs or {}).items():
+                    segment_outputs[get_segment_output_name(input_file_name, kind)] = (
+                        table
+                    )
                 continue
-            logger.debug(f"Output path: {SS.create_output_path()}")
-            SS.run_iterations()
-            SS.find_optimal_solution()
-            SS.get_solution()
-            SS.save_output()
+            if outputs is not None:
+                tumour_id, segment = split_input_file_name(input_file_name)
+                for kind, table in outputs.items():
+                    if output_store is not None:
+                        output_store.append(kind, tumour_id, segment, table)
+                    if run_mode == "tumour" and kind in SEGMENT_OUTPUT_KINDS:
+                        segment_outputs[
+                            get_segment_output_name(input_file_name, kind)
+                        ] = table
+            if status == "deduplicated":
+                deduplicated.append(usage)
+            else:
+                segment_usage.append(usage)
             if not debug:
                 progress_bar.update(1)
                 progress_bar.set_description(f"Processing {input_file_name}")
             else:
                 logger.info(f"Segment {input_file_name} solved.")
+        log_run_summary(
+            segment_usage, deduplicated, time.time() - start_time, cpus, workers
+        )
         if run_mode == "tumour":
-            concatenated_output_path = concatenate_output(
-                config["preprocessing_config"]["output_directory"]
-            )
+            output_directory = config["preprocessing_config"]["output_directory"]
+            tumour_dir = config["preprocessing_config"]["input_tumour_directory"]
+            if input_tables is None and write_csv:
+                tumour_output = concatenate_output(output_directory)
+            elif not write_csv:
+                # includes segments skipped because their output is already in the store:
+                tumour_output = output_store.read_tumour_output(
+                    split_input_file_name(
+                        config["preprocessing_config"]["input_files"][0]
+                    )[0]
+                )
+            else:
+                tumour_output = combine_segment_outputs(segment_outputs)
+                save_combined_output(output_directory, tumour_output)
+                # segment outputs written to resume an interrupted run (see save_segment_output):
+                remove_segment_outputs(output_directory, segment_outputs)
             logger.info("Calculating copy number change to ancestor...")
             cn_change_to_ancestor_df = get_cn_change_to_ancestor(
-                f"{SS.tumour_dir}/tree_paths.json", concatenated_output_path
-            )
-            save_dataframe_to_csv(
-                df=cn_change_to_ancestor_df,
-                output_dir=SS.config["preprocessing_config"]["output_directory"],
-                output_filename="cn_change_to_ancestor.csv",
+                f"{tumour_dir}/tree_paths.json", tumour_output
             )
+            if output_store is not None:
+                output_store.append(
+                    "cn_change_to_ancestor",
+                    cn_change_to_ancestor_df["tumour_id"].iloc[0],
+                    None,
+                    cn_change_to_ancestor_df,
+                )
+            if write_csv:
+                save_dataframe_to_csv(
+                    df=cn_change_to_ancestor_df,
+                    output_dir=output_directory,
+                    output_filename="cn_change_to_ancestor.csv",
+                )
             logger.info(
-                f"""Analysis completed successfully. Output saved to: {SS.config["preprocessing_config"]["output_directory"]}"""
+                f"""Analysis completed successfully. Output saved to: {output_directory}"""
             )
         logger.info("Done")
     except Exception as e:
@@ -119,8 +220,75 @@ def run_alpaca():
         raise e
     finally:
         if not debug:
-            sys.stdout.close()
-            sys.stdout = original_stdout
+            progress_bar.close()
+
+
+def run_cohort():
+    """
+    Run all tumours in input_data_directory, resuming an interrupted run with the same output_directory (see cohort.py)
+    """
+    logger = create_logger(name="ALPACA", log_dir="logs")
+    logger.info("Starting ALPACA cohort run")
+    config = make_config(sys.argv[2:] + ["--mode", "cohort"])
+    debug = config["preprocessing_config"]["debug"]
+    if debug:
+        logger.setLevel("DEBUG")
+        logger.info("Debug mode is ON")
+    # completion is recorded in the journal, existing outputs are not checked:
+    config["preprocessing_config"]["overwrite_output"] = True
+    cohort = CohortRun(config)
+    pending_jobs = cohort.pending_jobs()
+    logger.info(
+        f"{len(cohort.manifest['tumours'])} tumour(s), {len(cohort.manifest['jobs'])} segment(s), {len(pending_jobs)} to solve"
+    )
+    logger.info(config)
+    print_logo()
+    if not debug:
+        progress_bar = tqdm(
+            total=len(pending_jobs),
+            desc="Processing files",
+            unit="file",
+            file=sys.stderr,
+        )
+    cpus, workers = schedule_cpus(config, len(pending_jobs))
+    segment_usage = []
+    deduplicated = []
+    output_store = get_output_store(config["preprocessing_config"])
+    start_time = time.time()
+    try:
+        # tumours completed before the previous run was interrupted:
+        for tumour_id in cohort.tumours_to_combine():
+            cohort.combine(tumour_id)
+        for input_file_name, status, usage, outputs in solve_segments(
+            pending_jobs, config, workers, cohort.input_tables
+        ):
+            if outputs is not None and output_store is not None:
+                tumour_id, segment = split_input_file_name(input_file_name)
+                for kind, table in outputs.items():
+                    output_store.append(kind, tumour_id, segment, table)
+            if status == "deduplicated":
+                deduplicated.append(usage)
+            else:
+                segment_usage.append(usage)
+            completed_tumour = cohort.complete_job(input_file_name)
+            if completed_tumour is not None:
+                cohort.combine(completed_tumour)
+            if not debug:
+                progress_bar.update(1)
+                progress_bar.set_description(f"Processing {input_file_name}")
+            else:
+                logger.info(f"Segment {input_file_name} solved.")
+        log_run_summary(
+            segment_usage, deduplicated, time.time() - start_time, cpus, workers
+        )
+        logger.info(
+            f"Cohort completed. Output saved to: {config['preprocessing_config']['output_directory']}"
+        )
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        raise e
+    finally:
+        if not debug:
             progress_bar.close()
 
 
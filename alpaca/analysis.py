@@ -1,7 +1,10 @@
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_integer_dtype, is_string_dtype
 from .utils import find_parent, read_tree_json
-from scipy.spatial import distance
+from scipy.spatial.distance import pdist
 import logging
+from typing import Union
 
 
 ### get_cn_change_to_ancestor ###
@@ -40,30 +43,33 @@ def get_parent_copynumbers(
     return output_with_parent_clones_copynumbers
 
 
-def get_cn_change_to_ancestor(tree_path: str, tumour_df_path: str) -> pd.DataFrame:
-    tumour_df = pd.read_csv(tumour_df_path)
+def get_cn_change_to_ancestor(
+    tree_path: str, tumour_df_path: Union[str, pd.DataFrame]
+) -> pd.DataFrame:
+    # combined output of a tumour, or path to it:
+    if isinstance(tumour_df_path, pd.DataFrame):
+        tumour_df = tumour_df_path
+    else:
+        tumour_df = pd.read_csv(tumour_df_path)
     tree = read_tree_json(tree_path)
     return get_parent_copynumbers(tree, tumour_df)
 
 
 ### calculate_ccd ###
-def calculate_ccd(results_path, metric="euclidean"):
-    """
-    example data:
-        clone  pred_CN_A  pred_CN_B   segment
-    0   clone1          1          3  1_10_100
-    1  clone10          1          3  1_10_100
-    2  clone12          1          2  1_10_100
-    """
-    logger = logging.getLogger("ccd")
-    results_df = pd.read_csv(results_path)
-    # validate input:
+def read_results(results_path: Union[str, pd.DataFrame]) -> pd.DataFrame:
+    # ALPACA output of a tumour or a cohort, or path to it:
+    if isinstance(results_path, pd.DataFrame):
+        return results_path
+    return pd.read_csv(results_path)
+
+
+def validate_ccd_input(results_df: pd.DataFrame):
     # check if columns tumour_id, clone and segment are strings, while pred_CN_A and pred_CN_B are integers:
     if not all(
-        results_df[col].dtype == "object" for col in ["tumour_id", "clone", "segment"]
+        is_string_dtype(results_df[col]) for col in ["tumour_id", "clone", "segment"]
     ):
         raise ValueError("tumour_id, clone and segment should be strings")
-    if not all(results_df[col].dtype == "int" for col in ["pred_CN_A", "pred_CN_B"]):
+    if not all(is_integer_dtype(results_df[col]) for col in ["pred_CN_A", "pred_CN_B"]):
         raise ValueError("pred_CN_A and pred_CN_B should be integers")
     # check for any NaN or empty values in the required columns:
     required_columns = ["tumour_id", "clone", "segment", "pred_CN_A", "pred_CN_B"]
@@ -75,36 +81,112 @@ def calculate_ccd(results_path, metric="euclidean"):
         raise ValueError(
             "segment column should contain the format 'chromosome_start_end'"
         )
-    results_per_tumour = []
+
+
+def get_clone_copy_number_matrix(tumour_df: pd.DataFrame):
+    """
+    Integer copy numbers of a tumour as a clones x (alleles * segments) matrix: allele A of all segments (in genomic
+    order), then allele B. tumour_df has to be sorted by chromosome, start and clone.
+    Returns clone names, segment lengths and the matrix.
+    """
+    clone_codes, clones = pd.factorize(tumour_df["clone"])
+    segment_codes, _ = pd.factorize(tumour_df["segment"])
+    n_clones, n_segments = len(clones), segment_codes.max() + 1
+    if len(tumour_df) != n_clones * n_segments or (
+        tumour_df.duplicated(["clone", "segment"]).any()
+    ):
+        raise ValueError(
+            f"Tumour {tumour_df['tumour_id'].iloc[0]} should have one copy number of each clone in each segment"
+        )
+    matrix = np.zeros((n_clones, 2 * n_segments), dtype=np.int64)
+    matrix[clone_codes, segment_codes] = tumour_df["pred_CN_A"].to_numpy()
+    matrix[clone_codes, n_segments + segment_codes] = tumour_df["pred_CN_B"].to_numpy()
+    lengths = np.zeros(n_segments, dtype=np.int64)
+    lengths[segment_codes] = (tumour_df["end"] - tumour_df["start"]).to_numpy()
+    return list(clones), lengths, matrix
+
+
+def calculate_ccd(
+    results_path: Union[str, pd.DataFrame],
+    metric: Union[str, list[str]] = "euclidean",
+    weight_by_length: bool = False,
+    pairwise: bool = False,
+):
+    """
+    Clone copy number diversity (CCD) of each tumour: the largest distance between copy number profiles of any two
+    of its clones. Distances of all pairs of clones of a tumour are calculated at once (scipy pdist) on a
+    clones x (alleles * segments) integer matrix.
+
+    example data:
+        clone  pred_CN_A  pred_CN_B   segment
+    0   clone1          1          3  1_10_100
+    1  clone10          1          3  1_10_100
+    2  clone12          1          2  1_10_100
+
+    metric: distance metric of scipy.spatial.distance, or a list of metrics calculated in one pass. Output has a
+        'CCD' column for a single metric and a 'CCD_{metric}' column for each metric of a list.
+    weight_by_length: weight segments by their length, as a fraction of the total length of segments of the tumour
+        (only for metrics supporting weights, e.g. euclidean, cityblock, sqeuclidean, minkowski, hamming)
+    pairwise: also return distances of all pairs of clones of each tumour: one row per pair (tumour_id, clone_1,
+        clone_2) with a column for each metric; the distance matrix of a tumour is symmetric with zero diagonal.
+    Returns CCD table, or CCD table and pairwise distances if pairwise is set.
+    """
+    logger = logging.getLogger("ccd")
+    metrics = [metric] if isinstance(metric, str) else list(metric)
+    ccd_columns = ["CCD"] if isinstance(metric, str) else [f"CCD_{m}" for m in metrics]
+    results_df = read_results(results_path)
+    validate_ccd_input(results_df)
+    segment_coordinates = (
+        results_df["segment"].str.split("_", expand=True).astype(np.int64)
+    )
+    results_df = results_df.assign(
+        chromosome=segment_coordinates[0],
+        start=segment_coordinates[1],
+        end=segment_coordinates[2],
+    ).sort_values(["tumour_id", "chromosome", "start", "clone"], kind="stable")
     tumour_ids = results_df["tumour_id"].unique()
     logger.info(f"Found {len(tumour_ids)} unique tumours")
-    for tumour_id, tumour_df in results_df.groupby("tumour_id"):
-        tumour_df["chromosome"] = (
-            tumour_df["segment"].str.split("_", expand=True)[0].astype(int)
+    ccd_rows = []
+    pairwise_tables = []
+    for tumour_id, tumour_df in results_df.groupby("tumour_id", sort=True):
+        clones, lengths, matrix = get_clone_copy_number_matrix(tumour_df)
+        weights = None
+        if weight_by_length:
+            weights = np.tile(lengths / lengths.sum(), 2)
+        distances = {
+            m: (
+                pdist(matrix, metric=m)
+                if weights is None
+                else pdist(matrix, metric=m, w=weights)
+            )
+            for m in metrics
+        }
+        ccd_rows.append(
+            [tumour_id]
+            + [
+                float(distances[m].max()) if len(distances[m]) > 0 else 0
+                for m in metrics
+            ]
         )
-        tumour_df["start"] = (
-            tumour_df["segment"].str.split("_", expand=True)[1].astype(int)
-        )
-        distance_func = getattr(distance, metric)
-        tumour_df = tumour_df.sort_values(["chromosome", "start", "clone"])
-        vectors = [
-            tumour_df[tumour_df.clone == clone][["pred_CN_A", "pred_CN_B"]]
-            .unstack()
-            .values
-            for clone in tumour_df.clone.unique()
-        ]
-        vectors_names = [clone for clone in tumour_df.clone.unique()]
-        max_difference = 0
-        differences = []
-        for i in range(len(vectors)):
-            for j in range(i + 1, len(vectors)):
-                diff = distance_func(vectors[i], vectors[j])
-                differences.append(diff)
-                if diff > max_difference:
-                    max_difference = diff
-                    most_different_vectors = (vectors_names[i], vectors_names[j])
-        tumour_df["CCD"] = max_difference
-        tumour_results_df = tumour_df[["tumour_id", "CCD"]].drop_duplicates().copy()
-        results_per_tumour.append(tumour_results_df)
-    ccd_df = pd.concat(results_per_tumour, ignore_index=True)
-    return ccd_df
+        if pairwise:
+            # pairs in the order of the condensed distance matrix:
+            i, j = np.triu_indices(len(clones), k=1)
+            pairwise_tables.append(
+                pd.DataFrame(
+                    {
+                        "tumour_id": tumour_id,
+                        "clone_1": np.asarray(clones, dtype=object)[i],
+                        "clone_2": np.asarray(clones, dtype=object)[j],
+                        **distances,
+                    }
+                )
+            )
+    ccd_df = pd.DataFrame(ccd_rows, columns=["tumour_id"] + ccd_columns)
+    if not pairwise:
+        return ccd_df
+    pairwise_df = (
+        pd.concat(pairwise_tables, ignore_index=True)
+        if pairwise_tables
+        else pd.DataFrame(columns=["tumour_id", "clone_1", "clone_2"] + metrics)
+    )
+    return ccd_df, pairwise_df
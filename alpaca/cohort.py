@@ -0,0 +1,236 @@
+"""
+Cohort mode (alpaca cohort): all tumours in input_data_directory in one run.
+Segments of all tumours are jobs of a job manifest ({output_directory}/cohort_manifest.json), written once when the
+cohort is discovered. Completion of each job, and of the combined output of each tumour, is recorded in a journal
+({output_directory}/cohort_journal.jsonl): one JSON line appended with a single write after the outputs of the job
+were written. A killed run is resumed by running the same command again: completed jobs are read from the journal,
+so neither outputs nor their completeness need to be checked, and jobs interrupted while writing are run again.
+Input tables of segments are read when their jobs are solved (see CohortInputTables), so a resumed run reads only
+the manifest and the journal before solving the pending jobs.
+Outputs of segments are combined for each tumour (ALPACA_output_{tumour_id}.csv and cn_change_to_ancestor.csv in
+{output_directory}/{tumour_id}) as soon as all of its segments are completed.
+"""
+
+import json
+import logging
+import os
+import time
+from pathlib import Path
+import pandas as pd
+from alpaca.ALPACA_segment_solution_class import split_input_file_name
+from alpaca.analysis import get_cn_change_to_ancestor
+from alpaca.input_container import CohortInputTables, list_cohort_segments
+from alpaca.output_store import get_output_store, writes_csv
+from alpaca.utils import (
+    SEGMENT_OUTPUT_KINDS,
+    combine_segment_outputs,
+    get_segment_output_name,
+    get_version,
+    save_combined_output,
+    save_dataframe_to_csv,
+)
+
+MANIFEST_NAME = "cohort_manifest.json"
+JOURNAL_NAME = "cohort_journal.jsonl"
+
+
+def discover_tumours(input_data_directory):
+    """
+    Tumour directories in input_data_directory: directories with a tree and either ALPACA_input_table.csv (tumour
+    mode layout) or a segments directory (segment mode layout)
+    """
+    return [
+        tumour_dir.name
+        for tumour_dir in sorted(Path(input_data_directory).iterdir())
+        if (tumour_dir / "tree_paths.json").exists()
+        and (
+            (tumour_dir / "ALPACA_input_table.csv").exists()
+            or (tumour_dir / "segments").is_dir()
+        )
+    ]
+
+
+def write_json_atomically(path, content):
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(content, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def load_job_manifest(output_directory, input_data_directory):
+    """
+    Job manifest of the cohort: {'input_data_directory', 'version', 'tumours', 'jobs': [{'job': input file name,
+    'tumour_id', 'segment'}]}, with a job for each segment of discovered tumours. Written when the cohort is run for
+    the first time and read when it is resumed, so that a resumed run has the same jobs and does not list segments
+    again.
+    """
+    manifest_path = os.path.join(output_directory, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+    tumours = discover_tumours(input_data_directory)
+    jobs = []
+    for input_file_name in sorted(list_cohort_segments(input_data_directory)):
+        tumour_id, segment = split_input_file_name(input_file_name)
+        if tumour_id in tumours:
+            jobs.append(
+                {"job": input_file_name, "tumour_id": tumour_id, "segment": segment}
+            )
+    manifest = {
+        "input_data_directory": str(input_data_directory),
+        "version": get_version(),
+        "tumours": tumours,
+        "jobs": jobs,
+    }
+    os.makedirs(output_directory, exist_ok=True)
+    write_json_atomically(manifest_path, manifest)
+    return manifest
+
+
+class JobJournal:
+    """
+    Append-only record of completed jobs ({'job': input file name}) and combined tumours ({'tumour_id'})
+    """
+
+    def __init__(self, output_directory):
+        self.path = os.path.join(output_directory, JOURNAL_NAME)
+
+    def record(self, **entry):
+        entry["time"] = time.time()
+        line = (json.dumps(entry) + "\n").encode()
+        # single write of the whole line in append mode, so concurrent or interrupted writes do not mix lines:
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read(self):
+        """
+        Completed jobs and combined tumours. A partially written last line (killed run) is ignored.
+        """
+        completed_jobs, combined_tumours = set(), set()
+        if not os.path.exists(self.path):
+            return completed_jobs, combined_tumours
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "job" in entry:
+                    completed_jobs.add(entry["job"])
+                elif "tumour_id" in entry:
+                    combined_tumours.add(entry["tumour_id"])
+        return completed_jobs, combined_tumours
+
+
+def combine_tumour(tumour_id, jobs, config):
+    """
+    Combine outputs of the segments (jobs) of a tumour into its combined output and copy number changes to ancestors,
+    written to {output_directory}/{tumour_id} (and appended to the output store, if used).
+    Returns paths of segment output files that can be removed once the tumour is recorded as combined.
+    """
+    preprocessing_config = config["preprocessing_config"]
+    output_directory = preprocessing_config["output_directory"]
+    output_store = get_output_store(preprocessing_config)
+    segment_files = []
+    if writes_csv(preprocessing_config):
+        segment_outputs = {}
+        for job in jobs:
+            for kind in SEGMENT_OUTPUT_KINDS:
+                output_name = get_segment_output_name(job, kind)
+                output_path = os.path.join(output_directory, output_name)
+                if os.path.exists(output_path):
+                    segment_outputs[output_name] = pd.read_csv(output_path)
+                    segment_files.append(output_path)
+        tumour_output = combine_segment_outputs(segment_outputs)
+        save_combined_output(os.path.join(output_directory, tumour_id), tumour_output)
+    else:
+        tumour_output = output_store.read_tumour_output(tumour_id)
+    cn_change_to_ancestor_df = get_cn_change_to_ancestor(
+        os.path.join(
+            preprocessing_config["input_data_directory"], tumour_id, "tree_paths.json"
+        ),
+        tumour_output,
+    )
+    if output_store is not None:
+        output_store.append(
+            "cn_change_to_ancestor", tumour_id, None, cn_change_to_ancestor_df
+        )
+    if writes_csv(preprocessing_config):
+        save_dataframe_to_csv(
+            df=cn_change_to_ancestor_df,
+            output_dir=os.path.join(output_directory, tumour_id),
+            output_filename="cn_change_to_ancestor.csv",
+        )
+    return segment_files
+
+
+class CohortRun:
+    """
+    State of a cohort run: jobs of the manifest, completed jobs and tumours that are still to be combined
+    """
+
+    def __init__(self, config):
+        preprocessing_config = config["preprocessing_config"]
+        self.config = config
+        self.output_directory = preprocessing_config["output_directory"]
+        self.manifest = load_job_manifest(
+            self.output_directory, preprocessing_config["input_data_directory"]
+        )
+        self.journal = JobJournal(self.output_directory)
+        self.completed_jobs, self.combined_tumours = self.journal.read()
+        self.tumour_jobs = {}
+        for job in self.manifest["jobs"]:
+            self.tumour_jobs.setdefault(job["tumour_id"], []).append(job["job"])
+        # input tables of the segments, by input file name, read when a segment is solved:
+        self.input_tables = CohortInputTables(
+            preprocessing_config["input_data_directory"],
+            {job["job"]: job["tumour_id"] for job in self.manifest["jobs"]},
+        )
+
+    def pending_jobs(self):
+        return [
+            job["job"]
+            for job in self.manifest["jobs"]
+            if job["job"] not in self.completed_jobs
+        ]
+
+    def complete_job(self, input_file_name):
+        """
+        Record a completed job. Returns tumour id if all segments of its tumour are completed, otherwise None.
+        """
+        self.journal.record(job=input_file_name)
+        self.completed_jobs.add(input_file_name)
+        tumour_id, _ = split_input_file_name(input_file_name)
+        if all(job in self.completed_jobs for job in self.tumour_jobs[tumour_id]):
+            return tumour_id
+        return None
+
+    def tumours_to_combine(self):
+        """
+        Tumours with all segments completed but not combined (e.g. run was killed while combining)
+        """
+        return [
+            tumour_id
+            for tumour_id, jobs in self.tumour_jobs.items()
+            if tumour_id not in self.combined_tumours
+            and all(job in self.completed_jobs for job in jobs)
+        ]
+
+    def combine(self, tumour_id):
+        logger = logging.getLogger("ALPACA")
+        segment_files = combine_tumour(
+            tumour_id, self.tumour_jobs[tumour_id], self.config
+        )
+        self.journal.record(tumour_id=tumour_id)
+        self.combined_tumours.add(tumour_id)
+        # segment files are removed only after the tumour is recorded, so that an interrupted tumour can be combined
+        # again:
+        for segment_file in segment_files:
+            os.remove(segment_file)
+        logger.info(f"Tumour {tumour_id} completed")
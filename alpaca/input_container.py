@@ -0,0 +1,178 @@
+"""
+Segment-indexed input container: input tables of many segments (of one tumour or a cohort) in a single parquet file,
+one row group per segment, in place of one ALPACA_input_table_{tumour_id}_{segment}.csv file per segment.
+The index (row group and columns of each segment, by segment input file name) is stored in the file metadata, so a
+segment is read by name from the footer and its own row group, without scanning the file.
+A container is read through InputContainer, a mapping {input file name: input table} that can be passed as
+input_tables to solve_segments; workers open the file themselves.
+Input tables of a cohort in tumour directories are read in the same way, when a segment is accessed, through
+CohortInputTables.
+"""
+
+import json
+import os
+from collections.abc import Mapping
+from pathlib import Path
+import pandas as pd
+from alpaca.output_store import import_pyarrow
+from alpaca.utils import group_to_segments
+
+INDEX_KEY = b"alpaca_segment_index"
+
+
+def write_input_container(container_path, input_tables):
+    """
+    Write input tables ({input file name: input table}) to a container, one row group per segment in order of
+    input file names. Columns missing from some of the tables are null in their row groups and are not read back.
+    Returns number of segments written.
+    """
+    pa = import_pyarrow()
+    import pyarrow.parquet as pq
+
+    names = sorted(input_tables)
+    tables = [
+        pa.Table.from_pandas(input_tables[name], preserve_index=False) for name in names
+    ]
+    schema = pa.unify_schemas(
+        [table.schema for table in tables], promote_options="permissive"
+    )
+    column_sets = []
+    row_groups = {}
+    for row_group, (name, table) in enumerate(zip(names, tables)):
+        columns = table.column_names
+        if columns not in column_sets:
+            column_sets.append(columns)
+        row_groups[name] = [row_group, column_sets.index(columns)]
+    index = json.dumps({"row_groups": row_groups, "column_sets": column_sets})
+    schema = schema.with_metadata({INDEX_KEY: index.encode()})
+    os.makedirs(os.path.dirname(os.path.abspath(container_path)), exist_ok=True)
+    temporary_path = f"{container_path}.{os.getpid()}.tmp"
+    with pq.ParquetWriter(temporary_path, schema) as writer:
+        for table in tables:
+            for column in schema.names:
+                if column not in table.column_names:
+                    table = table.append_column(
+                        column, pa.nulls(len(table), schema.field(column).type)
+                    )
+            # one row group per segment:
+            writer.write_table(
+                table.select(schema.names).cast(schema), row_group_size=len(table)
+            )
+    os.replace(temporary_path, container_path)
+    return len(names)
+
+
+def list_cohort_segments(input_data_directory):
+    """
+    Segments of the tumours in input_data_directory, without reading their input tables: {input file name: tumour
+    directory name}, from the segment column of ALPACA_input_table.csv of each tumour directory (tumour mode layout)
+    or from the file names in its segments directory (segment mode layout).
+    """
+    segments = {}
+    for tumour_dir in sorted(Path(input_data_directory).iterdir()):
+        if (tumour_dir / "ALPACA_input_table.csv").exists():
+            df = pd.read_csv(
+                tumour_dir / "ALPACA_input_table.csv", usecols=["tumour_id", "segment"]
+            )
+            tumour_id = df["tumour_id"].iloc[0]
+            for segment in sorted(df["segment"].unique()):
+                segments[f"ALPACA_input_table_{tumour_id}_{segment}.csv"] = (
+                    tumour_dir.name
+                )
+        elif (tumour_dir / "segments").is_dir():
+            for segment_file in sorted((tumour_dir / "segments").glob("*.csv")):
+                segments[segment_file.name] = tumour_dir.name
+    return segments
+
+
+def get_cohort_input_tables(input_data_directory):
+    """
+    Input tables of all segments of the tumours in input_data_directory (see CohortInputTables), read into memory
+    """
+    input_tables = CohortInputTables(
+        input_data_directory, list_cohort_segments(input_data_directory)
+    )
+    return {
+        input_file_name: input_tables[input_file_name]
+        for input_file_name in input_tables
+    }
+
+
+class CohortInputTables(Mapping):
+    """
+    Input tables of segments of a cohort, {input file name: input table}, read from the tumour directories when a
+    segment is accessed: from the segments directory (segment mode layout) or from ALPACA_input_table.csv (tumour mode
+    layout), which is read once for consecutive segments of a tumour.
+    segments: {input file name: tumour directory name} (see list_cohort_segments)
+    """
+
+    def __init__(self, input_data_directory, segments):
+        self.input_data_directory = str(input_data_directory)
+        self.segments = dict(segments)
+        # input tables of the last tumour read from ALPACA_input_table.csv: (tumour directory name, input tables)
+        self.tumour_tables = (None, {})
+
+    def __getitem__(self, input_file_name):
+        tumour_dir = os.path.join(
+            self.input_data_directory, self.segments[input_file_name]
+        )
+        if not os.path.exists(os.path.join(tumour_dir, "ALPACA_input_table.csv")):
+            return pd.read_csv(os.path.join(tumour_dir, "segments", input_file_name))
+        if self.tumour_tables[0] != self.segments[input_file_name]:
+            self.tumour_tables = (
+                self.segments[input_file_name],
+                group_to_segments(tumour_dir),
+            )
+        return self.tumour_tables[1][input_file_name]
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __getstate__(self):
+        # tables read by the main process are not sent to workers, each worker reads the segments it solves:
+        state = self.__dict__.copy()
+        state["tumour_tables"] = (None, {})
+        return state
+
+
+class InputContainer(Mapping):
+    def __init__(self, container_path):
+        import_pyarrow()
+        import pyarrow.parquet as pq
+
+        self.container_path = str(container_path)
+        # only the footer is read:
+        metadata = pq.read_metadata(self.container_path).metadata or {}
+        if INDEX_KEY not in metadata:
+            raise ValueError(
+                f"{self.container_path} is not an ALPACA input container (no segment index)"
+            )
+        index = json.loads(metadata[INDEX_KEY])
+        self.row_groups = index["row_groups"]
+        self.column_sets = index["column_sets"]
+        self.parquet_file = None
+
+    def __getitem__(self, input_file_name):
+        row_group, column_set = self.row_groups[input_file_name]
+        if self.parquet_file is None:
+            import pyarrow.parquet as pq
+
+            self.parquet_file = pq.ParquetFile(self.container_path)
+        return self.parquet_file.read_row_group(
+            row_group, columns=self.column_sets[column_set]
+        ).to_pandas()
+
+    def __iter__(self):
+        return iter(self.row_groups)
+
+    def __len__(self):
+        return len(self.row_groups)
+
+    def __getstate__(self):
+        # open file handles are not sent to workers, each worker opens the container itself:
+        state = self.__dict__.copy()
+        state["parquet_file"] = None
+        return state
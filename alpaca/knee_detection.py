@@ -0,0 +1,144 @@
+"""
+Knee detection on the D score curve of the complexity sweep (elbow of a convex, decreasing curve).
+Gives the same knees as kneed.KneeLocator(x, y, S, curve="convex", direction="decreasing", interp_method="interp1d",
+online=True), which was used for each sensitivity S separately. The difference curve, its local extrema and the
+thresholds they set do not depend on S, so they are computed once and knees for all sensitivities are found in one
+pass over a (sensitivities x points) array.
+KneeDetector keeps the points of the sweep and is updated as each allowed complexity is evaluated: knees are only
+recomputed after new points were added.
+"""
+
+import numpy as np
+from scipy import interpolate
+from scipy.signal import argrelextrema
+
+# sensitivity of the first search for a knee, and sensitivities searched if no knee is found with it:
+DEFAULT_SENSITIVITY = 1
+SENSITIVITIES = np.arange(0, 200)
+# first running minimum of the strictly decreasing curve and its step for non-decreasing values:
+STRICTLY_DECREASING_START = 1000
+STRICTLY_DECREASING_STEP = 0.001
+CURVES = ["raw", "strictly_decreasing"]
+
+
+def normalize(a):
+    return (a - min(a)) / (max(a) - min(a))
+
+
+def find_knees(x, y, sensitivities=SENSITIVITIES):
+    """
+    Knee of the convex, decreasing curve y(x) for each sensitivity (None if no knee is found), as found by kneed
+    (online, interp1d). x must be sorted in increasing order.
+    """
+    x = np.asarray(x)
+    # interpolation at the points themselves, as in kneed (values can differ from y by rounding):
+    y_interpolated = interpolate.interp1d(x, np.asarray(y))(x)
+    x_normalized = normalize(x)
+    y_normalized = normalize(y_interpolated)
+    # convex and decreasing curve is transformed to concave and increasing:
+    y_normalized = y_normalized.max() - y_normalized
+    y_difference = y_normalized - x_normalized
+    knees = np.full(len(sensitivities), None, dtype=object)
+    maxima = np.zeros(len(x), dtype=bool)
+    maxima[argrelextrema(y_difference, np.greater_equal)[0]] = True
+    minima = np.zeros(len(x), dtype=bool)
+    minima[argrelextrema(y_difference, np.less_equal)[0]] = True
+    if not maxima.any():
+        return knees
+    # points from the first maximum to the last but one are traversed, each compared with the next point:
+    points = np.arange(np.argmax(maxima), len(x) - 1)
+    indices = np.arange(len(x))
+    # threshold is set by the last maximum; detection is active if the last extremum is a maximum which is not also
+    # a minimum:
+    last_maximum = np.maximum.accumulate(np.where(maxima, indices, -1))[points]
+    last_extremum = np.maximum.accumulate(np.where(maxima | minima, indices, -1))[
+        points
+    ]
+    active = maxima[last_extremum] & ~minima[last_extremum]
+    points, last_maximum = points[active], last_maximum[active]
+    if len(points) == 0:
+        return knees
+    thresholds = y_difference[last_maximum][np.newaxis, :] - (
+        np.asarray(sensitivities)[:, np.newaxis] * np.abs(np.diff(x_normalized).mean())
+    )
+    detected = y_difference[points + 1][np.newaxis, :] < thresholds
+    # online detection: the knee is set by the last detection
+    found = detected.any(axis=1)
+    last_detection = detected.shape[1] - 1 - np.argmax(detected[:, ::-1], axis=1)
+    for i in np.flatnonzero(found):
+        knees[i] = x[last_maximum[last_detection[i]]]
+    return knees
+
+
+def select_knee(knees, sensitivities=SENSITIVITIES):
+    """
+    Knee found with the default sensitivity or, if there is none, with a higher sensitivity.
+    Returns knee (None if no knee is found) and code: 'default' or 'high_sensitivity'.
+    """
+    s = knees[list(sensitivities).index(DEFAULT_SENSITIVITY)]
+    s_code = "default"
+    if not s:
+        # first of the distinct knees, in the order of a set (as selected before knees were vectorised):
+        s_candidates = list(set([s for s in knees if s is not None]))
+        if len(s_candidates) > 0:
+            s = s_candidates[0]
+            s_code = "high_sensitivity"
+    return s, s_code
+
+
+class KneeDetector:
+    """
+    Points (allowed complexity, D score) of a sweep and knees of their curves: 'raw' (D scores) and
+    'strictly_decreasing' (D scores rounded to 3 decimals, with each value which does not decrease replaced by the
+    running minimum minus 0.001, see ensure_elbow_strictly_decreasing)
+    """
+
+    def __init__(self):
+        self.x = np.array([], dtype=np.int64)
+        self.y = {curve: np.array([], dtype=float) for curve in CURVES}
+        # selected knee and its code of each curve, until new points are added:
+        self.knees = {}
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, x, y):
+        """
+        Add a point. Points with known x (the first point is kept) or without y are ignored.
+        """
+        if np.isnan(y) or x in self.x:
+            return
+        index = np.searchsorted(self.x, x)
+        self.x = np.insert(self.x, index, x)
+        self.y["raw"] = np.insert(self.y["raw"], index, y)
+        self.y["strictly_decreasing"] = np.insert(
+            self.y["strictly_decreasing"], index, 0.0
+        )
+        # values after the new point depend on it:
+        decreasing = self.y["strictly_decreasing"]
+        rounded = np.round(self.y["raw"], 3)
+        current_minimum = (
+            STRICTLY_DECREASING_START if index == 0 else decreasing[index - 1]
+        )
+        for i in range(index, len(decreasing)):
+            if rounded[i] < current_minimum:
+                current_minimum = rounded[i]
+            else:
+                current_minimum = current_minimum - STRICTLY_DECREASING_STEP
+            decreasing[i] = current_minimum
+        self.knees = {}
+
+    def update(self, objectives):
+        """
+        Add points of evaluated allowed complexities: {allowed complexity: (CI score, D score)}
+        """
+        for x, (_, y) in objectives.items():
+            self.add(x, y)
+
+    def find_s_values(self, curve="raw"):
+        """
+        Knee of the curve and its code (see select_knee)
+        """
+        if curve not in self.knees:
+            self.knees[curve] = select_knee(find_knees(self.x, self.y[curve]))
+        return self.knees[curve]
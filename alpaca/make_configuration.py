@@ -1,6 +1,8 @@
 import argparse
 import os
 import sys
+from alpaca.output_store import OUTPUT_FORMATS
+from alpaca.solution_cache import DEFAULT_CACHE_DIRECTORY, DEFAULT_MAX_SIZE_MB
 
 """
 ALPACA can operate in two modes: 'tumour' and 'segment'.
@@ -33,6 +35,14 @@ def get_parser():
         required=False,
         help="Space-separated list of input tables for one or multiple segments.",
     )
+    parser.add_argument(
+        "--input_container",
+        type=str,
+        default="",
+        required=False,
+        help="Parquet file with input tables of many segments, indexed by segment (see 'alpaca input-container'). \
+            If set, --input_files selects segments of the container (default: all segments).",
+    )
     # TUMOUR mode arguments:
     parser.add_argument(
         "--input_tumour_directory",
@@ -46,7 +56,8 @@ def get_parser():
         type=str,
         default="tumour",
         help="Mode of operation. If 'tumour', expect single file with all the segments and output a single file.\
-            If 'segment' expect array of files to segment files (can be from different tumours) and create separate outputs for each segment.",
+            If 'segment' expect array of files to segment files (can be from different tumours) and create separate outputs for each segment.\
+            Mode 'cohort' is set by 'alpaca cohort'.",
     )
     parser.add_argument(
         "--overwrite_output",
@@ -121,7 +132,113 @@ def get_parser():
         type=int,
         help="Set to true if objective function is expected to reach value of zero (only in certain simulated scenarios)",
     )
-    parser.add_argument("--cpus", default=1, type=int, help="number of available cpus")
+    parser.add_argument(
+        "--reuse_model",
+        default=1,
+        type=int,
+        help="Build the model once per segment and only update the allowed complexity between iterations. \
+            If set to 0, a new model is built for every allowed complexity.",
+    )
+    parser.add_argument(
+        "--warm_start",
+        default=1,
+        type=int,
+        help="Use the solution found for the previous allowed complexity as a MIP start for the next iteration.",
+    )
+    parser.add_argument(
+        "--formulation",
+        default="bigM",
+        choices=["bigM", "indicator", "sos"],
+        help="Formulation of binarised relations (confidence interval misses, event indicators, path counts): \
+            big-M constraints, gurobi indicator constraints or SOS1 constraints.",
+    )
+    parser.add_argument(
+        "--cumulative_path_counts",
+        default=0,
+        type=int,
+        help="Count changes on root-to-leaf paths by propagating cumulative counts along tree edges instead of \
+            summing over the edges of every path. Produces smaller models for deep trees.",
+    )
+    parser.add_argument(
+        "--search_strategy",
+        default="linear",
+        choices=["linear", "exponential", "golden", "scenarios"],
+        help="Strategy for searching allowed complexities: 'linear' solves every allowed complexity, \
+            'exponential' solves 1, 2, 4, ... and bisects around the elbow, \
+            'golden' uses golden section search for the elbow of the D score curve, \
+            'scenarios' solves every allowed complexity in one multi-scenario model (falls back to 'linear'). \
+            'exponential' and 'golden' are heuristics: they assume a convex D score curve with a single elbow and \
+            can select a different elbow than 'linear' when it is not.",
+    )
+    parser.add_argument(
+        "--slack_early_stop",
+        default=1,
+        type=int,
+        help="In linear search, stop iterating when the complexity constraint is slack and the maximum complexity \
+            has the same optimum. Remaining allowed complexities are filled with the same solution.",
+    )
+    parser.add_argument(
+        "--cpus",
+        default=1,
+        type=int,
+        help="Number of available cpus, limited by the cpu quota and affinity of the process. 0: use all cpus \
+            available to the process.",
+    )
+    parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of segments solved in parallel (worker processes). Available cpus are divided between workers. \
+            0: one worker per available cpu.",
+    )
+    parser.add_argument(
+        "--deduplicate_segments",
+        default=1,
+        type=int,
+        help="Solve segments with identical inputs (copy numbers, confidence intervals, clone proportions and tree) \
+            once and copy the output to the other segments.",
+    )
+    parser.add_argument(
+        "--in_memory",
+        default=1,
+        type=int,
+        help="In tumour mode, keep input tables and outputs of segments in memory and write only the combined \
+            outputs of the tumour (0: write segment input files and segment outputs, as in segment mode). \
+            With --overwrite_output 0, segment outputs are also written, so that an interrupted run can be resumed.",
+    )
+    parser.add_argument(
+        "--output_format",
+        default="csv",
+        choices=OUTPUT_FORMATS,
+        help="Format of the outputs: csv files or a parquet or arrow dataset with one file per segment, appended as \
+            segments are solved (see output_store.py).",
+    )
+    parser.add_argument(
+        "--export_csv",
+        default=0,
+        type=int,
+        help="With parquet or arrow output format, also write CSV outputs.",
+    )
+    parser.add_argument(
+        "--use_cache",
+        default=0,
+        type=int,
+        help="Store solutions of all allowed complexities of each segment in the solution cache and reuse them for \
+            segments with the same inputs and model parameters. Search settings (e.g. --search_strategy, --warm_start) and \
+            --missing_clones_inherit_from_children_flag are not part of the cache key.",
+    )
+    parser.add_argument(
+        "--cache_directory",
+        default=DEFAULT_CACHE_DIRECTORY,
+        type=str,
+        help="Directory of the solution cache",
+    )
+    parser.add_argument(
+        "--cache_max_size_mb",
+        default=DEFAULT_MAX_SIZE_MB,
+        type=float,
+        help="Size limit of the solution cache in MB, least recently used entries are removed above it",
+    )
     parser.add_argument("--rsc", default=0, type=int, help="remove small clones")
     parser.add_argument(
         "--ccp", default=0, type=int, help="calibrate clone proportions"
@@ -145,10 +262,19 @@ def validate_args(args):
                 file=sys.stderr,
             )
             sys.exit(1)
+    elif args.mode == "cohort":
+        if not args.input_data_directory or not args.output_directory:
+            print(
+                "Error: --input_data_directory and --output_directory are required in cohort mode.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
     else:  # mode is 'segment'
-        if not args.input_data_directory or not args.input_files:
+        if not args.input_data_directory or not (
+            args.input_files or args.input_container
+        ):
             print(
-                "Error: --input_data_directory and --input_files are required when --mode is 'segment'.",
+                "Error: --input_data_directory and --input_files (or --input_container) are required when --mode is 'segment'.",
                 file=sys.stderr,
             )
             sys.exit(1)
@@ -173,10 +299,24 @@ def make_config(args_in):
         "gurobi_logs": args.gurobi_logs,
         "missing_clones_inherit_from_children_flag": args.missing_clones_inherit_from_children_flag,
         "d_zero": args.d_zero,
+        "reuse_model": args.reuse_model,
+        "warm_start": args.warm_start,
+        "formulation": args.formulation,
+        "cumulative_path_counts": args.cumulative_path_counts,
+        "search_strategy": args.search_strategy,
+        "slack_early_stop": args.slack_early_stop,
     }
     preprocessing_config = {
         "mode": args.mode,
         "overwrite_output": args.overwrite_output,
+        "workers": args.workers,
+        "deduplicate_segments": args.deduplicate_segments,
+        "in_memory": args.in_memory,
+        "output_format": args.output_format,
+        "export_csv": args.export_csv,
+        "use_cache": args.use_cache,
+        "cache_directory": args.cache_directory,
+        "cache_max_size_mb": args.cache_max_size_mb,
         "ci_table_name": args.ci_table_name,
         "debug": args.debug,
         "env": ENV,
@@ -185,7 +325,11 @@ def make_config(args_in):
     if args.mode == "tumour":
         preprocessing_config["input_tumour_directory"] = args.input_tumour_directory
     else:
-        preprocessing_config["input_files"] = (args.input_files[0].strip().split(" "),)
+        # input files can be passed as separate arguments or as one space-separated string:
+        preprocessing_config["input_files"] = [
+            f for files in args.input_files or [] for f in files.strip().split()
+        ]
+        preprocessing_config["input_container"] = args.input_container
         preprocessing_config["input_data_directory"] = args.input_data_directory
     if ENV == "dev":
         print("Starting ALPACA in development mode")
@@ -0,0 +1,200 @@
+"""
+Columnar store of ALPACA outputs (--output_format parquet or arrow).
+Output tables of segments are appended to a dataset as segments are completed, one file per kind of output
+(optimal, all, model_selection_table), tumour and segment:
+{output_directory}/ALPACA_output.{format}/{kind}/{tumour_id}/{segment}.{format}
+Tumour level tables (e.g. cn_change_to_ancestor) are stored as {kind}/{tumour_id}.{format}.
+Each appended file is recorded in manifest.jsonl (one JSON line per file), so that tables of selected tumours and
+segments are read without listing or scanning the dataset. Copy number columns are stored as integers.
+Files are written to a temporary path and renamed, so that readers never see partial files.
+CSV outputs can be written alongside the store with --export_csv.
+"""
+
+import json
+import os
+from urllib.parse import quote
+import pandas as pd
+from alpaca.utils import get_version, SEGMENT_OUTPUT_KINDS
+
+OUTPUT_FORMATS = ["csv", "parquet", "arrow"]
+STORE_NAME = "ALPACA_output"
+MANIFEST_NAME = "manifest.jsonl"
+METADATA_NAME = "store.json"
+# integer copy number columns of output tables:
+CN_COLUMNS = [
+    "pred_CN_A",
+    "pred_CN_B",
+    "parent_pred_cpnA",
+    "parent_pred_cpnB",
+    "cn_dist_to_parent_A",
+    "cn_dist_to_parent_B",
+]
+CN_DTYPE = "int16"
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(
+            "Parquet and arrow outputs require pyarrow. Install it with 'pip install pyarrow' or use '--output_format csv'."
+        ) from e
+    return pyarrow
+
+
+class OutputStore:
+    def __init__(self, output_directory, output_format="parquet"):
+        if output_format not in ["parquet", "arrow"]:
+            raise ValueError(f"Unsupported output store format: {output_format}")
+        self.pa = import_pyarrow()
+        self.output_format = output_format
+        self.root = os.path.join(str(output_directory), f"{STORE_NAME}.{output_format}")
+        self.manifest_path = os.path.join(self.root, MANIFEST_NAME)
+
+    def partition_path(self, kind, tumour_id, segment=None):
+        """
+        Path of the file of a segment (or of a tumour level table if segment is None), relative to the store root
+        """
+        name = quote(str(segment if segment is not None else tumour_id), safe="")
+        directory = (
+            kind if segment is None else f"{kind}/{quote(str(tumour_id), safe='')}"
+        )
+        return f"{directory}/{name}.{self.output_format}"
+
+    def has_partition(self, kind, tumour_id, segment=None):
+        return os.path.exists(
+            os.path.join(self.root, self.partition_path(kind, tumour_id, segment))
+        )
+
+    def to_arrow(self, table):
+        """
+        Arrow table of an output table, with integer copy number columns
+        """
+        arrow_table = self.pa.Table.from_pandas(table, preserve_index=False)
+        for i, name in enumerate(arrow_table.column_names):
+            if name in CN_COLUMNS:
+                arrow_table = arrow_table.set_column(
+                    i, name, arrow_table.column(i).cast(CN_DTYPE)
+                )
+        return arrow_table
+
+    def write_metadata(self):
+        path = os.path.join(self.root, METADATA_NAME)
+        if os.path.exists(path):
+            return
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "format": self.output_format,
+                    "layout": "{kind}/{tumour_id}/{segment}",
+                    "cn_columns": CN_COLUMNS,
+                    "cn_dtype": CN_DTYPE,
+                    "version": get_version(),
+                },
+                f,
+                indent=2,
+            )
+
+    def append(self, kind, tumour_id, segment, table):
+        """
+        Write output table of a segment (or a tumour level table if segment is None) and record it in the manifest.
+        Returns path of the written file.
+        """
+        relative_path = self.partition_path(kind, tumour_id, segment)
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.write_metadata()
+        arrow_table = self.to_arrow(table)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        if self.output_format == "parquet":
+            import pyarrow.parquet as pq
+
+            pq.write_table(arrow_table, temporary_path)
+        else:
+            import pyarrow.feather as feather
+
+            feather.write_feather(arrow_table, temporary_path)
+        os.replace(temporary_path, path)
+        entry = {
+            "kind": kind,
+            "tumour_id": str(tumour_id),
+            "segment": None if segment is None else str(segment),
+            "path": relative_path,
+            "rows": arrow_table.num_rows,
+        }
+        with open(self.manifest_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        return path
+
+    def read_manifest(self):
+        """
+        Manifest entries, latest entry of each file (files are rewritten when output is overwritten)
+        """
+        if not os.path.exists(self.manifest_path):
+            return []
+        entries = {}
+        with open(self.manifest_path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries[entry["path"]] = entry
+        return list(entries.values())
+
+    def read(self, kind="optimal", tumour_ids=None, segments=None, columns=None):
+        """
+        Output tables of kind, optionally of selected tumours and segments, as one DataFrame.
+        Files are selected from the manifest, in order of tumour id and segment.
+        """
+        import pyarrow.dataset as ds
+
+        entries = sorted(
+            (
+                entry
+                for entry in self.read_manifest()
+                if entry["kind"] == kind
+                and (tumour_ids is None or entry["tumour_id"] in tumour_ids)
+                and (segments is None or entry["segment"] in segments)
+            ),
+            key=lambda entry: (entry["tumour_id"], entry["segment"] or ""),
+        )
+        if not entries:
+            return pd.DataFrame(columns=columns)
+        dataset = ds.dataset(
+            [os.path.join(self.root, entry["path"]) for entry in entries],
+            format="parquet" if self.output_format == "parquet" else "feather",
+        )
+        return dataset.to_table(columns=columns).to_pandas()
+
+    def read_tumour_output(self, tumour_id):
+        """
+        Segment outputs of a tumour combined in the same order as in ALPACA_output_{tumour_id}.csv
+        """
+        return pd.concat(
+            [
+                self.read(kind, tumour_ids=[str(tumour_id)])
+                for kind in sorted(SEGMENT_OUTPUT_KINDS)
+            ]
+        )
+
+    def export_csv(self, kind, csv_path, tumour_ids=None, segments=None):
+        self.read(kind, tumour_ids, segments).to_csv(csv_path, index=False)
+        return csv_path
+
+
+def get_output_store(preprocessing_config):
+    """
+    Output store configured in preprocessing_config, or None if outputs are written as CSV files only
+    """
+    output_format = preprocessing_config.get("output_format", "csv")
+    if output_format == "csv":
+        return None
+    return OutputStore(preprocessing_config["output_directory"], output_format)
+
+
+def writes_csv(preprocessing_config):
+    """
+    True if CSV outputs are written: with the csv output format or with export_csv
+    """
+    return preprocessing_config.get(
+        "output_format", "csv"
+    ) == "csv" or preprocessing_config.get("export_csv", False)
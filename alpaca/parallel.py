@@ -0,0 +1,393 @@
+"""
+Solving segments of a run in a pool of worker processes.
+Each worker runs the full SegmentSolution pipeline for one segment at a time and writes its output file.
+Available cpus are divided between workers, so that gurobi threads of all workers do not oversubscribe them.
+Segments with identical problems (e.g. long diploid stretches of a tumour) are solved once and their output is copied
+to the other segments (see SegmentSolution.get_problem_hash). Problem hashes are computed and outputs are copied by the
+workers, the main process only keeps the problem hash of each segment.
+Inputs shared by segments of a tumour are loaded once per process (see TumourContext).
+In tumour mode with in_memory set, input tables of segments are passed to workers in memory and segment outputs
+that are combined into the tumour output are returned to the main process instead of being written (they are also
+written if overwrite_output is not set, so that an interrupted run can be resumed).
+Outputs are also returned to the main process if they are appended to an output store (see output_store.py).
+In segment mode, input tables can be read from an input container (see input_container.py): workers read their
+segments from the container file.
+"""
+
+import contextlib
+import copy
+import itertools
+import logging
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from alpaca.ALPACA_segment_solution_class import (
+    SegmentSolution,
+    split_input_file_name,
+)
+from alpaca.solution_cache import get_cache_key, get_solution_cache
+from alpaca.output_store import writes_csv
+from alpaca.utils import SEGMENT_OUTPUT_KINDS
+
+
+# tumour contexts loaded by a worker process, by tumour id:
+worker_tumour_contexts = {}
+# input tables of segments passed to a worker process in memory, by input file name:
+worker_input_tables = None
+
+
+def load_segment_solution(input_file_name, config, tumour_contexts, input_tables=None):
+    """
+    SegmentSolution built from the context of its tumour in tumour_contexts ({tumour id: TumourContext}).
+    Context of a tumour is loaded with its first segment and added to tumour_contexts.
+    Input table of the segment is taken from input_tables ({input file name: input table}) if passed.
+    """
+    tumour_id, _ = split_input_file_name(input_file_name)
+    SS = SegmentSolution(
+        input_file_name,
+        config,
+        logging.getLogger("ALPACA"),
+        tumour_context=tumour_contexts.get(tumour_id),
+        input_table=None if input_tables is None else input_tables[input_file_name],
+    )
+    tumour_contexts[tumour_id] = SS.tumour_context
+    return SS
+
+
+def combines_in_memory(config, input_tables):
+    """
+    True if segment outputs are combined into the tumour output in memory (tumour mode with in_memory set)
+    """
+    return (
+        input_tables is not None
+        and config["preprocessing_config"].get("mode") == "tumour"
+    )
+
+
+def save_segment_output(SS, output_tables, in_memory):
+    """
+    Write CSV output tables of segment SS ({kind: table}). In memory, segment outputs combined into the tumour output
+    are not written, unless an interrupted run can be resumed from them (overwrite_output is not set). Output tables
+    are returned if they are kept in memory or appended to an output store by the main process, otherwise returns
+    None.
+    """
+    preprocessing_config = SS.config["preprocessing_config"]
+    if writes_csv(preprocessing_config):
+        resumable = not preprocessing_config["overwrite_output"]
+        SS.save_output(
+            {
+                kind: table
+                for kind, table in output_tables.items()
+                if resumable or not (in_memory and kind in SEGMENT_OUTPUT_KINDS)
+            }
+        )
+    if in_memory or preprocessing_config.get("output_format", "csv") != "csv":
+        return output_tables
+    return None
+
+
+def skip_segment(SS, config, input_tables=None):
+    """
+    Result of a segment skipped because its output exists (see solve_segment). If segment outputs are combined in
+    memory, the existing CSV outputs are read and returned, so that the segment is part of the tumour output.
+    """
+    logging.getLogger("ALPACA").warning(
+        f"Output for {SS.input_file_name} already exists. Use '--overwrite_output 1' option to overwrite existing output. Skipping this segment."
+    )
+    outputs = None
+    if combines_in_memory(config, input_tables) and writes_csv(
+        config["preprocessing_config"]
+    ):
+        outputs = SS.read_output_tables(SEGMENT_OUTPUT_KINDS)
+    return SS.input_file_name, "skipped", None, outputs
+
+
+def solve_segment(input_file_name, config, tumour_contexts=None, input_tables=None):
+    """
+    Run ALPACA for a single segment and save the output.
+    Returns input file name, status: 'solved' or 'skipped' (output exists and overwrite_output is not set),
+    cpu usage of the segment (see scheduler.get_utilisation_report) and output tables of the segment, if they are
+    returned to the main process (see save_segment_output and skip_segment).
+    """
+    logger = logging.getLogger("ALPACA")
+    start_time, start_cpu_time = time.time(), time.process_time()
+    SS = load_segment_solution(
+        input_file_name,
+        config,
+        {} if tumour_contexts is None else tumour_contexts,
+        input_tables,
+    )
+    if not config["preprocessing_config"]["overwrite_output"] and SS.output_exists():
+        return skip_segment(SS, config, input_tables)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Output path: %s", SS.create_output_path())
+    cache = get_solution_cache(config["preprocessing_config"])
+    sweep = None
+    if cache is not None:
+        cache_key = get_cache_key(SS.get_problem_hash())
+        sweep = cache.get(cache_key)
+    if sweep is not None:
+        logger.debug("Using cached solutions for %s", input_file_name)
+        SS.set_sweep(sweep)
+    else:
+        SS.run_iterations()
+        if cache is not None:
+            cache.put(cache_key, SS.get_sweep())
+    SS.find_optimal_solution()
+    SS.get_solution()
+    outputs = save_segment_output(
+        SS, SS.get_output_tables(), combines_in_memory(config, input_tables)
+    )
+    usage = {
+        "segment": input_file_name,
+        "wall_time": time.time() - start_time,
+        # process time includes all gurobi threads of the process:
+        "cpu_time": time.process_time() - start_cpu_time,
+        "threads": 0 if sweep is not None else max(SS.metrics["threads"]),
+        "n_solves": SS.n_solves,
+        "cached": sweep is not None,
+    }
+    return input_file_name, "solved", usage, outputs
+
+
+def hash_segment(input_file_name, config, tumour_contexts=None, input_tables=None):
+    """
+    Problem hash of a segment (see SegmentSolution.get_problem_hash), to find identical segments before solving.
+    Returns input file name, status 'hashed' or 'skipped' (see skip_segment), problem hash and None.
+    """
+    SS = load_segment_solution(
+        input_file_name,
+        config,
+        {} if tumour_contexts is None else tumour_contexts,
+        input_tables,
+    )
+    if not config["preprocessing_config"]["overwrite_output"] and SS.output_exists():
+        return skip_segment(SS, config, input_tables)
+    return input_file_name, "hashed", SS.get_problem_hash(), None
+
+
+def copy_segment_output(
+    input_file_name,
+    source,
+    n_solves,
+    source_outputs,
+    config,
+    tumour_contexts=None,
+    input_tables=None,
+):
+    """
+    Copy the output of source, a solved segment with the same problem hash, to the segment: from source_outputs if
+    they were returned to the main process, otherwise from the files of source.
+    Returns input file name, status 'deduplicated', usage {'source': source, 'n_solves': number of model solves
+    saved} and output tables of the segment, if they are returned to the main process (see save_segment_output).
+    """
+    SS = load_segment_solution(
+        input_file_name,
+        config,
+        {} if tumour_contexts is None else tumour_contexts,
+        input_tables,
+    )
+    outputs = None
+    if source_outputs is None:
+        SS.copy_output_from(source)
+    else:
+        outputs = save_segment_output(
+            SS,
+            SS.copy_output_tables(source_outputs),
+            combines_in_memory(config, input_tables),
+        )
+    return (
+        input_file_name,
+        "deduplicated",
+        {"source": source, "n_solves": n_solves},
+        outputs,
+    )
+
+
+def get_worker_config(config, workers):
+    """
+    Copy of config with cpus available to each of the workers
+    """
+    worker_config = copy.deepcopy(config)
+    cpus = worker_config["model_config"].get("cpus", 1)
+    worker_config["model_config"]["cpus"] = max(1, cpus // workers)
+    return worker_config
+
+
+def init_worker(debug, input_tables=None):
+    global worker_input_tables
+    worker_tumour_contexts.clear()
+    worker_input_tables = input_tables
+    # level of the logger is not inherited by workers that are not forked:
+    if debug:
+        logging.getLogger("ALPACA").setLevel("DEBUG")
+
+
+def run_in_worker(task, *args):
+    return task(*args, worker_tumour_contexts, worker_input_tables)
+
+
+class SerialExecutor:
+    """
+    Runs tasks in the current process when they are submitted, with the tumour contexts of the serial run
+    """
+
+    def __init__(self, tumour_contexts, input_tables=None):
+        self.tumour_contexts = tumour_contexts
+        self.input_tables = input_tables
+
+    def submit(self, task, *args):
+        future = Future()
+        try:
+            future.set_result(task(*args, self.tumour_contexts, self.input_tables))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+@contextlib.contextmanager
+def open_executor(config, workers, tumour_contexts, input_tables=None):
+    """
+    Yield a function submitting a task for a segment (e.g. solve_segment: task, input file name and arguments before
+    config) and returning its future. If workers is 1, tasks run in the current process and share tumour_contexts,
+    otherwise in a pool of worker processes, which load their own, each with its share of cpus (see
+    get_worker_config). Input tables passed in memory are sent to each worker once, when it is started.
+    """
+    if workers <= 1:
+        executor = SerialExecutor(tumour_contexts, input_tables)
+        yield lambda task, *args: executor.submit(task, *args, config)
+        return
+    worker_config = get_worker_config(config, workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(config["preprocessing_config"]["debug"], input_tables),
+    ) as executor:
+        yield lambda task, *args: executor.submit(
+            run_in_worker, task, *args, worker_config
+        )
+
+
+def solve_segments(input_files, config, workers=1, input_tables=None):
+    """
+    Solve segments in a pool of worker processes (or in the current process if workers is 1).
+    Yields (input file name, status, usage, outputs) as segments are completed (see solve_segment).
+    If input_tables ({input file name: input table}, e.g. an InputContainer) are passed, segments are read from them
+    instead of input files. In tumour mode, their outputs are then combined in memory (see combines_in_memory).
+    If deduplicate_segments is set, only one segment of each group of identical segments is solved (see
+    deduplicate_segments).
+    """
+    tumour_contexts = {}
+    if not config["preprocessing_config"].get("deduplicate_segments", False):
+        yield from run_segments(
+            input_files, config, workers, tumour_contexts, input_tables
+        )
+        return
+    yield from deduplicate_segments(
+        input_files, config, workers, tumour_contexts, input_tables
+    )
+
+
+def run_segments(
+    input_files, config, workers=1, tumour_contexts=None, input_tables=None
+):
+    """
+    Solve segments without deduplication.
+    """
+    if workers <= 1 or len(input_files) <= 1:
+        for input_file_name in input_files:
+            yield solve_segment(input_file_name, config, tumour_contexts, input_tables)
+        return
+    workers = min(workers, len(input_files))
+    with open_executor(config, workers, tumour_contexts, input_tables) as submit:
+        futures = [
+            submit(solve_segment, input_file_name) for input_file_name in input_files
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        except BaseException:
+            # do not start remaining segments if one of them failed:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def deduplicate_segments(
+    input_files, config, workers=1, tumour_contexts=None, input_tables=None
+):
+    """
+    Solve one segment of each group of segments with the same problem hash. Segments are hashed by the workers (see
+    hash_segment), at most one per worker at a time, and a segment is solved as soon as its hash is known, unless a
+    segment with the same hash was hashed before. Output of the other segments of the group is copied from it once
+    it is solved (see copy_segment_output): they are yielded with status 'deduplicated'.
+    """
+    workers = max(1, min(workers, len(input_files)))
+    remaining = iter(input_files)
+    # input file name of the segment solved for each problem hash:
+    sources = {}
+    # duplicates found for segments being solved, by input file name:
+    duplicates = {}
+    # number of model solves and outputs returned to the main process of solved segments, by input file name:
+    solved = {}
+    pending, hashing = set(), set()
+    # tasks are handled in the order they were submitted if several are completed:
+    submitted = itertools.count()
+    order = {}
+
+    def submit_task(task, *args):
+        future = submit(task, *args)
+        order[future] = next(submitted)
+        pending.add(future)
+        return future
+
+    with open_executor(config, workers, tumour_contexts, input_tables) as submit:
+        try:
+            while True:
+                while len(hashing) < workers:
+                    input_file_name = next(remaining, None)
+                    if input_file_name is None:
+                        break
+                    hashing.add(submit_task(hash_segment, input_file_name))
+                if len(pending) == 0:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                hashing -= done
+                for future in sorted(done, key=order.pop):
+                    input_file_name, status, result, outputs = future.result()
+                    if status == "hashed":
+                        source = sources.setdefault(result, input_file_name)
+                        if source == input_file_name:
+                            duplicates[source] = []
+                            submit_task(solve_segment, input_file_name)
+                        elif source in solved:
+                            submit_task(
+                                copy_segment_output,
+                                input_file_name,
+                                source,
+                                *solved[source],
+                            )
+                        else:
+                            duplicates[source].append(input_file_name)
+                        continue
+                    yield input_file_name, status, result, outputs
+                    if status != "solved":
+                        continue
+                    solved[input_file_name] = (result["n_solves"], outputs)
+                    for duplicate in duplicates.pop(input_file_name):
+                        submit_task(
+                            copy_segment_output,
+                            duplicate,
+                            input_file_name,
+                            *solved[input_file_name],
+                        )
+        except BaseException:
+            # do not start remaining tasks if one of them failed:
+            for future in pending:
+                future.cancel()
+            raise
@@ -0,0 +1,180 @@
+"""
+Scheduling of cpus available to a run.
+The number of cpus a run can use is the smallest of: cpus requested with --cpus, cpus in the affinity mask of the
+process (e.g. set by taskset or SLURM) and the cpu quota of its cgroup or its parent cgroups (e.g. docker --cpus,
+kubernetes limits or systemd slices).
+The cpus are divided between segment workers (see parallel.py), and each model gets a number of gurobi threads
+depending on its size: small models are solved faster in a single thread than by a team of threads.
+"""
+
+import math
+import os
+import pandas as pd
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+PROC_SELF_CGROUP = "/proc/self/cgroup"
+# one gurobi thread per this many model variables (up to the cpus available to the worker):
+VARIABLES_PER_THREAD = 250
+
+
+def get_process_cgroups(proc_cgroup=PROC_SELF_CGROUP):
+    """
+    Cgroup of the process in each hierarchy, as listed in /proc/self/cgroup: {'v2': path} for the unified hierarchy
+    and {'v1': path} for the hierarchy of the cgroup v1 cpu controller. Paths are relative to the mounted hierarchy.
+    """
+    cgroups = {}
+    try:
+        with open(proc_cgroup) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return cgroups
+    for line in lines:
+        fields = line.split(":", 2)
+        if len(fields) != 3:
+            continue
+        hierarchy_id, controllers, path = fields
+        if hierarchy_id == "0" and controllers == "":
+            cgroups["v2"] = path
+        elif "cpu" in controllers.split(","):
+            cgroups["v1"] = path
+    return cgroups
+
+
+def get_cgroup_directories(hierarchy_root, path):
+    """
+    Directories of the cgroup at path and of all its ancestors, from the cgroup up to the root of the hierarchy.
+    A cgroup outside of the mounted hierarchy (path with '..', e.g. from another cgroup namespace) is read at the root.
+    """
+    parts = [part for part in path.split("/") if part not in ["", "."]]
+    if ".." in parts:
+        parts = []
+    return [os.path.join(hierarchy_root, *parts[:i]) for i in range(len(parts), -1, -1)]
+
+
+def read_cpu_max(cgroup_dir):
+    # cgroup v2
+    try:
+        with open(f"{cgroup_dir}/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        return None
+
+
+def read_cfs_quota(cgroup_dir):
+    # cgroup v1
+    try:
+        with open(f"{cgroup_dir}/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open(f"{cgroup_dir}/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota <= 0:
+            return None
+        return quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def read_cgroup_cpu_quota(cgroup_root=CGROUP_ROOT, proc_cgroup=PROC_SELF_CGROUP):
+    """
+    Cpu quota of the cgroup of the process (number of cpus, possibly fractional) or None if there is no quota.
+    The cgroup of the process is read from /proc/self/cgroup. In a nested cgroup (e.g. a systemd slice, or a SLURM job
+    or kubernetes pod without its own cgroup namespace), files at the root of the hierarchy do not hold the limit of
+    the process, and a quota on any ancestor also applies, so the smallest quota from the cgroup up to the root is used.
+    Reads cpu.max (cgroup v2) or cpu.cfs_quota_us and cpu.cfs_period_us (cgroup v1, cpu controller at cgroup_root/cpu).
+    """
+    cgroups = get_process_cgroups(proc_cgroup)
+    quotas = [
+        read_cpu_max(cgroup_dir)
+        for cgroup_dir in get_cgroup_directories(cgroup_root, cgroups.get("v2", "/"))
+    ] + [
+        read_cfs_quota(cgroup_dir)
+        for cgroup_dir in get_cgroup_directories(
+            f"{cgroup_root}/cpu", cgroups.get("v1", "/")
+        )
+    ]
+    quotas = [quota for quota in quotas if quota is not None]
+    return min(quotas) if quotas else None
+
+
+def get_affinity_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_available_cpus(cgroup_root=CGROUP_ROOT, proc_cgroup=PROC_SELF_CGROUP):
+    """
+    Number of cpus the process can use: cpus of the affinity mask, limited by the cgroup quota.
+    A fractional quota is rounded down, so that threads do not exceed it.
+    """
+    cpus = get_affinity_cpus()
+    quota = read_cgroup_cpu_quota(cgroup_root, proc_cgroup)
+    if quota is not None:
+        cpus = min(cpus, math.floor(quota))
+    return max(1, cpus)
+
+
+def get_cpu_budget(requested_cpus, available_cpus):
+    """
+    Cpus used by the run: requested cpus, limited by the available cpus. 0 (or None) requests all available cpus.
+    """
+    if not requested_cpus:
+        return available_cpus
+    return max(1, min(requested_cpus, available_cpus))
+
+
+def get_worker_count(requested_workers, cpus, n_segments):
+    """
+    Number of segment workers: requested workers, limited by cpus and number of segments.
+    0 requests one worker per cpu.
+    """
+    workers = requested_workers if requested_workers else cpus
+    return max(1, min(workers, cpus, n_segments))
+
+
+def get_solver_threads(n_variables, cpus, variables_per_thread=VARIABLES_PER_THREAD):
+    """
+    Gurobi threads for a model with n_variables variables, when cpus are available to its worker
+    """
+    return max(1, min(cpus, math.ceil(n_variables / variables_per_thread)))
+
+
+def get_utilisation_report(segment_usage, wall_time, cpus, workers):
+    """
+    Summary of cpu usage of a run.
+    segment_usage: one dict per solved segment with keys wall_time, cpu_time (seconds) and threads
+    (largest number of gurobi threads used by the models of the segment, 0 if no model was solved).
+    Utilisation is cpu time used by all segments divided by cpu time available to the run (wall time * cpus).
+    """
+    usage = pd.DataFrame(
+        segment_usage, columns=["segment", "wall_time", "cpu_time", "threads"]
+    )
+    cpu_time = usage["cpu_time"].sum()
+    return {
+        "cpus": cpus,
+        "workers": workers,
+        "segments": len(usage),
+        "wall_time": wall_time,
+        "segment_wall_time": usage["wall_time"].sum(),
+        "cpu_time": cpu_time,
+        "utilisation": cpu_time / (wall_time * cpus) if wall_time > 0 else 0.0,
+        "threads": usage.loc[usage["threads"] > 0, "threads"]
+        .value_counts()
+        .sort_index()
+        .to_dict(),
+    }
+
+
+def format_utilisation_report(report):
+    threads = ", ".join(
+        f"{n} segment(s) with {t} thread(s)" for t, n in report["threads"].items()
+    )
+    return [
+        f"Cpus: {report['cpus']}, workers: {report['workers']}, segments solved: {report['segments']}",
+        f"Wall time: {report['wall_time']:.1f}s, segment time: {report['segment_wall_time']:.1f}s, cpu time: {report['cpu_time']:.1f}s",
+        f"Cpu utilisation: {100 * report['utilisation']:.0f}%",
+        f"Gurobi threads: {threads if threads else 'none'}",
+    ]
@@ -8,6 +8,11 @@ import argparse
 from datetime import datetime
 import logging
 from alpaca.utils import create_logger, save_dataframe_to_csv
+from alpaca.solution_cache import (
+    SolutionCache,
+    DEFAULT_CACHE_DIRECTORY,
+    DEFAULT_MAX_SIZE_MB,
+)
 
 
 def input_conversion():
@@ -124,6 +129,24 @@ def run_calculate_ccd():
     parser.add_argument(
         "--output_directory", help="Path to save the output CSV file", required=True
     )
+    parser.add_argument(
+        "--metric",
+        nargs="+",
+        default=["euclidean"],
+        help="Distance metric(s) of scipy.spatial.distance. With several metrics, a CCD_<metric> column is written for each.",
+    )
+    parser.add_argument(
+        "--weight_by_length",
+        default=0,
+        type=int,
+        help="Weight segments by their length (as a fraction of the total length of segments of the tumour)",
+    )
+    parser.add_argument(
+        "--pairwise_output",
+        default=0,
+        type=int,
+        help="Also save distances of all pairs of clones of each tumour (clone_copy_number_distances.csv)",
+    )
 
     args = parser.parse_args()
     # Validate input files exist
@@ -142,15 +165,86 @@ def run_calculate_ccd():
             exit(1)
     try:
         logger.info("Starting CCD analysis...")
-        ccd_scores_df = calculate_ccd(args.alpaca_output_path)
+        ccd_scores = calculate_ccd(
+            args.alpaca_output_path,
+            metric=args.metric[0] if len(args.metric) == 1 else args.metric,
+            weight_by_length=bool(args.weight_by_length),
+            pairwise=bool(args.pairwise_output),
+        )
+        if args.pairwise_output:
+            ccd_scores_df, pairwise_df = ccd_scores
+        else:
+            ccd_scores_df = ccd_scores
 
         # Ensure output directory exists
         output_dir = args.output_directory
         os.makedirs(output_dir, exist_ok=True)
         output_name = f"{output_dir}/clone_copy_number_diversity_scores.csv"
         ccd_scores_df.to_csv(output_name, index=False)
+        if args.pairwise_output:
+            pairwise_df.to_csv(
+                f"{output_dir}/clone_copy_number_distances.csv", index=False
+            )
         logger.info(f"Analysis completed successfully. Output saved to: {output_name}")
 
     except Exception as e:
         logger.exception(f"An error occurred during analysis: {e}")
         exit(1)
+
+
+def run_cache():
+    """CLI for the solution cache: show statistics or remove least recently used entries"""
+    parser = argparse.ArgumentParser(description="Manage the ALPACA solution cache.")
+    parser.add_argument("command", choices=["cache"], help="Command to run")
+    parser.add_argument(
+        "action",
+        choices=["stats", "prune"],
+        help="stats: show size of the cache, prune: remove least recently used entries",
+    )
+    parser.add_argument(
+        "--cache_directory",
+        default=DEFAULT_CACHE_DIRECTORY,
+        help="Directory of the solution cache",
+    )
+    parser.add_argument(
+        "--max_size_mb",
+        default=DEFAULT_MAX_SIZE_MB,
+        type=float,
+        help="prune: remove least recently used entries until the cache is not larger than this (0 clears the cache)",
+    )
+    args = parser.parse_args()
+    cache = SolutionCache(args.cache_directory, args.max_size_mb)
+    if args.action == "prune":
+        removed = cache.prune()
+        print(f"Removed {removed} entries")
+    stats = cache.stats()
+    print(f"Cache directory: {stats['cache_directory']}")
+    print(f"Entries: {stats['entries']}")
+    print(f"Size: {stats['size_mb']:.1f} MB (limit {stats['max_size_mb']:g} MB)")
+    if stats["entries"]:
+        print(
+            f"Last used: {stats['most_recently_used_days']:.1f} days ago (least recently used: {stats['least_recently_used_days']:.1f} days ago)"
+        )
+
+
+def run_input_container():
+    """CLI for input containers: write input tables of all segments of a cohort to one segment-indexed file"""
+    parser = argparse.ArgumentParser(
+        description="Write input tables of all segments in input_data_directory to an input container."
+    )
+    parser.add_argument("command", choices=["input-container"], help="Command to run")
+    parser.add_argument(
+        "--input_data_directory",
+        required=True,
+        help="Directory with a subdirectory for each tumour (with ALPACA_input_table.csv or a segments directory)",
+    )
+    parser.add_argument(
+        "--container", required=True, help="Path of the container (parquet file)"
+    )
+    args = parser.parse_args()
+    from alpaca.input_container import get_cohort_input_tables, write_input_container
+
+    n_segments = write_input_container(
+        args.container, get_cohort_input_tables(args.input_data_directory)
+    )
+    print(f"Wrote {n_segments} segments to {args.container}")
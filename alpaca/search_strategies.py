@@ -0,0 +1,241 @@
+"""
+Strategies for searching over allowed tree complexity.
+
+A strategy decides which allowed complexities are solved for a segment. It calls
+SegmentSolution.solve_complexity, which solves each allowed complexity at most once and returns its objectives
+(CI score, D score). A solution found for allowed complexity c with realised complexity r is optimal for every
+allowed complexity between r and c, so these levels are recorded without solving.
+
+linear: solve every allowed complexity from 1 upwards (original behaviour)
+exponential: solve allowed complexities 1, 2, 4, ... up to maximum complexity, then bisect around the elbow
+golden: golden section search for the elbow of the D score curve, then bisect around the elbow
+scenarios: solve every allowed complexity in one multi-scenario optimisation, falling back to linear search
+Elbow is selected from the evaluated allowed complexities (SegmentSolution.find_elbow).
+exponential and golden are heuristics: they assume a convex D score curve with a single elbow and can select a
+different elbow than linear search when the curve has several.
+"""
+
+import logging
+import math
+import gurobipy as gp
+
+logger = logging.getLogger("ALPACA")
+
+
+def linear_search(segment_solution, objective_function_threshold):
+    """
+    Solve every allowed complexity from 1 to maximum complexity. Iterations stop early if D score does not improve,
+    iterations are slow and elbow can already be found (see SegmentSolution.stop_conditions_check), or if the
+    remaining allowed complexities have the same optimum (see end_if_complexity_not_binding).
+    """
+    for c in range(1, segment_solution.maximum_complexity):
+        logger.debug("Iterating with complexity: %s", c)
+        segment_solution.solve_complexity(c)
+        if segment_solution.slack_early_stop and end_if_complexity_not_binding(
+            segment_solution, c
+        ):
+            logger.debug(
+                "Stopping iterations at complexity %s: complexity constraint is not binding for higher complexities",
+                c,
+            )
+            break
+        stop_conditions = segment_solution.stop_conditions_check(
+            objective_function_threshold
+        )
+        if stop_conditions:
+            # check if elbow can be found
+            segment_solution.find_elbow()
+            elbow_findable = segment_solution.elbow["s_min"] < 1000
+            if elbow_findable:
+                logger.debug(
+                    "Stopping iterations at complexity %s due to lack of improvement in D score",
+                    c,
+                )
+                break
+
+
+def end_if_complexity_not_binding(segment_solution, allowed_complexity):
+    """
+    Slack of the complexity constraint only shows that the optimum does not change between the realised and the
+    allowed complexity: an integer program can still improve when more complexity is allowed
+    (e.g. flat D score for allowed complexities 7-9, lower at 10).
+    When the constraint is slack, the maximum complexity is solved once (or its known objectives are used). If its
+    objectives are the same as for allowed_complexity, then, as objectives are lexicographically non-increasing in
+    allowed complexity, all allowed complexities in between have the same optimum: they are filled with the
+    solution for allowed_complexity and True is returned. Otherwise, the maximum complexity is held back until the
+    sweep reaches it (see SegmentSolution.hold_back_complexities).
+    """
+    upper = segment_solution.maximum_complexity - 1
+    if allowed_complexity >= upper:
+        return False
+    if not segment_solution.complexity_constraint_slack(allowed_complexity):
+        return False
+    logger.debug("Complexity constraint is slack, checking complexity: %s", upper)
+    # restores the maximum complexity if it was held back after an earlier check:
+    upper_objectives = segment_solution.solve_complexity(upper)
+    same_optimum = upper_objectives == segment_solution.search_objectives[
+        allowed_complexity
+    ] and segment_solution.solved_to_optimality(upper)
+    if not same_optimum:
+        segment_solution.hold_back_complexities(allowed_complexity)
+        return False
+    for c in range(allowed_complexity + 1, upper):
+        if c not in segment_solution.search_objectives:
+            segment_solution.fill_complexity(c, source_complexity=allowed_complexity)
+    return True
+
+
+def get_chord_distance(segment_solution):
+    """
+    For each evaluated allowed complexity, distance of D score below the chord joining the D scores at allowed
+    complexity 0 and at the largest evaluated allowed complexity.
+    Elbow of a convex decreasing curve (see find_s_values) is the point furthest below this chord.
+    """
+    objectives = segment_solution.search_objectives
+    first, last = min(objectives), max(objectives)
+    d_first, d_last = objectives[first][1], objectives[last][1]
+    slope = (d_last - d_first) / max(last - first, 1)
+    return {
+        c: d_first + slope * (c - first) - d_score
+        for c, (_, d_score) in objectives.items()
+    }
+
+
+def get_elbow_candidate(segment_solution):
+    """
+    Elbow of the D score curve of evaluated allowed complexities, as selected by SegmentSolution.find_elbow.
+    If no knee is found, the evaluated complexity furthest below the chord of the curve.
+    """
+    try:
+        segment_solution.find_elbow()
+        return segment_solution.optimal_solution_index
+    except AssertionError:
+        chord_distance = get_chord_distance(segment_solution)
+        # ties are resolved towards lower complexity:
+        return max(sorted(chord_distance), key=lambda c: chord_distance[c])
+
+
+def refine_elbow(segment_solution):
+    """
+    Bisect the intervals on both sides of the elbow candidate until both of its neighbours are evaluated.
+    """
+    while True:
+        fill_flat_intervals(segment_solution)
+        evaluated = sorted(segment_solution.search_objectives)
+        candidate = get_elbow_candidate(segment_solution)
+        index = evaluated.index(candidate)
+        neighbours = evaluated[max(index - 1, 0) : index + 2]
+        gaps = [
+            (lower, upper)
+            for lower, upper in zip(neighbours[:-1], neighbours[1:])
+            if upper - lower > 1
+        ]
+        if len(gaps) == 0:
+            break
+        for lower, upper in gaps:
+            logger.debug("Iterating with complexity: %s", (lower + upper) // 2)
+            segment_solution.solve_complexity((lower + upper) // 2)
+
+
+def fill_flat_intervals(segment_solution):
+    """
+    Objectives are lexicographically non-increasing in allowed complexity. If both ends of an interval between
+    evaluated allowed complexities have the same objectives, every allowed complexity inside the interval has them
+    too, and the solution found for the lower end is optimal for all of them.
+    """
+    evaluated = sorted(segment_solution.search_objectives)
+    for lower, upper in zip(evaluated[:-1], evaluated[1:]):
+        if (
+            upper - lower > 1
+            and segment_solution.search_objectives[lower]
+            == segment_solution.search_objectives[upper]
+        ):
+            for c in range(lower + 1, upper):
+                segment_solution.fill_complexity(c, source_complexity=lower)
+
+
+def exponential_bisect_search(segment_solution, objective_function_threshold):
+    """
+    Solve exponentially growing allowed complexities 1, 2, 4, ... and the maximum complexity, then bisect the
+    intervals on both sides of the elbow until both of its neighbours are evaluated (see refine_elbow).
+    """
+    upper = segment_solution.maximum_complexity - 1
+    c = 1
+    while c < upper:
+        logger.debug("Iterating with complexity: %s", c)
+        segment_solution.solve_complexity(c)
+        c *= 2
+    logger.debug("Iterating with complexity: %s", upper)
+    segment_solution.solve_complexity(upper)
+    refine_elbow(segment_solution)
+
+
+def golden_section_search(segment_solution, objective_function_threshold):
+    """
+    Golden section search over integer allowed complexities for the maximum of the distance of the D score curve
+    below its chord (see get_chord_distance), i.e. the elbow of the curve. The chord joins allowed complexity 0 and
+    the maximum complexity. All allowed complexities in the final bracket are solved and the elbow is refined
+    as in exponential_bisect_search.
+    """
+    upper = segment_solution.maximum_complexity - 1
+    logger.debug("Iterating with complexity: %s", upper)
+    segment_solution.solve_complexity(upper)
+    inverse_golden_ratio = (math.sqrt(5) - 1) / 2
+    lower_bound, upper_bound = 0, upper
+    while upper_bound - lower_bound > 3:
+        step = round(inverse_golden_ratio * (upper_bound - lower_bound))
+        x1, x2 = upper_bound - step, lower_bound + step
+        if x1 >= x2:
+            x1, x2 = x2 - 1, x2
+        for c in [x1, x2]:
+            logger.debug("Iterating with complexity: %s", c)
+            segment_solution.solve_complexity(c)
+        chord_distance = get_chord_distance(segment_solution)
+        if chord_distance[x1] >= chord_distance[x2]:
+            upper_bound = x2
+        else:
+            lower_bound = x1
+    for c in range(lower_bound, upper_bound + 1):
+        logger.debug("Iterating with complexity: %s", c)
+        segment_solution.solve_complexity(c)
+    refine_elbow(segment_solution)
+
+
+def scenario_search(segment_solution, objective_function_threshold):
+    """
+    Solve every allowed complexity from 1 to maximum complexity as scenarios of one model
+    (see SegmentSolution.solve_scenarios). If the scenarios cannot be solved to optimality (e.g. time limit) or
+    multi-scenario models are not supported by the gurobi license, every allowed complexity is solved separately
+    as in linear search.
+    """
+    allowed_complexities = list(range(1, segment_solution.maximum_complexity))
+    logger.debug(
+        "Iterating with complexities: 1-%s as scenarios", allowed_complexities[-1]
+    )
+    try:
+        solved = segment_solution.solve_scenarios(allowed_complexities)
+    except gp.GurobiError as e:
+        logger.warning("Multi-scenario optimisation failed: %s", e)
+        solved = False
+    if not solved:
+        logger.warning(
+            "Scenarios of %s not solved, falling back to linear search",
+            segment_solution.input_file_name,
+        )
+        linear_search(segment_solution, objective_function_threshold)
+
+
+SEARCH_STRATEGIES = {
+    "linear": linear_search,
+    "exponential": exponential_bisect_search,
+    "golden": golden_section_search,
+    "scenarios": scenario_search,
+}
+
+
+def get_search_strategy(name):
+    if name not in SEARCH_STRATEGIES:
+        raise ValueError(
+            f"Unknown search strategy '{name}', expected one of: {list(SEARCH_STRATEGIES)}"
+        )
+    return SEARCH_STRATEGIES[name]
@@ -0,0 +1,137 @@
+"""
+On-disk cache of complexity sweeps of segments.
+An entry stores the results of SegmentSolution.run_iterations (solutions and metrics of every evaluated allowed
+complexity) under a key derived from the problem hash of the segment (inputs and model_config, see
+SegmentSolution.get_problem_hash) and the ALPACA version. A segment with a cached sweep is not solved again, so
+elbow selection and output options can be changed without re-solving its models.
+Size of the cache is bounded: least recently used entries are removed when the size limit is exceeded.
+"""
+
+import hashlib
+import os
+import pickle
+import time
+from alpaca.utils import get_version
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "alpaca",
+)
+DEFAULT_MAX_SIZE_MB = 1024
+ENTRY_SUFFIX = ".pkl"
+
+
+def get_cache_key(problem_hash, version=None):
+    version = get_version() if version is None else version
+    return hashlib.sha256(f"{problem_hash}:{version}".encode()).hexdigest()
+
+
+class SolutionCache:
+    def __init__(
+        self, cache_directory=DEFAULT_CACHE_DIRECTORY, max_size_mb=DEFAULT_MAX_SIZE_MB
+    ):
+        self.cache_directory = str(cache_directory)
+        self.max_size_mb = max_size_mb
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_directory, f"{key}{ENTRY_SUFFIX}")
+
+    def get(self, key):
+        """
+        Cached sweep for key, or None. Reading an entry marks it as recently used.
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                sweep = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            # unreadable entry (e.g. written by an incompatible version of a dependency):
+            self.remove(path)
+            return None
+        return sweep
+
+    def put(self, key, sweep):
+        """
+        Store sweep for key and remove least recently used entries if the cache exceeds its size limit.
+        Entry is written to a temporary file and renamed, so that concurrent workers never read partial entries.
+        """
+        os.makedirs(self.cache_directory, exist_ok=True)
+        path = self.entry_path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump(sweep, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+        self.prune()
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get_entries(self):
+        """
+        (path, size in bytes, time of last use) of each entry, least recently used first
+        """
+        if not os.path.isdir(self.cache_directory):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_directory):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.cache_directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def prune(self, max_size_mb=None):
+        """
+        Remove least recently used entries until the cache is not larger than max_size_mb (default: size limit of
+        the cache). Returns number of removed entries.
+        """
+        max_size_mb = self.max_size_mb if max_size_mb is None else max_size_mb
+        entries = self.get_entries()
+        size = sum(entry[1] for entry in entries)
+        removed = 0
+        for path, entry_size, _ in entries:
+            if size <= max_size_mb * 1024**2:
+                break
+            self.remove(path)
+            size -= entry_size
+            removed += 1
+        return removed
+
+    def stats(self):
+        entries = self.get_entries()
+        now = time.time()
+        return {
+            "cache_directory": self.cache_directory,
+            "entries": len(entries),
+            "size_mb": sum(entry[1] for entry in entries) / 1024**2,
+            "max_size_mb": self.max_size_mb,
+            "least_recently_used_days": (
+                (now - entries[0][2]) / 86400 if entries else None
+            ),
+            "most_recently_used_days": (
+                (now - entries[-1][2]) / 86400 if entries else None
+            ),
+        }
+
+
+def get_solution_cache(preprocessing_config):
+    """
+    Solution cache configured in preprocessing_config, or None if the cache is not used
+    """
+    if not preprocessing_config.get("use_cache", False):
+        return None
+    return SolutionCache(
+        preprocessing_config.get("cache_directory", DEFAULT_CACHE_DIRECTORY),
+        preprocessing_config.get("cache_max_size_mb", DEFAULT_MAX_SIZE_MB),
+    )
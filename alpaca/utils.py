@@ -8,12 +8,19 @@ from datetime import datetime
 from typing import Optional
 
 
-def show_version():
+def get_version():
     try:
-        version = importlib.metadata.version("alpaca")
-        print(f"alpaca {version}")
+        return importlib.metadata.version("alpaca")
     except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def show_version():
+    version = get_version()
+    if version == "unknown":
         print("alpaca version unknown (not installed)")
+    else:
+        print(f"alpaca {version}")
 
 
 def show_help():
@@ -29,8 +36,17 @@ def show_help():
     print("  version              Show version")
     print("  help                 Show this help")
     print("  run                  Run ALPACA")
+    print(
+        "  cohort               Run ALPACA for all tumours in a directory (resumable)"
+    )
     print("  input-conversion     Run input conversion")
     print("  ccd                  Calculate clone copy number diversity")
+    print(
+        "  cache                Show statistics of (stats) or prune (prune) the solution cache"
+    )
+    print(
+        "  input-container      Write input tables of all segments of a cohort to one segment-indexed file"
+    )
     print("")
 
 
@@ -52,6 +68,8 @@ def create_logger(name: str, log_dir: Optional[str] = None) -> logging.Logger:
         return logger
 
     logger.setLevel(logging.INFO)
+    # handlers have no level of their own, so that messages are formatted and written only at the level of the
+    # logger (e.g. DEBUG in debug mode), and suppressed messages cost nothing:
     formatter = logging.Formatter(
         fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
@@ -59,7 +77,6 @@ def create_logger(name: str, log_dir: Optional[str] = None) -> logging.Logger:
 
     # Console handler
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
@@ -74,7 +91,6 @@ def create_logger(name: str, log_dir: Optional[str] = None) -> logging.Logger:
         log_path = log_filename
 
     file_handler = logging.FileHandler(log_path)
-    file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
 
@@ -83,65 +99,131 @@ def create_logger(name: str, log_dir: Optional[str] = None) -> logging.Logger:
     return logger
 
 
-def split_to_segments(tumour_dir: str) -> list[str]:
-    segments_dir_path = f"{tumour_dir}/segments"
+def group_to_segments(tumour_dir: str) -> dict[str, pd.DataFrame]:
+    """
+    Input tables of the segments of a tumour, by segment input file name (ALPACA_input_table_{tumour_id}_{segment}.csv)
+    """
     df_path = f"{tumour_dir}/ALPACA_input_table.csv"
-    os.makedirs(segments_dir_path, exist_ok=True)
     df = pd.read_csv(df_path)
     tumour_id = df["tumour_id"].iloc[0]
     assert len(
         df["tumour_id"].unique()
     ), "Found multiple tumour ids. In tummour mode only one tumour_id is allowed per input csv"
-    segments = []
-    for segment, segment_df in df.groupby("segment"):
-        segment_df_path = (
-            f"{segments_dir_path}/ALPACA_input_table_{tumour_id}_{segment}.csv"
+    return {
+        f"ALPACA_input_table_{tumour_id}_{segment}.csv": segment_df.reset_index(
+            drop=True
         )
+        for segment, segment_df in df.groupby("segment")
+    }
+
+
+def split_to_segments(tumour_dir: str) -> list[str]:
+    segments_dir_path = f"{tumour_dir}/segments"
+    os.makedirs(segments_dir_path, exist_ok=True)
+    segments = []
+    for input_file_name, segment_df in group_to_segments(tumour_dir).items():
+        segment_df_path = f"{segments_dir_path}/{input_file_name}"
         segment_df.to_csv(segment_df_path, index=False)
         segments.append(segment_df_path)
     return segments
 
 
-def concatenate_output(output_dir: str) -> str:
+# kinds of segment outputs combined into the tumour output (optimal and all solutions):
+SEGMENT_OUTPUT_KINDS = ["optimal", "all"]
+
+
+def is_segment_output(output_path: str) -> bool:
+    """
+    True for output files of segments combined into the tumour output
+    """
+    f = os.path.basename(output_path)
+    return f.endswith(".csv") and any(kind in f for kind in SEGMENT_OUTPUT_KINDS)
+
+
+def get_segment_output_name(input_file_name: str, kind: str) -> str:
+    """
+    Name of the output file of kind for a segment input file
+    """
+    return f"{kind}_{input_file_name.split('ALPACA_input_table_')[1]}"
+
+
+def combine_segment_outputs(output_tables: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    # sorted, so that the combined output does not depend on the order in which segments were solved:
+    return pd.concat(
+        [output_tables[f] for f in sorted(output_tables, key=os.path.basename)]
+    )
+
+
+def save_combined_output(output_dir: str, combined_df: pd.DataFrame) -> str:
     logger = logging.getLogger("ALPACA")
-    # keep only segment files in output files list
-    output_files = [
-        f
-        for f in os.listdir(output_dir)
-        if f.endswith(".csv") and (("optimal" in f) or ("all" in f))
-    ]
-    dfs = [pd.read_csv(f"{output_dir}/{f}") for f in output_files]
-    concatenated_df = pd.concat(dfs)
-    tumour_id = concatenated_df["tumour_id"].iloc[0]
+    tumour_id = combined_df["tumour_id"].iloc[0]
     output_name = f"{output_dir}/ALPACA_output_{tumour_id}.csv"
-    concatenated_df.to_csv(output_name, index=False)
+    os.makedirs(output_dir, exist_ok=True)
+    combined_df.to_csv(output_name, index=False)
     if os.path.exists(output_name):
         logger.info(f"Combined output saved to {output_name}")
-        # remove segment files
-        for f in output_files:
-            if f != os.path.basename(output_name):
-                os.remove(f"{output_dir}/{f}")
     else:
         logger.error(f"Failed to save combined output to {output_name}")
         raise FileNotFoundError(f"Output file not found: {output_name}")
     return output_name
 
 
-def set_run_mode(config: dict) -> tuple[dict, str]:
+def remove_segment_outputs(output_dir: str, output_files) -> None:
+    # remove segment files combined into the tumour output (files which were not written are ignored)
+    for f in output_files:
+        if is_segment_output(f) and os.path.exists(f"{output_dir}/{f}"):
+            os.remove(f"{output_dir}/{f}")
+
+
+def concatenate_output(output_dir: str) -> str:
+    # keep only segment files in output files list
+    output_files = [f for f in os.listdir(output_dir) if is_segment_output(f)]
+    dfs = {f: pd.read_csv(f"{output_dir}/{f}") for f in output_files}
+    output_name = save_combined_output(output_dir, combine_segment_outputs(dfs))
+    # remove segment files
+    remove_segment_outputs(
+        output_dir, [f for f in output_files if f != os.path.basename(output_name)]
+    )
+    return output_name
+
+
+def set_run_mode(config: dict) -> tuple[dict, str, Optional[dict[str, pd.DataFrame]]]:
+    """
+    Returns config, run mode and input tables of the segments by input file name: in tumour mode with in_memory set,
+    or from the input container in segment mode (see input_container.py). Otherwise None: segments are read from
+    their input files.
+    """
+    logger = logging.getLogger("ALPACA")
     run_mode = config["preprocessing_config"]["mode"]
+    input_tables = None
+    if run_mode == "segment" and config["preprocessing_config"].get("input_container"):
+        from alpaca.input_container import InputContainer
+
+        input_tables = InputContainer(config["preprocessing_config"]["input_container"])
+        input_files = config["preprocessing_config"].get("input_files")
+        if input_files:
+            missing = [f for f in input_files if f not in input_tables]
+            if missing:
+                raise ValueError(
+                    f"Segments not found in input container {input_tables.container_path}: {missing}"
+                )
+        else:
+            # all segments of the container:
+            config["preprocessing_config"]["input_files"] = list(input_tables)
     if run_mode == "tumour":
-        print("Running in tumour mode")
-        # create segment files:
-        config["preprocessing_config"]["input_files"] = [
-            Path(x).name
-            for x in split_to_segments(
-                config["preprocessing_config"]["input_tumour_directory"]
-            )
-        ]
-        config["preprocessing_config"]["input_data_directory"] = Path(
-            config["preprocessing_config"]["input_tumour_directory"]
-        ).parent
-    return config, run_mode
+        logger.info("Running in tumour mode")
+        tumour_dir = config["preprocessing_config"]["input_tumour_directory"]
+        if config["preprocessing_config"].get("in_memory", False):
+            # keep segment input tables in memory:
+            input_tables = group_to_segments(tumour_dir)
+            config["preprocessing_config"]["input_files"] = list(input_tables)
+        else:
+            # create segment files:
+            config["preprocessing_config"]["input_files"] = [
+                Path(x).name for x in split_to_segments(tumour_dir)
+            ]
+        config["preprocessing_config"]["input_data_directory"] = Path(tumour_dir).parent
+    return config, run_mode, input_tables
 
 
 def read_tree_json(json_path: str) -> list[list[str]]:
@@ -186,6 +268,22 @@ def flat_list(target_list):
         return target_list
 
 
+def get_segment_ci_bounds(ci_table, segment, sample_names):
+    """
+    Resolve confidence intervals of a single segment into arrays ordered as sample_names.
+    """
+    segment_ci_table = (
+        ci_table[ci_table["segment"] == segment]
+        .drop_duplicates(subset="sample")
+        .set_index("sample")
+        .loc[list(sample_names)]
+    )
+    ci_bounds = {"samples": list(sample_names)}
+    for bound in ["lower_CI_A", "upper_CI_A", "lower_CI_B", "upper_CI_B"]:
+        ci_bounds[bound] = segment_ci_table[bound].to_numpy(dtype=float)
+    return ci_bounds
+
+
 def get_length_from_name(segment):
     e = int(segment.split("_")[-1])
     s = int(segment.split("_")[-2])
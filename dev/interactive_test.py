@@ -11,7 +11,7 @@ input_file_name = f'ALPACA_input_table_{tumour_id}_{segment}.csv'
 
 
 model_config = {
-    'use_binary_search': 0,
+    'search_strategy': 'linear',
     'use_two_objectives': 1,
     'use_minimise_events_to_diploid': 1,
     'exclusive_amp_del': 1,
@@ -3,13 +3,6 @@ import argparse
 
 def get_parser():
     parser = argparse.ArgumentParser(description="Optional / development arguments.")
-    parser.add_argument(
-        "--use_binary_search",
-        type=int,
-        default=False,
-        help="Whether to use binary search or not. Binary search is faster but may not find optimal solution.",
-    )
-
     parser.add_argument("--exclusive_amp_del", type=int, default=1, help="")
 
     parser.add_argument(
@@ -36,7 +29,6 @@ def get_config(remaining_args):
         "add_state_change_count_constraints_flag": args.add_state_change_count_constraints_flag,
         "add_path_variability_penalty_constraints_flag": args.add_path_variability_penalty_constraints_flag,
         "exclusive_amp_del": args.exclusive_amp_del,
-        "use_binary_search": args.use_binary_search,
     }
     preprocessing_config = {
         "rsc": args.rsc,
@@ -11,7 +11,7 @@ output_dir = '/nemo/project/proj-tracerx-lung/tctProjects/CN-CCF/publication/out
 os.makedirs(output_dir, exist_ok=True)
 
 model_config = {
-    'use_binary_search': 0,
+    'search_strategy': 'linear',
     'use_two_objectives': 1,
     'use_minimise_events_to_diploid': 1,
     'exclusive_amp_del': 1,
@@ -0,0 +1,45 @@
+"""
+Compare solve time of the complexity sweep with big-M, indicator and SOS formulations of binarised relations.
+All formulations must reach the same objectives (CI score, D score) at every allowed complexity.
+
+Run from the repository root:
+    python -m tests.benchmarks.benchmark_formulations
+"""
+
+import time
+import pandas as pd
+from tests.helpers import FIXTURES, run_sweep, sweep_objectives
+
+FORMULATIONS = ["bigM", "indicator", "sos"]
+
+
+def time_sweep(tumour_id, formulation, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        segment_solution = run_sweep(tumour_id, {"formulation": formulation})
+        times.append(time.perf_counter() - start)
+    return min(times), sweep_objectives(segment_solution)
+
+
+def main():
+    results = []
+    for tumour_id in FIXTURES:
+        reference = None
+        for formulation in FORMULATIONS:
+            solve_time, objectives = time_sweep(tumour_id, formulation)
+            reference = reference or objectives
+            results.append(
+                {
+                    "case": tumour_id,
+                    "formulation": formulation,
+                    "iterations": len(objectives),
+                    "sweep_s": round(solve_time, 3),
+                    "same_objectives": objectives == reference,
+                }
+            )
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
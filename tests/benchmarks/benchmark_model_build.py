@@ -0,0 +1,57 @@
+"""
+Compare build time of the matrix (matrix_builder=True) and expression (matrix_builder=False) model builders.
+
+Run from the repository root:
+    python -m tests.benchmarks.benchmark_model_build
+"""
+
+import time
+import pandas as pd
+from tests.helpers import (
+    FIXTURES,
+    build_model,
+    load_segment_solution,
+    make_synthetic_segment,
+    segment_model_inputs,
+)
+
+
+def time_build(inputs, repeats=3, **kwargs):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        alpaca_model = build_model(inputs, **kwargs)
+        alpaca_model.model.update()
+        times.append(time.perf_counter() - start)
+        alpaca_model.model.dispose()
+    return min(times)
+
+
+def main():
+    cases = {
+        tumour_id: segment_model_inputs(load_segment_solution(tumour_id))
+        for tumour_id in FIXTURES
+    }
+    for n_samples, n_clones in [(4, 15), (10, 25), (30, 60), (60, 100)]:
+        cases[f"synthetic_{n_samples}x{n_clones}"] = make_synthetic_segment(
+            n_samples, n_clones
+        )
+    results = []
+    for name, inputs in cases.items():
+        matrix_time = time_build(inputs, matrix_builder=True)
+        expression_time = time_build(inputs, matrix_builder=False)
+        results.append(
+            {
+                "case": name,
+                "samples": inputs["fractional_copy_number_table"]["sample"].nunique(),
+                "clones": len(inputs["clone_proportions"]),
+                "expression_builder_s": round(expression_time, 4),
+                "matrix_builder_s": round(matrix_time, 4),
+                "speedup": round(expression_time / matrix_time, 2),
+            }
+        )
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
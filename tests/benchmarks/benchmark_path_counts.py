@@ -0,0 +1,75 @@
+"""
+Compare path-sum (cumulative_path_counts=False) and cumulative (cumulative_path_counts=True) formulations of the
+number of changes on root-to-leaf paths: model size on deep synthetic trees and sweep time on the fixtures.
+
+Run from the repository root:
+    python -m tests.benchmarks.benchmark_path_counts
+"""
+
+import time
+import pandas as pd
+from tests.helpers import (
+    FIXTURES,
+    build_model,
+    make_synthetic_segment,
+    run_sweep,
+    sweep_objectives,
+)
+
+
+def model_size(inputs, cumulative):
+    start = time.perf_counter()
+    alpaca_model = build_model(inputs, cumulative_path_counts=cumulative)
+    alpaca_model.model.update()
+    build_time = time.perf_counter() - start
+    model = alpaca_model.model
+    size = {
+        "variables": model.NumVars,
+        "constraints": model.NumConstrs,
+        "nonzeros": model.NumNZs,
+        "build_s": round(build_time, 3),
+    }
+    model.dispose()
+    return size
+
+
+def main():
+    sizes = []
+    for n_clones, parent_window in [(15, None), (60, 3), (100, 3), (100, 10)]:
+        inputs = make_synthetic_segment(
+            n_samples=10, n_clones=n_clones, parent_window=parent_window
+        )
+        path_length = sum(len(path) - 1 for path in inputs["tree"])
+        for cumulative in [False, True]:
+            sizes.append(
+                {
+                    "case": f"synthetic_{n_clones}_window_{parent_window}",
+                    "paths": len(inputs["tree"]),
+                    "total_path_length": path_length,
+                    "cumulative": cumulative,
+                    **model_size(inputs, cumulative),
+                }
+            )
+    print(pd.DataFrame(sizes).to_string(index=False))
+    sweeps = []
+    for tumour_id in FIXTURES:
+        objectives = {}
+        for cumulative in [False, True]:
+            start = time.perf_counter()
+            segment_solution = run_sweep(
+                tumour_id, {"cumulative_path_counts": cumulative}
+            )
+            objectives[cumulative] = sweep_objectives(segment_solution)
+            sweeps.append(
+                {
+                    "case": tumour_id,
+                    "cumulative": cumulative,
+                    "sweep_s": round(time.perf_counter() - start, 3),
+                }
+            )
+        print(f"{tumour_id}: same objectives {objectives[True] == objectives[False]}")
+    print(pd.DataFrame(sweeps).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Compare search strategies over allowed complexity: number of solves, run time and elbow found, against the full
+linear sweep.
+
+Run from the repository root:
+    python -m tests.benchmarks.benchmark_search_strategies
+"""
+
+import time
+import pandas as pd
+from alpaca.search_strategies import SEARCH_STRATEGIES
+from tests.helpers import FIXTURES, run_sweep
+
+
+def main():
+    results = []
+    for tumour_id in FIXTURES:
+        for search_strategy in SEARCH_STRATEGIES:
+            start = time.perf_counter()
+            segment_solution = run_sweep(
+                tumour_id, {"search_strategy": search_strategy}
+            )
+            segment_solution.find_optimal_solution()
+            results.append(
+                {
+                    "case": tumour_id,
+                    "search_strategy": search_strategy,
+                    "solves": segment_solution.n_solves,
+                    "evaluated_complexities": len(segment_solution.metrics["solved"]),
+                    "elbow": segment_solution.optimal_solution_index,
+                    "time_s": round(time.perf_counter() - start, 2),
+                }
+            )
+    results = pd.DataFrame(results)
+    linear = results.query("search_strategy == 'linear'").set_index("case")
+    results["same_elbow_as_linear"] = (
+        results.elbow.values == linear.loc[results.case, "elbow"].values
+    )
+    results["solves_saved"] = (
+        linear.loc[results.case, "solves"].values - results.solves.values
+    )
+    print(results.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare solve time of the path variability block built as quadratic equalities (QuadraticPenaltyModel, earlier
+versions) and as linearised products of binaries built only when the penalty is active (Model).
+
+Run from the repository root:
+    python -m tests.benchmarks.benchmark_variability_penalty
+"""
+
+import contextlib
+import io
+import pandas as pd
+from gurobipy import GurobiError
+from alpaca.ALPACA_model_class import Model
+from tests.helpers import (
+    FIXTURES,
+    QuadraticPenaltyModel,
+    build_model,
+    load_segment_solution,
+    make_synthetic_segment,
+    segment_model_inputs,
+)
+
+
+def sweep_runtime(inputs, model_class, complexities, **kwargs):
+    """
+    Total gurobi runtime of solving one model for each allowed complexity and the objectives found
+    """
+    alpaca_model = build_model(inputs, model_class=model_class, **kwargs)
+    runtime = 0
+    objectives = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for allowed_complexity in complexities:
+            alpaca_model.set_allowed_complexity(allowed_complexity)
+            alpaca_model.model.optimize()
+            runtime += alpaca_model.model.Runtime
+            objectives.append(
+                (
+                    round(alpaca_model.Z.getValue()),
+                    round(alpaca_model.D.getValue(), 6),
+                )
+            )
+    alpaca_model.model.dispose()
+    return runtime, objectives
+
+
+def main():
+    cases = {
+        tumour_id: segment_model_inputs(load_segment_solution(tumour_id))
+        for tumour_id in FIXTURES
+    }
+    cases["synthetic_3x8"] = make_synthetic_segment(3, 8, seed=5, parent_window=2)
+    cases["synthetic_4x10"] = make_synthetic_segment(4, 10, seed=2)
+    results = []
+    for name, inputs in cases.items():
+        for variability_penalty in [0, 1]:
+            kwargs = {
+                "variability_penalty": variability_penalty,
+                "add_path_variability_penalty_constraints_flag": bool(
+                    variability_penalty
+                ),
+            }
+            row = {"case": name, "variability_penalty": variability_penalty}
+            objectives = {}
+            for label, model_class in [
+                ("quadratic", QuadraticPenaltyModel),
+                ("linear", Model),
+            ]:
+                try:
+                    runtime, objectives[label] = sweep_runtime(
+                        inputs, model_class, range(10), **kwargs
+                    )
+                    row[f"{label}_s"] = round(runtime, 3)
+                except GurobiError as error:
+                    # e.g. size-limited license for quadratic models
+                    row[f"{label}_s"] = f"failed: {error.errno}"
+            if len(objectives) == 2:
+                row["speedup"] = round(row["quadratic_s"] / row["linear_s"], 2)
+                row["same_objectives"] = objectives["quadratic"] == objectives["linear"]
+            results.append(row)
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Helpers shared by the python tests and benchmarks: loading bundled test tumours and generating synthetic segments.
+"""
+
+import io
+import contextlib
+import json
+from pathlib import Path
+import gurobipy as gp
+import numpy as np
+import pandas as pd
+from alpaca.ALPACA_segment_solution_class import SegmentSolution
+from alpaca.ALPACA_model_class import Model
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# bundled test tumours: tumour_id: (input_data_directory, segment)
+FIXTURES = {
+    "LTX0000-Tumour1": (
+        REPO_ROOT / "tests/redundant_columns/input",
+        "1_762496_28527452",
+    ),
+    "TEST0001": (
+        REPO_ROOT / "dev/data/input/example_cohort",
+        "9_65600000_71900000",
+    ),
+}
+
+
+def make_config(model_config=None, preprocessing_config=None, output_directory=""):
+    config = {
+        "preprocessing_config": {
+            "ci_table_name": "ci_table.csv",
+            "output_directory": output_directory,
+        },
+        "model_config": {"d_zero": 0},
+    }
+    config["preprocessing_config"].update(preprocessing_config or {})
+    config["model_config"].update(model_config or {})
+    return config
+
+
+def load_segment_solution(tumour_id, model_config=None, preprocessing_config=None):
+    input_data_directory, segment = FIXTURES[tumour_id]
+    config = make_config(
+        model_config,
+        {
+            "input_data_directory": str(input_data_directory),
+            **(preprocessing_config or {}),
+        },
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        return SegmentSolution(f"ALPACA_input_table_{tumour_id}_{segment}.csv", config)
+
+
+def run_sweep(tumour_id, model_config=None):
+    segment_solution = load_segment_solution(tumour_id, model_config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        segment_solution.run_iterations()
+    return segment_solution
+
+
+def sweep_objectives(segment_solution):
+    """
+    Objectives (CI score, D score) of the solution found for each allowed complexity.
+    Realised complexity is not compared: it is not optimised and can differ between alternative optima.
+    """
+    return [
+        (int(solution.CI_score.iloc[0]), round(float(solution.D_score.iloc[0]), 6))
+        for solution in segment_solution.metrics["solutions"]
+    ]
+
+
+def make_synthetic_segment(n_samples, n_clones, seed=0, parent_window=None):
+    """
+    Generate inputs of Model for a random tree with n_clones clones and n_samples samples.
+    Parent of each clone is drawn from all previous clones or, if parent_window is set, from the last
+    parent_window clones (small windows give deep trees, similar to single-cell phylogenies).
+    """
+    rng = np.random.default_rng(seed)
+    tumour_id = "SYNTH"
+    segment = "1_1000_2000000"
+    clones = [f"clone{i}" for i in range(n_clones)]
+    parents = {
+        clone: clones[rng.integers(max(0, i - (parent_window or i)), i)]
+        for i, clone in enumerate(clones)
+        if i > 0
+    }
+    children = {clone: [] for clone in clones}
+    for child, parent in parents.items():
+        children[parent].append(child)
+    tree = []
+
+    def collect_paths(path):
+        clone = path[-1]
+        if len(children[clone]) == 0:
+            tree.append(path)
+        for child in children[clone]:
+            collect_paths(path + [child])
+
+    collect_paths([clones[0]])
+    samples = [f"{tumour_id}_R{i}" for i in range(n_samples)]
+    proportions = rng.random((n_clones, n_samples)) * (
+        rng.random((n_clones, n_samples)) < 0.3
+    )
+    proportions[0] += 0.05
+    proportions = proportions / proportions.sum(axis=0)
+    cp_table = pd.DataFrame(proportions, index=clones, columns=samples)
+    cp_table.index.name = "clone"
+    input_table = pd.DataFrame(
+        {"sample": samples, "segment": segment, "tumour_id": tumour_id}
+    )
+    ci_table = input_table[["sample", "segment"]].copy()
+    for allele in ["A", "B"]:
+        copy_numbers = rng.integers(0, 5, n_clones)
+        y = proportions.T @ copy_numbers + rng.normal(0, 0.1, n_samples)
+        input_table[f"cpn{allele}"] = np.clip(y, 0, None)
+        ci_table[f"lower_CI_{allele}"] = np.clip(y - 0.3, 0, None)
+        ci_table[f"upper_CI_{allele}"] = np.clip(y + 0.3, 0.01, None)
+    return {
+        "segment": segment,
+        "ci_table": ci_table,
+        "fractional_copy_number_table": input_table,
+        "tree": tree,
+        "clone_proportions": cp_table,
+    }
+
+
+class QuadraticPenaltyModel(Model):
+    """
+    Model with the path variability block built as in earlier versions: always, as one quadratic equality
+    variability_penalty * sum(up) * sum(down) per path and allele. Reference for tests and benchmarks.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.variability_penalty:
+            # penalty is zero and not linked to complexity, but the quadratic block was still built:
+            self.add_path_variability_penalty_variables()
+
+    def add_path_variability_penalty_variables(self):
+        for allele in ["A", "B"]:
+            self.path_variability_penalty[allele] = self.model.addVars(
+                range(0, len(self.tree)),
+                name=f"path_variability_penalty_{allele}",
+                vtype=gp.GRB.INTEGER,
+            )
+            for path_index, path in enumerate(self.tree):
+                path_edges = list(zip(path[:-1], path[1:]))
+                self.model.addConstr(
+                    self.path_variability_penalty[allele][path_index]
+                    == self.variability_penalty
+                    * gp.quicksum(self.cpn_change_up[allele][e] for e in path_edges)
+                    * gp.quicksum(self.cpn_change_down[allele][e] for e in path_edges)
+                )
+        self.total_path_variability_penalty_count = self.model.addVar(
+            name="total_path_variability_penalty_count", vtype=gp.GRB.INTEGER
+        )
+        self.model.addConstr(
+            self.total_path_variability_penalty_count
+            == gp.quicksum(self.path_variability_penalty["A"].values())
+            + gp.quicksum(self.path_variability_penalty["B"].values())
+        )
+
+
+class PinnedCIModel(Model):
+    """
+    Model with confidence intervals held by continuous variables pinned with equality rows, as in earlier versions.
+    Reference for tests, built with the expression builder (matrix_builder=False).
+    """
+
+    def add_CI_variables(self, allele):
+        super().add_CI_variables(allele)
+        for bound, name in [("upper", "CI_upper"), ("lower", "CI_lower")]:
+            values = getattr(self, name)[allele]
+            variables = self.model.addVars(
+                self.sample_names,
+                name=f"{allele}_{name}",
+                vtype=gp.GRB.CONTINUOUS,
+                lb=float("-inf"),
+            )
+            self.model.addConstrs(
+                (variables[sample] == values[sample] for sample in self.sample_names),
+                name=f"{bound}_CI",
+            )
+            getattr(self, name)[allele] = variables
+
+
+def write_synthetic_tumour(input_data_directory, inputs):
+    """
+    Write synthetic segment inputs (see make_synthetic_segment) in the layout expected by SegmentSolution and
+    return the name of the segment input file.
+    """
+    input_table = inputs["fractional_copy_number_table"]
+    tumour_id = input_table["tumour_id"].iloc[0]
+    tumour_dir = Path(input_data_directory) / tumour_id
+    (tumour_dir / "segments").mkdir(parents=True, exist_ok=True)
+    input_file_name = f"ALPACA_input_table_{tumour_id}_{inputs['segment']}.csv"
+    input_table.to_csv(tumour_dir / "segments" / input_file_name, index=False)
+    inputs["clone_proportions"].to_csv(tumour_dir / "cp_table.csv")
+    inputs["ci_table"].to_csv(tumour_dir / "ci_table.csv", index=False)
+    with open(tumour_dir / "tree_paths.json", "w") as f:
+        json.dump(inputs["tree"], f)
+    return input_file_name
+
+
+def write_synthetic_segments(input_data_directory, shifts):
+    """
+    Segments of one synthetic tumour: same tree and clone proportions, copy numbers of allele A shifted by shifts.
+    """
+    inputs = make_synthetic_segment(n_samples=2, n_clones=4, seed=0)
+    input_files = []
+    for i, shift in enumerate(shifts):
+        segment = f"{i + 1}_1000_2000000"
+        segment_inputs = {**inputs, "segment": segment}
+        input_table = inputs["fractional_copy_number_table"].assign(
+            segment=segment, cpnA=inputs["fractional_copy_number_table"].cpnA + shift
+        )
+        segment_inputs["fractional_copy_number_table"] = input_table
+        input_files.append(write_synthetic_tumour(input_data_directory, segment_inputs))
+    ci_table = pd.concat(
+        [
+            inputs["ci_table"].assign(
+                segment=f"{i + 1}_1000_2000000",
+                lower_CI_A=inputs["ci_table"].lower_CI_A + shift,
+                upper_CI_A=inputs["ci_table"].upper_CI_A + shift,
+            )
+            for i, shift in enumerate(shifts)
+        ]
+    )
+    ci_table.to_csv(Path(input_data_directory) / "SYNTH" / "ci_table.csv", index=False)
+    return input_files
+
+
+def build_model(inputs, model_class=Model, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return model_class(**inputs, **kwargs)
+
+
+def segment_model_inputs(segment_solution):
+    return {
+        "segment": segment_solution.segment,
+        "ci_table": segment_solution.ci_table,
+        "fractional_copy_number_table": segment_solution.input_table,
+        "tree": segment_solution.tree,
+        "clone_proportions": segment_solution.cp_table,
+    }
@@ -0,0 +1,96 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial import distance
+from alpaca.analysis import calculate_ccd
+
+SEGMENTS = ["1_10_100", "1_200_1200", "2_5_25", "10_1_1001"]
+
+
+def make_cohort(n_tumours=5, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for t in range(n_tumours):
+        n_clones = int(rng.integers(1, 6))
+        for segment in SEGMENTS:
+            for c in range(n_clones):
+                rows.append(
+                    {
+                        "tumour_id": f"T{t}",
+                        "clone": f"clone{c}",
+                        "segment": segment,
+                        "pred_CN_A": int(rng.integers(0, 5)),
+                        "pred_CN_B": int(rng.integers(0, 5)),
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+def reference_distances(tumour_df, metric, weights=None):
+    """
+    Distances of all pairs of clones, calculated separately for each pair
+    """
+    distance_func = getattr(distance, metric)
+    vectors = {
+        clone: np.concatenate(
+            [
+                clone_df.set_index("segment").loc[SEGMENTS, f"pred_CN_{allele}"]
+                for allele in ["A", "B"]
+            ]
+        )
+        for clone, clone_df in tumour_df.groupby("clone")
+    }
+    return {
+        (a, b): (
+            distance_func(vectors[a], vectors[b])
+            if weights is None
+            else distance_func(vectors[a], vectors[b], w=weights)
+        )
+        for a, b in itertools.combinations(sorted(vectors), 2)
+    }
+
+
+def test_ccd_matches_pairwise_distances(tmp_path):
+    cohort = make_cohort()
+    cohort.to_csv(tmp_path / "cohort.csv", index=False)
+    metrics = ["euclidean", "cityblock", "chebyshev"]
+    ccd_df = calculate_ccd(tmp_path / "cohort.csv", metric=metrics)
+    assert list(ccd_df.columns) == ["tumour_id"] + [f"CCD_{m}" for m in metrics]
+    for tumour_id, tumour_df in cohort.groupby("tumour_id"):
+        for metric in metrics:
+            expected = max(reference_distances(tumour_df, metric).values(), default=0)
+            assert ccd_df.set_index("tumour_id").loc[
+                tumour_id, f"CCD_{metric}"
+            ] == pytest.approx(expected)
+    # single metric keeps the CCD column:
+    single = calculate_ccd(cohort, metric="cityblock")
+    assert list(single.CCD) == list(ccd_df.CCD_cityblock)
+
+
+def test_ccd_weighted_by_segment_length_with_pairwise_output():
+    cohort = make_cohort(seed=1)
+    lengths = np.array([int(s.split("_")[2]) - int(s.split("_")[1]) for s in SEGMENTS])
+    weights = np.tile(lengths / lengths.sum(), 2)
+    ccd_df, pairwise_df = calculate_ccd(
+        cohort, metric="euclidean", weight_by_length=True, pairwise=True
+    )
+    for tumour_id, tumour_df in cohort.groupby("tumour_id"):
+        expected = reference_distances(tumour_df, "euclidean", weights)
+        pairs = pairwise_df[pairwise_df.tumour_id == tumour_id]
+        assert len(pairs) == len(expected)
+        for pair in pairs.itertuples():
+            assert pair.euclidean == pytest.approx(
+                expected[tuple(sorted([pair.clone_1, pair.clone_2]))]
+            )
+        assert ccd_df.set_index("tumour_id").loc[tumour_id, "CCD"] == pytest.approx(
+            max(expected.values(), default=0)
+        )
+
+
+def test_ccd_requires_copy_numbers_of_all_segments():
+    cohort = make_cohort(n_tumours=1, seed=2)
+    cohort = cohort[cohort.clone == "clone0"]
+    cohort = pd.concat([cohort, cohort.iloc[:1].assign(clone="clone1")])
+    with pytest.raises(ValueError):
+        calculate_ccd(cohort)
@@ -0,0 +1,144 @@
+import json
+import sys
+from pathlib import Path
+import pandas as pd
+import pytest
+from alpaca.__main__ import run_cohort
+from alpaca.cohort import JOURNAL_NAME, CohortRun, JobJournal, discover_tumours
+from alpaca.input_container import get_cohort_input_tables
+from tests.helpers import write_synthetic_segments
+
+
+def write_synthetic_cohort(input_data_directory):
+    """
+    Two tumours: SYNTH in segment mode layout, SYNTH2 (same inputs) in tumour mode layout
+    """
+    write_synthetic_segments(input_data_directory, shifts=[0, 1, 2])
+    source_dir = input_data_directory / "SYNTH"
+    tumour_dir = input_data_directory / "SYNTH2"
+    tumour_dir.mkdir()
+    for name in ["cp_table.csv", "ci_table.csv", "tree_paths.json"]:
+        (tumour_dir / name).write_text(
+            (source_dir / name).read_text().replace("SYNTH_", "SYNTH2_")
+        )
+    input_table = pd.concat(
+        [pd.read_csv(f) for f in sorted((source_dir / "segments").glob("*.csv"))]
+    )
+    input_table.assign(
+        tumour_id="SYNTH2",
+        sample=input_table["sample"].str.replace("SYNTH_", "SYNTH2_"),
+    ).to_csv(tumour_dir / "ALPACA_input_table.csv", index=False)
+    # not a tumour directory:
+    (input_data_directory / "logs").mkdir()
+
+
+def run(monkeypatch, input_data_directory, output_directory):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "alpaca",
+            "cohort",
+            "--input_data_directory",
+            str(input_data_directory),
+            "--output_directory",
+            str(output_directory),
+            "--ci_table_name",
+            "ci_table.csv",
+        ],
+    )
+    run_cohort()
+
+
+def read_outputs(output_directory):
+    return {
+        str(f.relative_to(output_directory)): f.read_text()
+        for f in sorted(output_directory.rglob("*.csv"))
+    }
+
+
+def test_interrupted_cohort_resumes_where_it_stopped(tmp_path, monkeypatch):
+    write_synthetic_cohort(tmp_path / "input")
+    assert discover_tumours(tmp_path / "input") == ["SYNTH", "SYNTH2"]
+    monkeypatch.chdir(tmp_path)
+    run(monkeypatch, tmp_path / "input", tmp_path / "complete")
+    # interrupt the run after two completed segments:
+    complete_job = CohortRun.complete_job
+    completed = []
+
+    def interrupted_complete_job(self, input_file_name):
+        if len(completed) == 2:
+            raise KeyboardInterrupt
+        completed.append(input_file_name)
+        return complete_job(self, input_file_name)
+
+    monkeypatch.setattr(CohortRun, "complete_job", interrupted_complete_job)
+    with pytest.raises(KeyboardInterrupt):
+        run(monkeypatch, tmp_path / "input", tmp_path / "resumed")
+    monkeypatch.setattr(CohortRun, "complete_job", complete_job)
+    config = {
+        "preprocessing_config": {
+            "input_data_directory": str(tmp_path / "input"),
+            "output_directory": str(tmp_path / "resumed"),
+        }
+    }
+    assert len(CohortRun(config).pending_jobs()) == 4
+    run(monkeypatch, tmp_path / "input", tmp_path / "resumed")
+    with open(tmp_path / "resumed" / JOURNAL_NAME) as f:
+        entries = [json.loads(line) for line in f]
+    jobs = [entry["job"] for entry in entries if "job" in entry]
+    assert len(jobs) == len(set(jobs)) == 6
+    assert sorted(entry["tumour_id"] for entry in entries if "job" not in entry) == [
+        "SYNTH",
+        "SYNTH2",
+    ]
+    outputs = read_outputs(tmp_path / "resumed")
+    assert sorted(outputs) == [
+        "SYNTH/ALPACA_output_SYNTH.csv",
+        "SYNTH/cn_change_to_ancestor.csv",
+        "SYNTH2/ALPACA_output_SYNTH2.csv",
+        "SYNTH2/cn_change_to_ancestor.csv",
+    ]
+    assert outputs == read_outputs(tmp_path / "complete")
+
+
+def test_partially_written_journal_entry_is_ignored(tmp_path):
+    journal = JobJournal(tmp_path)
+    journal.record(job="ALPACA_input_table_T1_1_10_20.csv")
+    journal.record(tumour_id="T1")
+    with open(journal.path, "a") as f:
+        f.write('{"job": "ALPACA_input_table_T1_2_1')
+    assert journal.read() == ({"ALPACA_input_table_T1_1_10_20.csv"}, {"T1"})
+
+
+def test_input_tables_are_read_when_jobs_are_solved(tmp_path, monkeypatch):
+    write_synthetic_cohort(tmp_path / "input")
+    config = {
+        "preprocessing_config": {
+            "input_data_directory": str(tmp_path / "input"),
+            "output_directory": str(tmp_path / "output"),
+        }
+    }
+    CohortRun(config)
+    read_csv = pd.read_csv
+    read_paths = []
+
+    def recording_read_csv(path, *args, **kwargs):
+        read_paths.append(Path(path).name)
+        return read_csv(path, *args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", recording_read_csv)
+    # resumed run reads the manifest and the journal only:
+    cohort = CohortRun(config)
+    assert read_paths == []
+    input_tables = cohort.input_tables
+    jobs = cohort.pending_jobs()
+    expected = get_cohort_input_tables(tmp_path / "input")
+    read_paths.clear()
+    for job in jobs:
+        pd.testing.assert_frame_equal(input_tables[job], expected[job])
+    # input table of a tumour in tumour mode layout is read once for all of its segments:
+    assert sorted(read_paths) == sorted(
+        ["ALPACA_input_table.csv"]
+        + [job for job in jobs if not job.startswith("ALPACA_input_table_SYNTH2_")]
+    )
@@ -0,0 +1,57 @@
+import contextlib
+import io
+import pickle
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+from alpaca.input_container import (
+    InputContainer,
+    get_cohort_input_tables,
+    write_input_container,
+)
+from alpaca.parallel import solve_segments
+from tests.helpers import make_config, write_synthetic_segments
+
+
+def test_segments_are_read_by_name(tmp_path):
+    write_synthetic_segments(tmp_path / "input", shifts=[0, 1, 2])
+    input_tables = get_cohort_input_tables(tmp_path / "input")
+    # a column present in only one of the segments:
+    first = sorted(input_tables)[0]
+    input_tables[first] = input_tables[first].assign(purity=0.5)
+    container_path = tmp_path / "cohort.parquet"
+    assert write_input_container(container_path, input_tables) == 3
+    assert pq.ParquetFile(container_path).metadata.num_row_groups == 3
+    container = pickle.loads(pickle.dumps(InputContainer(container_path)))
+    assert sorted(container) == sorted(input_tables)
+    for name, input_table in input_tables.items():
+        pd.testing.assert_frame_equal(container[name], input_table, check_dtype=False)
+    with pytest.raises(KeyError):
+        container["ALPACA_input_table_SYNTH_9_1_2.csv"]
+
+
+def test_container_gives_same_output_as_input_files(tmp_path):
+    input_files = write_synthetic_segments(tmp_path / "input", shifts=[0, 1])
+    container_path = tmp_path / "cohort.parquet"
+    write_input_container(container_path, get_cohort_input_tables(tmp_path / "input"))
+    outputs = {}
+    for source in ["files", "container"]:
+        config = make_config(
+            {},
+            {
+                "input_data_directory": str(tmp_path / "input"),
+                "overwrite_output": True,
+                "debug": False,
+            },
+            output_directory=str(tmp_path / source),
+        )
+        input_tables = InputContainer(container_path) if source == "container" else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            list(solve_segments(input_files, config, input_tables=input_tables))
+        outputs[source] = {
+            f.name: f.read_text() for f in sorted((tmp_path / source).glob("*.csv"))
+        }
+    assert len(outputs["files"]) == 2
+    assert outputs["container"] == outputs["files"]
@@ -0,0 +1,89 @@
+import kneed
+import numpy as np
+import pandas as pd
+import pytest
+from alpaca.ALPACA_segment_solution_class import ensure_elbow_strictly_decreasing
+from alpaca.knee_detection import KneeDetector
+from tests.helpers import FIXTURES, run_sweep
+
+
+def kneed_s_values(x, y):
+    """
+    Knee selection with a KneeLocator for each sensitivity (find_s_values before knees were vectorised)
+    """
+
+    def knee(m):
+        return kneed.KneeLocator(
+            x,
+            y,
+            S=m,
+            curve="convex",
+            direction="decreasing",
+            interp_method="interp1d",
+            online=True,
+        ).knee
+
+    s = knee(1)
+    s_code = "default"
+    if not s:
+        s_candidates = list(set([s for s in map(knee, range(0, 200)) if s is not None]))
+        if len(s_candidates) > 0:
+            s = s_candidates[0]
+            s_code = "high_sensitivity"
+    return s, s_code
+
+
+def random_curve(rng):
+    n = rng.integers(2, 30)
+    x = np.sort(rng.choice(np.arange(60), size=n, replace=False))
+    # decreasing, with plateaus and occasional increases:
+    steps = rng.choice([0, 0, 1, 2, 5], size=n) * rng.random(n)
+    y = np.round(np.maximum(10 - np.cumsum(steps) + rng.normal(0, 0.2, n), 0), 3)
+    return x, y
+
+
+def assert_same_s_values(detector):
+    x = detector.x
+    df = pd.DataFrame({"allowed_complexity": x, "D_score": detector.y["raw"]})
+    decreasing = ensure_elbow_strictly_decreasing(df.copy())
+    assert np.array_equal(decreasing.D_score, detector.y["strictly_decreasing"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for curve, y in [
+            ("raw", df.D_score),
+            ("strictly_decreasing", decreasing.D_score),
+        ]:
+            assert detector.find_s_values(curve) == kneed_s_values(x, y)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_knees_match_kneed_as_points_are_added(seed):
+    rng = np.random.default_rng(seed)
+    x, y = random_curve(rng)
+    detector = KneeDetector()
+    # points are added in random order, as by the bisecting search strategies:
+    for i in rng.permutation(len(x)):
+        detector.add(x[i], y[i])
+        if len(detector) >= 2:
+            assert_same_s_values(detector)
+
+
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_knees_of_sweep_match_kneed(tumour_id):
+    segment_solution = run_sweep(tumour_id, {"slack_early_stop": False})
+    segment_solution.find_optimal_solution()
+    assert_same_s_values(segment_solution.knee_detector)
+    assert (
+        segment_solution.elbow["s_raw"]
+        == kneed_s_values(
+            segment_solution.elbow_search_df.allowed_complexity,
+            segment_solution.elbow_search_df.D_score,
+        )[0]
+    )
+
+
+def test_points_of_known_complexities_are_ignored():
+    detector = KneeDetector()
+    for x, y in [(0, 5.0), (1, 2.0), (1, 3.0), (2, np.nan), (3, 1.0)]:
+        detector.add(x, y)
+    assert list(detector.x) == [0, 1, 3]
+    assert list(detector.y["raw"]) == [5.0, 2.0, 1.0]
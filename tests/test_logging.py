@@ -0,0 +1,29 @@
+import logging
+from alpaca.ALPACA_segment_solution_class import SegmentSolution
+from tests.helpers import FIXTURES, make_config
+
+
+def run_segment(tumour_id):
+    input_data_directory, segment = FIXTURES[tumour_id]
+    config = make_config(None, {"input_data_directory": str(input_data_directory)})
+    segment_solution = SegmentSolution(
+        f"ALPACA_input_table_{tumour_id}_{segment}.csv", config
+    )
+    segment_solution.run_iterations()
+    return segment_solution
+
+
+def test_segment_run_writes_nothing_to_stdout(capsys, caplog):
+    caplog.set_level(logging.INFO, logger="ALPACA")
+    run_segment("TEST0001")
+    assert capsys.readouterr().out == ""
+    # progress of the sweep is logged at debug level only:
+    assert not [r for r in caplog.records if r.levelno < logging.INFO]
+
+
+def test_segment_run_is_logged_at_debug_level(caplog):
+    caplog.set_level(logging.DEBUG, logger="ALPACA")
+    segment_solution = run_segment("TEST0001")
+    messages = [r.getMessage() for r in caplog.records]
+    assert f"Running: {segment_solution.input_file_name}" in messages[0]
+    assert "Iterating with complexity: 1" in messages
@@ -0,0 +1,302 @@
+import logging
+import numpy as np
+import pytest
+from gurobipy import GurobiError
+from alpaca.ALPACA_model_class import Model
+from tests.helpers import (
+    FIXTURES,
+    PinnedCIModel,
+    QuadraticPenaltyModel,
+    build_model,
+    load_segment_solution,
+    make_synthetic_segment,
+    run_sweep,
+    segment_model_inputs,
+    sweep_objectives,
+)
+
+
+def model_matrices(alpaca_model):
+    model = alpaca_model.model
+    model.update()
+    variables = model.getVars()
+    constraints = model.getConstrs()
+    return {
+        "A": model.getA(),
+        "RHS": np.array(model.getAttr("RHS", constraints)),
+        "Sense": model.getAttr("Sense", constraints),
+        "LB": np.array(model.getAttr("LB", variables)),
+        "UB": np.array(model.getAttr("UB", variables)),
+        "VType": model.getAttr("VType", variables),
+    }
+
+
+def assert_same_model(model_1, model_2):
+    m1 = model_matrices(model_1)
+    m2 = model_matrices(model_2)
+    assert m1["A"].shape == m2["A"].shape
+    assert abs(m1["A"] - m2["A"]).max() < 1e-9
+    for key in ["RHS", "LB", "UB"]:
+        np.testing.assert_allclose(m1[key], m2[key])
+    for key in ["Sense", "VType"]:
+        assert m1[key] == m2[key]
+
+
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_matrix_builder_matches_expression_builder(tumour_id):
+    inputs = segment_model_inputs(load_segment_solution(tumour_id))
+    assert_same_model(
+        build_model(inputs, matrix_builder=True),
+        build_model(inputs, matrix_builder=False),
+    )
+
+
+def test_matrix_builder_matches_expression_builder_on_synthetic_segment():
+    inputs = make_synthetic_segment(n_samples=8, n_clones=15, seed=1)
+    assert_same_model(
+        build_model(inputs, matrix_builder=True),
+        build_model(inputs, matrix_builder=False),
+    )
+
+
+def test_formulations_replace_big_M_rows():
+    inputs = make_synthetic_segment(n_samples=4, n_clones=10, seed=2)
+    big_M_model = build_model(inputs, formulation="bigM").model
+    big_M_model.update()
+    n_implications = sum(
+        c.ConstrName.startswith(("bigM_constr", "Ueps_constr"))
+        or c.ConstrName.endswith(("amp_change_ctr", "del_change_ctr"))
+        for c in big_M_model.getConstrs()
+    )
+    indicator_model = build_model(inputs, formulation="indicator").model
+    indicator_model.update()
+    assert indicator_model.NumGenConstrs == n_implications
+    sos_model = build_model(inputs, formulation="sos").model
+    sos_model.update()
+    assert sos_model.NumSOS == n_implications
+    with pytest.raises(ValueError):
+        build_model(inputs, formulation="unknown")
+
+
+@pytest.mark.parametrize("state_change_count", [False, True])
+def test_deduplicated_model_has_one_set_of_edge_change_indicators(
+    state_change_count,
+):
+    inputs = make_synthetic_segment(n_samples=4, n_clones=10, seed=3)
+    kwargs = {"add_state_change_count_constraints_flag": state_change_count}
+    deduplicated = build_model(inputs, deduplicate_model=True, **kwargs)
+    original = build_model(inputs, deduplicate_model=False, **kwargs)
+    stats = deduplicated.model_stats().set_index(["kind", "family"])["count"]
+    n_edge_indicators = 2 * len(deduplicated.tree_edges)
+    assert stats["variable", "cpn_change_up"] == n_edge_indicators
+    assert stats["constraint", "Ueps_constr1_up"] == n_edge_indicators
+    assert ("variable", "total_events") in stats.index
+    assert ("variable", "num_SCNA_events") not in stats.index
+    original_stats = original.model_stats().groupby("kind")["count"].sum()
+    assert (stats.groupby("kind").sum() < original_stats).all()
+
+
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_cumulative_path_counts_match_path_sums_on_fixtures(tumour_id):
+    try:
+        objectives = {
+            cumulative: sweep_objectives(
+                run_sweep(tumour_id, {"cumulative_path_counts": cumulative})
+            )
+            for cumulative in [False, True]
+        }
+    except GurobiError as error:
+        pytest.skip(f"gurobi license cannot solve the fixture: {error}")
+    assert objectives[True] == objectives[False]
+
+
+def test_cumulative_path_counts_match_path_sums_on_deep_tree():
+    inputs = make_synthetic_segment(n_samples=3, n_clones=9, seed=4, parent_window=2)
+    for allowed_complexity in [0, 2, 4, 1000]:
+        scores = {}
+        for cumulative in [False, True]:
+            alpaca_model = build_model(
+                inputs,
+                cumulative_path_counts=cumulative,
+                allowed_tree_complexity=allowed_complexity,
+            )
+            alpaca_model.model.optimize()
+            alpaca_model.get_output()
+            scores[cumulative] = (
+                alpaca_model.solution[["CI_score", "D_score", "complexity"]]
+                .iloc[0]
+                .tolist()
+            )
+            for allele in ["A", "B"]:
+                for path_index, path in enumerate(alpaca_model.tree):
+                    path_edges = list(zip(path[:-1], path[1:]))
+                    assert round(
+                        alpaca_model.amps_count_on_path[allele][path_index].X
+                    ) == sum(
+                        round(alpaca_model.cpn_change_up[allele][edge].X)
+                        for edge in path_edges
+                    )
+                    assert round(
+                        alpaca_model.dels_count_on_path[allele][path_index].X
+                    ) == sum(
+                        round(alpaca_model.cpn_change_down[allele][edge].X)
+                        for edge in path_edges
+                    )
+        assert scores[True] == scores[False]
+
+
+def test_variability_penalty_is_only_built_when_active():
+    inputs = make_synthetic_segment(n_samples=3, n_clones=8, seed=5)
+    alpaca_model = build_model(inputs, variability_penalty=0)
+    alpaca_model.model.update()
+    assert alpaca_model.model.NumQConstrs == 0
+    assert alpaca_model.path_variability_penalty == {}
+
+
+@pytest.mark.parametrize("allowed_complexity", [1, 3, 1000])
+def test_linearised_variability_penalty_matches_quadratic(allowed_complexity):
+    inputs = make_synthetic_segment(n_samples=3, n_clones=8, seed=5, parent_window=2)
+    scores = {}
+    for model_class in [Model, QuadraticPenaltyModel]:
+        alpaca_model = build_model(
+            inputs,
+            model_class=model_class,
+            variability_penalty=1,
+            add_path_variability_penalty_constraints_flag=True,
+            allowed_tree_complexity=allowed_complexity,
+        )
+        alpaca_model.model.optimize()
+        alpaca_model.get_output()
+        scores[model_class] = (
+            alpaca_model.solution[["CI_score", "D_score"]].iloc[0].tolist()
+        )
+        # penalty count must equal sum(up) * sum(down) over paths:
+        penalty = 0
+        for allele in ["A", "B"]:
+            for path in alpaca_model.tree:
+                path_edges = list(zip(path[:-1], path[1:]))
+                up = sum(alpaca_model.cpn_change_up[allele][e].X for e in path_edges)
+                down = sum(
+                    alpaca_model.cpn_change_down[allele][e].X for e in path_edges
+                )
+                penalty += round(up) * round(down)
+        assert alpaca_model.solution["variability_penalty_count"].iloc[0] == penalty
+    assert alpaca_model.model.NumQConstrs > 0
+    assert scores[Model] == scores[QuadraticPenaltyModel]
+
+
+def test_allowed_complexity_update_matches_rebuilt_model():
+    inputs = make_synthetic_segment(n_samples=4, n_clones=8, seed=6)
+    reused = build_model(inputs, allowed_tree_complexity=0)
+    for allowed_complexity in [2, 5, 1000]:
+        reused.set_allowed_complexity(allowed_complexity)
+        assert_same_model(
+            reused, build_model(inputs, allowed_tree_complexity=allowed_complexity)
+        )
+
+
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_reused_model_matches_model_built_for_each_complexity(tumour_id):
+    objectives = {
+        reuse_model: sweep_objectives(
+            run_sweep(
+                tumour_id,
+                {
+                    "reuse_model": reuse_model,
+                    "warm_start": False,
+                    "slack_early_stop": False,
+                },
+            )
+        )
+        for reuse_model in [True, False]
+    }
+    assert objectives[True] == objectives[False]
+
+
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_warm_started_sweep_matches_cold_sweep(tumour_id):
+    sweeps = {
+        warm_start: run_sweep(
+            tumour_id, {"warm_start": warm_start, "slack_early_stop": False}
+        )
+        for warm_start in [True, False]
+    }
+    assert sweep_objectives(sweeps[True]) == sweep_objectives(sweeps[False])
+    accepted = sweeps[True].metrics["warm_start_accepted"]
+    assert len(accepted) == len(sweeps[True].metrics["solutions"])
+    # diploid model has no start, every later iteration starts from the solution of the previous one:
+    assert accepted[0] is None
+    assert all(a is True for a in accepted[1:])
+    assert set(sweeps[False].metrics["warm_start_accepted"]) == {None}
+
+
+def solve_objectives(alpaca_model):
+    alpaca_model.model.optimize()
+    alpaca_model.get_output()
+    return alpaca_model.solution[["CI_score", "D_score"]].iloc[0].round(6).tolist()
+
+
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_confidence_intervals_are_constants(tumour_id):
+    inputs = segment_model_inputs(load_segment_solution(tumour_id))
+    alpaca_model = build_model(inputs)
+    alpaca_model.model.update()
+    assert not [
+        v.VarName
+        for v in alpaca_model.model.getVars()
+        if v.VarName.split("[")[0].endswith(("_CI_upper", "_CI_lower"))
+    ]
+    assert not [
+        c.ConstrName
+        for c in alpaca_model.model.getConstrs()
+        if c.ConstrName.startswith(("upper_CI", "lower_CI"))
+    ]
+    for allowed_complexity in [0, 2, 1000]:
+        objectives = {
+            model_class: solve_objectives(
+                build_model(
+                    inputs,
+                    model_class=model_class,
+                    matrix_builder=False,
+                    allowed_tree_complexity=allowed_complexity,
+                )
+            )
+            for model_class in [Model, PinnedCIModel]
+        }
+        assert objectives[Model] == objectives[PinnedCIModel]
+
+
+@pytest.mark.parametrize("lower_CI_shift", [0, 10])
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_derived_bounds_keep_objectives(tumour_id, lower_CI_shift):
+    inputs = segment_model_inputs(load_segment_solution(tumour_id))
+    # CI tables passed by the user can have negative lower CIs:
+    inputs["ci_table"] = inputs["ci_table"].assign(
+        lower_CI_A=inputs["ci_table"].lower_CI_A - lower_CI_shift,
+        lower_CI_B=inputs["ci_table"].lower_CI_B - lower_CI_shift,
+    )
+    for allowed_complexity in [0, 2, 1000]:
+        objectives = {
+            derive_bounds: solve_objectives(
+                build_model(
+                    inputs,
+                    derive_cn_bounds_flag=derive_bounds,
+                    allowed_tree_complexity=allowed_complexity,
+                )
+            )
+            for derive_bounds in [True, False]
+        }
+        assert objectives[True] == objectives[False]
+
+
+def test_warm_start_acceptance_does_not_depend_on_log_messages(monkeypatch, caplog):
+    # messages of another gurobi version:
+    monkeypatch.setattr("alpaca.ALPACA_model_class.WARM_START_MESSAGES", ["unknown"])
+    caplog.set_level(logging.DEBUG, logger="ALPACA")
+    segment_solution = run_sweep("TEST0001", {"slack_early_stop": False})
+    accepted = segment_solution.metrics["warm_start_accepted"]
+    assert all(a is True for a in accepted[1:])
+    assert any(
+        "MIP start was not reported in the gurobi log" in r.getMessage()
+        for r in caplog.records
+    )
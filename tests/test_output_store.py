@@ -0,0 +1,53 @@
+import json
+import pandas as pd
+import pytest
+
+pyarrow = pytest.importorskip("pyarrow")
+from alpaca.output_store import OutputStore, get_output_store, writes_csv
+
+
+def segment_output(segment, pred_CN_A):
+    return pd.DataFrame(
+        {
+            "tumour_id": "T1",
+            "segment": segment,
+            "clone": ["clone1", "clone2"],
+            "pred_CN_A": pred_CN_A,
+            "pred_CN_B": [1, 0],
+        }
+    )
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_appended_outputs_are_read_from_manifest(tmp_path, output_format):
+    store = OutputStore(tmp_path, output_format)
+    store.append("optimal", "T1", "2_10_20", segment_output("2_10_20", [2, 2]))
+    store.append("optimal", "T1", "1_10_20", segment_output("1_10_20", [3, 1]))
+    # output of an overwritten segment replaces the previous one:
+    store.append("optimal", "T1", "1_10_20", segment_output("1_10_20", [4, 1]))
+    output = store.read("optimal")
+    assert list(output.segment) == ["1_10_20", "1_10_20", "2_10_20", "2_10_20"]
+    assert list(output.pred_CN_A) == [4, 1, 2, 2]
+    assert str(output.pred_CN_A.dtype) == "int16"
+    assert len(store.read_manifest()) == 2
+    assert list(store.read("optimal", segments=["2_10_20"]).pred_CN_A) == [2, 2]
+    assert store.has_partition("optimal", "T1", "1_10_20")
+    assert not store.has_partition("all", "T1", "1_10_20")
+    with open(tmp_path / f"ALPACA_output.{output_format}" / "store.json") as f:
+        assert json.load(f)["format"] == output_format
+
+
+def test_fractional_copy_numbers_are_rejected(tmp_path):
+    store = OutputStore(tmp_path)
+    with pytest.raises(pyarrow.ArrowInvalid):
+        store.append("optimal", "T1", "1_10_20", segment_output("1_10_20", [1.5, 1]))
+    assert store.read_manifest() == []
+
+
+def test_store_configuration(tmp_path):
+    assert get_output_store({"output_format": "csv"}) is None
+    assert writes_csv({"output_format": "csv"})
+    config = {"output_format": "parquet", "output_directory": str(tmp_path)}
+    assert isinstance(get_output_store(config), OutputStore)
+    assert not writes_csv(config)
+    assert writes_csv({**config, "export_csv": 1})
@@ -0,0 +1,174 @@
+import contextlib
+import functools
+import gc
+import io
+import pandas as pd
+import pytest
+import alpaca.parallel
+from alpaca.ALPACA_segment_solution_class import SegmentSolution
+from alpaca.parallel import get_worker_config, solve_segments
+from tests.helpers import make_config, write_synthetic_segments
+
+
+def test_worker_config_divides_cpus():
+    config = make_config({"cpus": 8})
+    assert get_worker_config(config, 3)["model_config"]["cpus"] == 2
+    assert get_worker_config(config, 16)["model_config"]["cpus"] == 1
+    # original config is not modified:
+    assert config["model_config"]["cpus"] == 8
+
+
+def test_workers_produce_same_output_as_serial_run(tmp_path):
+    input_files = write_synthetic_segments(tmp_path / "input", shifts=[0, 1, 2])
+    outputs = {}
+    for workers in [1, 2]:
+        config = make_config(
+            {"cpus": workers},
+            {
+                "input_data_directory": str(tmp_path / "input"),
+                "overwrite_output": True,
+                "debug": False,
+            },
+            output_directory=str(tmp_path / f"output_{workers}"),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = list(solve_segments(input_files, config, workers))
+        assert sorted((f, status) for f, status, _, _ in results) == sorted(
+            (f, "solved") for f in input_files
+        )
+        outputs[workers] = {
+            f.name: pd.read_csv(f)
+            for f in sorted((tmp_path / f"output_{workers}").rglob("*.csv"))
+        }
+    assert list(outputs[1]) == list(outputs[2])
+    for name, output in outputs[1].items():
+        pd.testing.assert_frame_equal(output, outputs[2][name])
+
+
+def load_segment_solutions(input_files, config):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [SegmentSolution(f, config) for f in input_files]
+
+
+def test_problem_hash(tmp_path):
+    input_files = write_synthetic_segments(tmp_path, shifts=[0, 1, 0])
+    config = make_config({"cpus": 1}, {"input_data_directory": str(tmp_path)})
+    first, shifted, same = load_segment_solutions(input_files, config)
+    assert first.get_problem_hash() == same.get_problem_hash()
+    assert first.get_problem_hash() != shifted.get_problem_hash()
+    # cpus and elbow selection do not change solutions, other model parameters do:
+    for model_config, same_hash in [
+        ({"cpus": 8}, True),
+        ({"d_zero": 1}, True),
+        ({"search_strategy": "exponential", "warm_start": False}, True),
+        ({"missing_clones_inherit_from_children_flag": False}, True),
+        ({"time_limit": 1}, False),
+    ]:
+        (segment_solution,) = load_segment_solutions(
+            input_files[:1], make_config(model_config, config["preprocessing_config"])
+        )
+        assert (
+            segment_solution.get_problem_hash() == first.get_problem_hash()
+        ) == same_hash
+    # homozygous deletions are not allowed in long segments:
+    first.segment = "1_1000_100000000"
+    assert first.get_problem_hash() != same.get_problem_hash()
+
+
+def test_identical_segments_are_solved_once(tmp_path):
+    input_files = write_synthetic_segments(tmp_path / "input", shifts=[0, 1, 0, 0])
+    outputs = {}
+    for deduplicate_segments in [False, True]:
+        output_directory = tmp_path / f"output_{deduplicate_segments}"
+        config = make_config(
+            {"cpus": 1},
+            {
+                "input_data_directory": str(tmp_path / "input"),
+                "overwrite_output": True,
+                "debug": False,
+                "deduplicate_segments": deduplicate_segments,
+                "output_model_selection_table": True,
+            },
+            output_directory=str(output_directory),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = {
+                f: (status, usage)
+                for f, status, usage, _ in solve_segments(input_files, config)
+            }
+        outputs[deduplicate_segments] = {
+            f.name: pd.read_csv(f) for f in sorted(output_directory.rglob("*.csv"))
+        }
+    statuses = [results[f][0] for f in input_files]
+    assert statuses == ["solved", "solved", "deduplicated", "deduplicated"]
+    assert results[input_files[2]][1]["source"] == input_files[0]
+    assert (
+        results[input_files[2]][1]["n_solves"] == results[input_files[0]][1]["n_solves"]
+    )
+    assert list(outputs[False]) == list(outputs[True])
+    for name, output in outputs[False].items():
+        pd.testing.assert_frame_equal(output, outputs[True][name])
+
+
+def test_deduplication_keeps_only_problem_hashes(tmp_path):
+    input_files = write_synthetic_segments(
+        tmp_path / "input", shifts=[0, 1, 2, 3, 4, 5, 0]
+    )
+    config = make_config(
+        {"cpus": 1},
+        {
+            "input_data_directory": str(tmp_path / "input"),
+            "overwrite_output": True,
+            "debug": False,
+            "deduplicate_segments": True,
+        },
+        output_directory=str(tmp_path / "output"),
+    )
+    live_segment_solutions = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in solve_segments(input_files, config):
+            gc.collect()
+            live_segment_solutions.append(
+                sum(isinstance(o, SegmentSolution) for o in gc.get_objects())
+            )
+    # segment solutions are not kept for all segments, they are only loaded by the task of a segment:
+    assert max(live_segment_solutions) <= 3
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_segments_are_solved_while_others_are_hashed(tmp_path, monkeypatch, workers):
+    input_files = write_synthetic_segments(tmp_path / "input", shifts=[0, 1, 2, 0])
+    config = make_config(
+        {"cpus": workers},
+        {
+            "input_data_directory": str(tmp_path / "input"),
+            "overwrite_output": True,
+            "debug": False,
+            "deduplicate_segments": True,
+        },
+        output_directory=str(tmp_path / "output"),
+    )
+    tasks = []
+    # tasks sent to worker processes are not recorded:
+    for task in ["hash_segment", "solve_segment"] if workers == 1 else []:
+        function = getattr(alpaca.parallel, task)
+        monkeypatch.setattr(
+            alpaca.parallel,
+            task,
+            functools.partial(
+                lambda task, function, *args: tasks.append(task) or function(*args),
+                task,
+                function,
+            ),
+        )
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = {
+            f: (status, usage)
+            for f, status, usage, _ in solve_segments(input_files, config, workers)
+        }
+    assert [results[f][0] for f in input_files] == ["solved"] * 3 + ["deduplicated"]
+    assert results[input_files[3]][1]["source"] == input_files[0]
+    if workers == 1:
+        assert tasks.index("solve_segment") < len(tasks) - tasks[::-1].index(
+            "hash_segment"
+        )
@@ -0,0 +1,136 @@
+import pytest
+from alpaca.scheduler import (
+    format_utilisation_report,
+    get_available_cpus,
+    get_cpu_budget,
+    get_solver_threads,
+    get_utilisation_report,
+    get_worker_count,
+    read_cgroup_cpu_quota,
+)
+from tests.helpers import build_model, make_synthetic_segment
+
+
+def write_cgroup_files(cgroup_root, files):
+    for name, content in files.items():
+        path = cgroup_root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+@pytest.mark.parametrize(
+    "files, quota",
+    [
+        ({"cpu.max": "250000 100000\n"}, 2.5),
+        ({"cpu.max": "max 100000\n"}, None),
+        (
+            {
+                "cpu/cpu.cfs_quota_us": "300000\n",
+                "cpu/cpu.cfs_period_us": "100000\n",
+            },
+            3,
+        ),
+        (
+            {
+                "cpu/cpu.cfs_quota_us": "-1\n",
+                "cpu/cpu.cfs_period_us": "100000\n",
+            },
+            None,
+        ),
+        ({}, None),
+    ],
+)
+def test_read_cgroup_cpu_quota(tmp_path, files, quota):
+    write_cgroup_files(tmp_path, files)
+    assert read_cgroup_cpu_quota(tmp_path) == quota
+
+
+@pytest.mark.parametrize(
+    "proc_cgroup, files, quota",
+    [
+        # quota of the cgroup of the process, not of the root:
+        (
+            "0::/system.slice/alpaca.scope\n",
+            {
+                "cpu.max": "max 100000\n",
+                "system.slice/cpu.max": "400000 100000\n",
+                "system.slice/alpaca.scope/cpu.max": "150000 100000\n",
+            },
+            1.5,
+        ),
+        # quota of a parent cgroup applies:
+        (
+            "0::/system.slice/alpaca.scope\n",
+            {
+                "system.slice/cpu.max": "400000 100000\n",
+                "system.slice/alpaca.scope/cpu.max": "max 100000\n",
+            },
+            4,
+        ),
+        (
+            "12:memory:/kubepods/pod1\n4:cpu,cpuacct:/kubepods/pod1\n",
+            {
+                "cpu/cpu.cfs_quota_us": "-1\n",
+                "cpu/cpu.cfs_period_us": "100000\n",
+                "cpu/kubepods/pod1/cpu.cfs_quota_us": "200000\n",
+                "cpu/kubepods/pod1/cpu.cfs_period_us": "100000\n",
+            },
+            2,
+        ),
+        # cgroup outside of the mounted hierarchy is read at the root:
+        ("0::/../other.slice\n", {"cpu.max": "300000 100000\n"}, 3),
+        ("0::/missing.slice\n", {"cpu.max": "300000 100000\n"}, 3),
+    ],
+)
+def test_quota_of_nested_cgroup(tmp_path, proc_cgroup, files, quota):
+    cgroup_root = tmp_path / "cgroup"
+    write_cgroup_files(cgroup_root, files)
+    write_cgroup_files(tmp_path, {"proc_self_cgroup": proc_cgroup})
+    assert read_cgroup_cpu_quota(cgroup_root, tmp_path / "proc_self_cgroup") == quota
+
+
+def test_available_cpus_are_limited_by_quota(tmp_path, monkeypatch):
+    monkeypatch.setattr("alpaca.scheduler.get_affinity_cpus", lambda: 8)
+    write_cgroup_files(tmp_path, {"cpu.max": "250000 100000\n"})
+    assert get_available_cpus(tmp_path) == 2
+    write_cgroup_files(tmp_path, {"cpu.max": "50000 100000\n"})
+    assert get_available_cpus(tmp_path) == 1
+    write_cgroup_files(tmp_path, {"cpu.max": "max 100000\n"})
+    assert get_available_cpus(tmp_path) == 8
+
+
+def test_cpu_budget_and_worker_count():
+    assert get_cpu_budget(16, available_cpus=4) == 4
+    assert get_cpu_budget(2, available_cpus=4) == 2
+    assert get_cpu_budget(0, available_cpus=4) == 4
+    assert get_worker_count(0, cpus=4, n_segments=10) == 4
+    assert get_worker_count(8, cpus=4, n_segments=10) == 4
+    assert get_worker_count(8, cpus=4, n_segments=2) == 2
+    assert get_worker_count(1, cpus=4, n_segments=10) == 1
+
+
+def test_larger_models_get_more_threads():
+    assert get_solver_threads(10, cpus=8) == 1
+    assert get_solver_threads(10_000, cpus=8) == 8
+    small = build_model(make_synthetic_segment(2, 3), cpus=8)
+    large = build_model(make_synthetic_segment(10, 40), cpus=8)
+    assert small.threads == small.model.params.Threads == 1
+    assert 1 < large.threads <= 8
+    # threads can be fixed in model config:
+    assert (
+        build_model(make_synthetic_segment(2, 3), threads=2).model.params.Threads == 2
+    )
+
+
+def test_utilisation_report():
+    usage = [
+        {"segment": "s1", "wall_time": 2.0, "cpu_time": 3.0, "threads": 2},
+        {"segment": "s2", "wall_time": 1.0, "cpu_time": 1.0, "threads": 1},
+    ]
+    report = get_utilisation_report(usage, wall_time=2.0, cpus=2, workers=2)
+    assert report["utilisation"] == 1.0
+    assert report["threads"] == {1: 1, 2: 1}
+    assert "Cpu utilisation: 100%" in format_utilisation_report(report)
+    empty = get_utilisation_report([], wall_time=0.0, cpus=1, workers=1)
+    assert empty["segments"] == 0
+    format_utilisation_report(empty)
@@ -0,0 +1,137 @@
+import contextlib
+import functools
+import io
+import pytest
+from alpaca.ALPACA_model_class import Model
+from alpaca.ALPACA_segment_solution_class import SegmentSolution
+from alpaca.search_strategies import get_search_strategy
+from tests.helpers import (
+    FIXTURES,
+    make_config,
+    make_synthetic_segment,
+    run_sweep,
+    sweep_objectives,
+    write_synthetic_tumour,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def sweep(tumour_id, search_strategy):
+    segment_solution = run_sweep(tumour_id, {"search_strategy": search_strategy})
+    segment_solution.find_optimal_solution()
+    return segment_solution
+
+
+@pytest.mark.parametrize("search_strategy", ["exponential", "golden"])
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_search_strategy_finds_linear_elbow_with_fewer_solves(
+    tumour_id, search_strategy
+):
+    linear = sweep(tumour_id, "linear")
+    search = sweep(tumour_id, search_strategy)
+    assert search.optimal_solution_index == linear.optimal_solution_index
+    assert search.n_solves < linear.n_solves
+    # every evaluated allowed complexity, solved or filled, has the objectives of the full sweep:
+    linear_objectives = {
+        c: (z, d)
+        for c, z, d in zip(
+            linear.solutions_combined.allowed_complexity,
+            linear.solutions_combined.CI_score,
+            linear.solutions_combined.D_score,
+        )
+    }
+    for c, (z, d) in search.search_objectives.items():
+        assert (z, d) == linear_objectives[c]
+
+
+def test_metrics_are_sorted_by_allowed_complexity():
+    search = sweep("TEST0001", "golden")
+    allowed = [s.allowed_complexity.iloc[0] for s in search.metrics["solutions"]]
+    assert allowed == sorted(allowed)
+    assert sum(search.metrics["solved"]) == search.n_solves
+    assert not all(search.metrics["solved"])
+
+
+def test_unknown_search_strategy():
+    with pytest.raises(ValueError):
+        get_search_strategy("binary")
+
+
+def test_linear_search_ends_when_complexity_is_not_binding(tmp_path):
+    # small tree: optimum is reached well below maximum complexity
+    input_file_name = write_synthetic_tumour(
+        tmp_path, make_synthetic_segment(n_samples=2, n_clones=3, seed=0)
+    )
+    segment_solutions = {}
+    for slack_early_stop in [True, False]:
+        config = make_config(
+            {"slack_early_stop": slack_early_stop},
+            {"input_data_directory": str(tmp_path)},
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            segment_solution = SegmentSolution(input_file_name, config)
+            segment_solution.run_iterations()
+        segment_solutions[slack_early_stop] = segment_solution
+    early, full = segment_solutions[True], segment_solutions[False]
+    assert sweep_objectives(early) == sweep_objectives(full)
+    assert early.n_solves < full.n_solves
+
+
+def test_maximum_complexity_check_does_not_change_stop_decision(tmp_path, monkeypatch):
+    # maximum complexity is solved early and has a lower D score than the complexity checked:
+    input_file_name = write_synthetic_tumour(
+        tmp_path, make_synthetic_segment(n_samples=4, n_clones=5, seed=1)
+    )
+    # every iteration is slow, so that iterations stop when D score does not improve:
+    get_solve_record = Model.get_solve_record
+    monkeypatch.setattr(
+        Model,
+        "get_solve_record",
+        lambda self, scenario=None: {
+            **get_solve_record(self, scenario),
+            "time_limit": 0,
+        },
+    )
+    held_back = []
+    hold_back_complexities = SegmentSolution.hold_back_complexities
+    monkeypatch.setattr(
+        SegmentSolution,
+        "hold_back_complexities",
+        lambda self, c: held_back.append(c) or hold_back_complexities(self, c),
+    )
+    segment_solutions = {}
+    for slack_early_stop in [True, False]:
+        config = make_config(
+            {"slack_early_stop": slack_early_stop},
+            {"input_data_directory": str(tmp_path)},
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            segment_solution = SegmentSolution(input_file_name, config)
+            segment_solution.run_iterations()
+            segment_solution.find_optimal_solution()
+        segment_solutions[slack_early_stop] = segment_solution
+    early, full = segment_solutions[True], segment_solutions[False]
+    assert len(held_back) > 0
+    assert max(full.search_objectives) < full.maximum_complexity - 1
+    assert sorted(early.search_objectives) == sorted(full.search_objectives)
+    assert sweep_objectives(early) == sweep_objectives(full)
+    assert early.optimal_solution_index == full.optimal_solution_index
+
+
+@pytest.mark.parametrize("tumour_id", FIXTURES)
+def test_scenario_search_matches_linear_search(tumour_id):
+    linear = run_sweep(tumour_id, {"slack_early_stop": False})
+    scenarios = sweep(tumour_id, "scenarios")
+    assert sweep_objectives(scenarios) == sweep_objectives(linear)
+    assert (
+        scenarios.optimal_solution_index
+        == sweep(tumour_id, "linear").optimal_solution_index
+    )
+
+
+def test_scenario_search_falls_back_to_linear_search(monkeypatch):
+    monkeypatch.setattr(Model, "optimize_scenarios", lambda self, levels: False)
+    fallback = run_sweep("TEST0001", {"search_strategy": "scenarios"})
+    linear = sweep("TEST0001", "linear")
+    assert sweep_objectives(fallback) == sweep_objectives(linear)
+    assert fallback.n_solves == linear.n_solves
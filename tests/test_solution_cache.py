@@ -0,0 +1,137 @@
+import contextlib
+import io
+import os
+import pandas as pd
+import alpaca.ALPACA_segment_solution_class
+from alpaca.ALPACA_segment_solution_class import missing_clones_inherit_from_children
+from alpaca.parallel import solve_segment
+from alpaca.solution_cache import SolutionCache, get_cache_key
+from tests.helpers import (
+    make_config,
+    make_synthetic_segment,
+    write_synthetic_segments,
+    write_synthetic_tumour,
+)
+
+
+def test_cache_key_depends_on_version():
+    assert get_cache_key("abc", "1.0") == get_cache_key("abc", "1.0")
+    assert get_cache_key("abc", "1.0") != get_cache_key("abc", "1.1")
+    assert get_cache_key("abc", "1.0") != get_cache_key("abd", "1.0")
+
+
+def test_least_recently_used_entries_are_removed(tmp_path):
+    entry = {"values": list(range(20000))}
+    cache = SolutionCache(tmp_path, max_size_mb=1)
+    cache.put("first", entry)
+    entry_size_mb = os.path.getsize(cache.entry_path("first")) / 1024**2
+    cache.max_size_mb = 2.5 * entry_size_mb
+    cache.put("second", entry)
+    # reading an entry makes it the most recently used one:
+    os.utime(cache.entry_path("first"), (0, 0))
+    os.utime(cache.entry_path("second"), (1, 1))
+    assert cache.get("first") == entry
+    cache.put("third", entry)
+    assert cache.get("second") is None
+    assert cache.get("first") == entry
+    assert cache.stats()["entries"] == 2
+    assert cache.prune(max_size_mb=0) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = SolutionCache(tmp_path)
+    with open(cache.entry_path("broken"), "wb") as f:
+        f.write(b"not a pickle")
+    assert cache.get("broken") is None
+    assert not os.path.exists(cache.entry_path("broken"))
+
+
+def test_cached_sweep_gives_same_output(tmp_path):
+    (input_file_name,) = write_synthetic_segments(tmp_path / "input", shifts=[0])
+    results = []
+    for run, model_config in enumerate([{}, {}, {"time_limit": 30}]):
+        config = make_config(
+            model_config,
+            {
+                "input_data_directory": str(tmp_path / "input"),
+                "overwrite_output": True,
+                "use_cache": True,
+                "cache_directory": str(tmp_path / "cache"),
+            },
+            output_directory=str(tmp_path / f"output_{run}"),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, status, usage, _ = solve_segment(input_file_name, config)
+        output = pd.read_csv(
+            tmp_path
+            / f"output_{run}"
+            / input_file_name.replace("ALPACA_input_table", "optimal")
+        )
+        results.append((usage, output))
+    (first, first_output), (second, second_output), (third, _) = results
+    assert not first["cached"] and second["cached"]
+    assert second["n_solves"] == first["n_solves"]
+    pd.testing.assert_frame_equal(first_output, second_output)
+    # model parameters are part of the cache key:
+    assert not third["cached"]
+    assert SolutionCache(tmp_path / "cache").stats()["entries"] == 2
+
+
+def test_cached_sweep_is_used_with_other_search_settings(tmp_path, monkeypatch):
+    # clone2 is absent from all samples and has one child, clone3:
+    input_file_name = write_synthetic_tumour(
+        tmp_path / "input", make_synthetic_segment(n_samples=2, n_clones=4, seed=17)
+    )
+    inherited_solutions = []
+    monkeypatch.setattr(
+        alpaca.ALPACA_segment_solution_class,
+        "missing_clones_inherit_from_children",
+        lambda solution, *args: inherited_solutions.append(solution)
+        or missing_clones_inherit_from_children(solution, *args),
+    )
+    results = {}
+    for run, model_config in [
+        ("uncached", {}),
+        (
+            "cached",
+            {
+                "missing_clones_inherit_from_children_flag": False,
+                "search_strategy": "exponential",
+                "slack_early_stop": False,
+                "reuse_model": False,
+                "warm_start": False,
+            },
+        ),
+        ("cached_inherited", {}),
+    ]:
+        config = make_config(
+            model_config,
+            {
+                "input_data_directory": str(tmp_path / "input"),
+                "overwrite_output": True,
+                "use_cache": True,
+                "cache_directory": str(tmp_path / "cache"),
+            },
+            output_directory=str(tmp_path / run),
+        )
+        inherited_solutions.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, _, usage, _ = solve_segment(input_file_name, config)
+        output = pd.read_csv(
+            tmp_path / run / input_file_name.replace("ALPACA_input_table", "optimal")
+        ).set_index("clone")
+        results[run] = (usage, output, len(inherited_solutions))
+    uncached, uncached_output, n_uncached = results["uncached"]
+    cached, _, n_cached = results["cached"]
+    inherited, inherited_output, n_inherited = results["cached_inherited"]
+    assert not uncached["cached"] and cached["cached"] and inherited["cached"]
+    # copy numbers of missing clones are inherited when the sweep is combined, not before it is cached (copy numbers
+    # of clone2 found by the models are any of the alternative optima):
+    assert n_cached == 0
+    assert n_inherited == n_uncached > 0
+    pd.testing.assert_frame_equal(uncached_output, inherited_output)
+    assert (
+        inherited_output.loc["clone2", ["pred_CN_A", "pred_CN_B"]].tolist()
+        == inherited_output.loc["clone3", ["pred_CN_A", "pred_CN_B"]].tolist()
+    )
@@ -0,0 +1,57 @@
+import gc
+import sys
+import gurobipy as gp
+import pytest
+from tests.helpers import run_sweep
+
+# memory of the gurobi models of one sweep of LTX0000-Tumour1 with a model per iteration was about 8 MB when all of
+# them were kept by the segment solution:
+MAX_PEAK_RSS_GROWTH_MB = 8
+
+
+def get_peak_rss_mb():
+    import resource
+
+    # kilobytes on linux:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def long_sweep():
+    # a new model for every allowed complexity:
+    return run_sweep(
+        "LTX0000-Tumour1", {"reuse_model": False, "slack_early_stop": False}
+    )
+
+
+def test_sweep_keeps_compact_records():
+    segment_solution = long_sweep()
+    records = segment_solution.metrics["records"]
+    assert len(records) == len(segment_solution.metrics["solutions"])
+    for record, solution in zip(records, segment_solution.metrics["solutions"]):
+        assert set(record) == {
+            "status",
+            "run_time",
+            "time_limit",
+            "mip_gap",
+            "node_count",
+            "objective_values",
+        }
+        assert int(round(record["objective_values"][0])) == solution.CI_score.iloc[0]
+    assert segment_solution.persistent_model is None
+    assert not any(
+        isinstance(value, gp.Model)
+        for values in segment_solution.metrics.values()
+        for value in values
+    )
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="peak RSS is read in kilobytes")
+def test_peak_rss_is_flat_across_sweeps():
+    kept = [long_sweep()]
+    gc.collect()
+    peak_rss = get_peak_rss_mb()
+    # segment solutions are kept alive, as in a run that keeps results of all segments:
+    for _ in range(3):
+        kept.append(long_sweep())
+    gc.collect()
+    assert get_peak_rss_mb() - peak_rss < MAX_PEAK_RSS_GROWTH_MB
@@ -0,0 +1,50 @@
+import contextlib
+import io
+import json
+import numpy as np
+import pytest
+import alpaca.ALPACA_segment_solution_class as segment_solution_module
+from alpaca.ALPACA_segment_solution_class import SegmentSolution, TumourContext
+from alpaca.parallel import load_segment_solution
+from tests.helpers import make_config, write_synthetic_segments
+
+
+@pytest.mark.parametrize("ci_table_name", ["ci_table.csv", ""])
+def test_segments_built_from_shared_context(tmp_path, monkeypatch, ci_table_name):
+    input_files = write_synthetic_segments(tmp_path, shifts=[0, 1, 2])
+    config = make_config(
+        {}, {"input_data_directory": str(tmp_path), "ci_table_name": ci_table_name}
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        separate = [SegmentSolution(f, config) for f in input_files]
+    tree_reads = []
+    read_tree_json = segment_solution_module.read_tree_json
+    monkeypatch.setattr(
+        segment_solution_module,
+        "read_tree_json",
+        lambda path: tree_reads.append(path) or read_tree_json(path),
+    )
+    tumour_contexts = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        shared = [
+            load_segment_solution(f, config, tumour_contexts) for f in input_files
+        ]
+    assert len(tree_reads) == 1
+    assert list(tumour_contexts) == ["SYNTH"]
+    for a, b in zip(separate, shared):
+        assert b.tumour_context is tumour_contexts["SYNTH"]
+        assert a.tree == b.tree
+        assert a.cp_table.equals(b.cp_table)
+        for bound in ["lower_CI_A", "upper_CI_A", "lower_CI_B", "upper_CI_B"]:
+            np.testing.assert_array_equal(a.ci_bounds[bound], b.ci_bounds[bound])
+        assert a.get_problem_hash() == b.get_problem_hash()
+
+
+def test_tumour_inputs_are_validated_once(tmp_path):
+    write_synthetic_segments(tmp_path, shifts=[0])
+    tree_path = tmp_path / "SYNTH" / "tree_paths.json"
+    tree = json.loads(tree_path.read_text())
+    tree_path.write_text(json.dumps(tree + [[tree[0][0], "unknown_clone"]]))
+    with contextlib.redirect_stdout(io.StringIO()):
+        with pytest.raises(ValueError, match="Clones in cp_table"):
+            TumourContext(str(tmp_path / "SYNTH"), ci_table_name="ci_table.csv")
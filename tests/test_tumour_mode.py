@@ -0,0 +1,144 @@
+import shutil
+import sys
+import pandas as pd
+import pytest
+import alpaca.parallel
+from alpaca.__main__ import run_alpaca
+from alpaca.output_store import OutputStore
+from tests.helpers import write_synthetic_segments
+
+
+def write_synthetic_tumour_table(input_data_directory):
+    """
+    Synthetic tumour in tumour mode layout: all segments in ALPACA_input_table.csv (segments 1 and 3 are identical)
+    """
+    write_synthetic_segments(input_data_directory, shifts=[0, 1, 0])
+    tumour_dir = input_data_directory / "SYNTH"
+    input_table = pd.concat(
+        [pd.read_csv(f) for f in sorted((tumour_dir / "segments").glob("*.csv"))]
+    )
+    input_table.to_csv(tumour_dir / "ALPACA_input_table.csv", index=False)
+    shutil.rmtree(tumour_dir / "segments")
+    return tumour_dir
+
+
+def run_tumour_mode(monkeypatch, tumour_dir, output_directory, *args):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "alpaca",
+            "run",
+            "--input_tumour_directory",
+            str(tumour_dir),
+            "--output_directory",
+            str(output_directory),
+            "--ci_table_name",
+            "ci_table.csv",
+            *args,
+        ],
+    )
+    run_alpaca()
+
+
+@pytest.mark.parametrize("deduplicate_segments", [0, 1])
+def test_in_memory_run_matches_file_based_run(
+    tmp_path, monkeypatch, deduplicate_segments
+):
+    tumour_dir = write_synthetic_tumour_table(tmp_path / "input")
+    monkeypatch.chdir(tmp_path)
+    outputs = {}
+    for in_memory in [1, 0]:
+        output_directory = tmp_path / f"output_{in_memory}"
+        run_tumour_mode(
+            monkeypatch,
+            tumour_dir,
+            output_directory,
+            "--in_memory",
+            str(in_memory),
+            "--deduplicate_segments",
+            str(deduplicate_segments),
+        )
+        if in_memory:
+            # segment input files are not written:
+            assert not (tumour_dir / "segments").exists()
+        outputs[in_memory] = {
+            f.name: f.read_text() for f in sorted(output_directory.glob("*.csv"))
+        }
+    assert "ALPACA_output_SYNTH.csv" in outputs[1]
+    assert "cn_change_to_ancestor.csv" in outputs[1]
+    assert outputs[1] == outputs[0]
+
+
+@pytest.mark.parametrize("in_memory", [1, 0])
+def test_parquet_store_matches_csv_output(tmp_path, monkeypatch, in_memory):
+    pytest.importorskip("pyarrow")
+    tumour_dir = write_synthetic_tumour_table(tmp_path / "input")
+    monkeypatch.chdir(tmp_path)
+    run_tumour_mode(monkeypatch, tumour_dir, tmp_path / "csv")
+    run_tumour_mode(
+        monkeypatch,
+        tumour_dir,
+        tmp_path / "parquet",
+        "--output_format",
+        "parquet",
+        "--in_memory",
+        str(in_memory),
+    )
+    # only the store is written:
+    assert [f.name for f in (tmp_path / "parquet").iterdir()] == [
+        "ALPACA_output.parquet"
+    ]
+    store = OutputStore(tmp_path / "parquet")
+    for kind, csv_name in [
+        ("optimal", "ALPACA_output_SYNTH.csv"),
+        ("cn_change_to_ancestor", "cn_change_to_ancestor.csv"),
+    ]:
+        pd.testing.assert_frame_equal(
+            store.read(kind),
+            pd.read_csv(tmp_path / "csv" / csv_name),
+            check_dtype=False,
+        )
+
+
+@pytest.mark.parametrize("deduplicate_segments", [0, 1])
+def test_interrupted_in_memory_run_is_resumed(
+    tmp_path, monkeypatch, deduplicate_segments
+):
+    tumour_dir = write_synthetic_tumour_table(tmp_path / "input")
+    monkeypatch.chdir(tmp_path)
+    args = ["--deduplicate_segments", str(deduplicate_segments)]
+    run_tumour_mode(monkeypatch, tumour_dir, tmp_path / "complete", *args)
+    solve_segment = alpaca.parallel.solve_segment
+    solved = []
+
+    def interrupted_solve_segment(input_file_name, *solve_args):
+        if len(solved) == 1:
+            raise RuntimeError("interrupted")
+        result = solve_segment(input_file_name, *solve_args)
+        solved.append(input_file_name)
+        return result
+
+    output_directory = tmp_path / "resumed"
+    args += ["--overwrite_output", "0"]
+    monkeypatch.setattr(alpaca.parallel, "solve_segment", interrupted_solve_segment)
+    with pytest.raises(RuntimeError):
+        run_tumour_mode(monkeypatch, tumour_dir, output_directory, *args)
+    # solutions of the first segment are kept to resume the run (segment 3, identical to it, is only hashed after
+    # segment 2 is started):
+    segment_outputs = [f.name for f in output_directory.glob("*.csv")]
+    assert segment_outputs == [f"optimal_{solved[0].split('ALPACA_input_table_')[1]}"]
+
+    def resumed_solve_segment(input_file_name, *solve_args):
+        result = solve_segment(input_file_name, *solve_args)
+        if result[1] == "solved":
+            solved.append(input_file_name)
+        return result
+
+    monkeypatch.setattr(alpaca.parallel, "solve_segment", resumed_solve_segment)
+    run_tumour_mode(monkeypatch, tumour_dir, output_directory, *args)
+    # first segment is not solved again:
+    assert len(solved) == len(set(solved))
+    assert {f.name: f.read_text() for f in sorted(output_directory.glob("*.csv"))} == {
+        f.name: f.read_text() for f in sorted((tmp_path / "complete").glob("*.csv"))
+    }